@@ -0,0 +1,257 @@
+"""
+Admission control for chat turns and rate limits for outbound calls.
+
+- Turns of one session run one at a time, in arrival order (FIFO lock);
+  more than ADMISSION_SESSION_QUEUE waiting turns in a session -> 429.
+- At most ADMISSION_MAX_TURNS agent turns run at once; up to
+  ADMISSION_MAX_QUEUE more wait (at most ADMISSION_QUEUE_TIMEOUT seconds),
+  beyond that -> 503. Both carry a Retry-After estimate.
+- LLM_RATE_LIMIT / MCP_RATE_LIMIT (calls per second, 0 = unlimited) are
+  token buckets shared by every model call / MCP tool call in the process.
+"""
+
+import os
+import math
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from . import metrics
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _SessionQueue:
+    __slots__ = ("lock", "waiting")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()  # asyncio.Lock wakes waiters in FIFO order
+        self.waiting = 0
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_turns: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        session_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+    ):
+        self.max_turns = max(1, max_turns or _env_int("ADMISSION_MAX_TURNS", 8))
+        self.max_queue = max(0, max_queue if max_queue is not None else _env_int("ADMISSION_MAX_QUEUE", 32))
+        self.session_queue = max(0, session_queue if session_queue is not None else _env_int("ADMISSION_SESSION_QUEUE", 2))
+        self.queue_timeout = queue_timeout or _env_float("ADMISSION_QUEUE_TIMEOUT", 30.0)
+        self._slots = asyncio.Semaphore(self.max_turns)
+        self._sessions: Dict[str, _SessionQueue] = {}
+        self.active = 0
+        self.queued = 0
+        # smoothed turn duration, for Retry-After
+        self._turn_seconds = 5.0
+
+    def retry_after(self) -> int:
+        backlog = (self.queued + 1) / self.max_turns
+        return max(1, min(60, math.ceil(backlog * self._turn_seconds)))
+
+    def _full(self) -> bool:
+        # counts turns already waiting on the semaphore, not just those holding it
+        return self.active + self.queued >= self.max_turns + self.max_queue
+
+    def check(self, session_id: str):
+        """Fast capacity check (e.g. before starting a stream); raises AdmissionRejected."""
+        q = self._sessions.get(session_id)
+        if q is not None and q.lock.locked() and q.waiting >= self.session_queue:
+            metrics.incr("admission_rejected_total", reason="session_queue")
+            raise AdmissionRejected(429, "Another message from this session is still being processed.", self.retry_after())
+        if self._full():
+            metrics.incr("admission_rejected_total", reason="queue_full")
+            raise AdmissionRejected(503, "The assistant is busy. Try again shortly.", self.retry_after())
+
+    async def _acquire_slot(self) -> bool:
+        """
+        One of the global slots, or False after queue_timeout. Not wait_for:
+        it can swallow a cancel that lands as the slot is granted, leaving a
+        cancelled turn running (and holding the slot).
+        """
+        acquire = asyncio.ensure_future(self._slots.acquire())
+        try:
+            await asyncio.wait({acquire}, timeout=self.queue_timeout)
+        except BaseException:
+            # cancelled while queued: hand back a slot granted in the meantime
+            if not acquire.cancel() and not acquire.cancelled() and acquire.exception() is None:
+                self._slots.release()
+            raise
+        # still waiting: timed out (a cancelled acquire passes the slot on)
+        return not acquire.cancel()
+
+    def _gauges(self):
+        metrics.set_gauge("admission_active_turns", self.active)
+        metrics.set_gauge("admission_queued_turns", self.queued)
+        metrics.set_gauge("admission_sessions_waiting", sum(q.waiting for q in self._sessions.values()))
+
+    @asynccontextmanager
+    async def session(self, session_id: str, check: bool = True) -> AsyncIterator[None]:
+        """
+        Per-session FIFO serialization only (no global slot). check=False
+        waits however full the queues are (background work that was already
+        accepted, e.g. an approved write job, must not be refused).
+        """
+        if check:
+            self.check(session_id)
+        q = self._sessions.setdefault(session_id, _SessionQueue())
+        q.waiting += 1
+        self._gauges()
+        t0 = time.perf_counter()
+        try:
+            await q.lock.acquire()
+        except BaseException:
+            q.waiting -= 1
+            if not q.waiting and not q.lock.locked():
+                self._sessions.pop(session_id, None)
+            raise
+        q.waiting -= 1
+        metrics.observe("admission_wait_seconds", time.perf_counter() - t0, stage="session")
+        try:
+            yield
+        finally:
+            q.lock.release()
+            if not q.waiting and not q.lock.locked():
+                self._sessions.pop(session_id, None)
+            self._gauges()
+
+    @asynccontextmanager
+    async def turn(self, session_id: str) -> AsyncIterator[None]:
+        """Session FIFO, then one of ADMISSION_MAX_TURNS global slots."""
+        async with self.session(session_id):
+            if self._full():
+                metrics.incr("admission_rejected_total", reason="queue_full")
+                raise AdmissionRejected(503, "The assistant is busy. Try again shortly.", self.retry_after())
+
+            self.queued += 1
+            self._gauges()
+            t0 = time.perf_counter()
+            try:
+                acquired = await self._acquire_slot()
+            finally:
+                self.queued -= 1
+            if not acquired:
+                metrics.incr("admission_rejected_total", reason="queue_timeout")
+                raise AdmissionRejected(503, "The assistant is busy. Try again shortly.", self.retry_after())
+            metrics.observe("admission_wait_seconds", time.perf_counter() - t0, stage="global")
+
+            self.active += 1
+            self._gauges()
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.active -= 1
+                self._slots.release()
+                self._turn_seconds = 0.8 * self._turn_seconds + 0.2 * (time.perf_counter() - started)
+                self._gauges()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_turns": self.max_turns,
+            "max_queue": self.max_queue,
+            "sessions_waiting": sum(q.waiting for q in self._sessions.values()),
+            "avg_turn_seconds": round(self._turn_seconds, 3),
+        }
+
+
+class TokenBucket(BaseRateLimiter):
+    """
+    `rate` calls per second with bursts up to `burst`. Works as a LangChain
+    chat-model rate_limiter and is awaited directly before MCP calls.
+    """
+
+    def __init__(self, name: str, rate: float, burst: Optional[float] = None):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Takes a token if available; else returns seconds until one is."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        t0 = time.perf_counter()
+        while True:
+            wait = self._take()
+            if not wait:
+                break
+            if not blocking:
+                return False
+            time.sleep(wait)
+        metrics.observe("rate_limit_wait_seconds", time.perf_counter() - t0, limiter=self.name)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        t0 = time.perf_counter()
+        while True:
+            wait = self._take()
+            if not wait:
+                break
+            if not blocking:
+                return False
+            await asyncio.sleep(wait)
+        metrics.observe("rate_limit_wait_seconds", time.perf_counter() - t0, limiter=self.name)
+        return True
+
+
+_LIMITERS: Dict[str, Optional[TokenBucket]] = {}
+
+
+def get_rate_limiter(name: str) -> Optional[TokenBucket]:
+    """Process-wide bucket for "llm" (LLM_RATE_LIMIT) or "mcp" (MCP_RATE_LIMIT); None when unlimited."""
+    if name not in _LIMITERS:
+        prefix = name.upper()
+        rate = _env_float(f"{prefix}_RATE_LIMIT", 0.0)
+        burst = _env_float(f"{prefix}_RATE_BURST", rate)
+        _LIMITERS[name] = TokenBucket(name, rate, burst) if rate > 0 else None
+    return _LIMITERS[name]
+
+
+_ADMISSION: Optional[AdmissionController] = None
+
+
+def get_admission() -> AdmissionController:
+    global _ADMISSION
+    if _ADMISSION is None:
+        _ADMISSION = AdmissionController()
+    return _ADMISSION
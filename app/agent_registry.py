@@ -0,0 +1,68 @@
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.agents import create_agent
+from langchain_core.tools import BaseTool
+
+from . import metrics
+from .llm import get_chat_model
+
+
+class AgentRegistry:
+    """
+    Compiled agents keyed by (model, tool-set fingerprint, policy).
+
+    Building an agent compiles a LangGraph graph and converts every tool
+    schema; doing that once per key leaves only `ainvoke` on the hot path.
+    When the MCP tool list changes (new fingerprint) older entries are dropped.
+    """
+
+    def __init__(self):
+        self._agents: Dict[Tuple[str, str, str], Any] = {}
+        self._fingerprint: Optional[str] = None
+
+    def get(
+        self,
+        model_name: str,
+        tools: List[BaseTool],
+        fingerprint: str,
+        policy: str,
+        system_prompt: str,
+    ):
+        if fingerprint != self._fingerprint:
+            if self._agents:
+                metrics.incr("agent_registry_invalidations_total")
+            self._agents.clear()
+            self._fingerprint = fingerprint
+
+        key = (model_name, fingerprint, policy)
+        agent = self._agents.get(key)
+        if agent is not None:
+            metrics.incr("agent_registry_hits_total", policy=policy)
+            return agent
+
+        metrics.incr("agent_registry_misses_total", policy=policy)
+        t0 = time.perf_counter()
+        model = get_chat_model(model_name)
+        try:
+            agent = create_agent(model, tools, system_prompt=system_prompt)
+        except TypeError:
+            agent = create_agent(model, tools, prompt=system_prompt)
+        metrics.observe("agent_build_seconds", time.perf_counter() - t0, model=model_name, policy=policy)
+
+        self._agents[key] = agent
+        return agent
+
+    def clear(self):
+        self._agents.clear()
+        self._fingerprint = None
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+
+_REGISTRY = AgentRegistry()
+
+
+def get_registry() -> AgentRegistry:
+    return _REGISTRY
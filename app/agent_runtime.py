@@ -1,29 +1,39 @@
-import os
-from typing import List, Dict
+import re
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from langchain_openai import ChatOpenAI
-from langchain.agents import create_agent
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
 from langchain_core.tools import ToolException
 
-from .mcp_client import build_square_mcp_client
+from . import metrics, tracing
+from .agent_registry import get_registry
+from .charts import attach_charts, chart_block_problem
+from .context_window import clip_tokens
+from .llm import get_chat_model
+from .model_cascade import get_cascade
+from .schema_catalog import get_schema_catalog, schema_catalog_enabled
+from .square_api import get_agent_tools
 
 
 BASE_SYSTEM = """
 You are a Square Sandbox assistant connected through MCP, running inside a web app UI.
 
 IMPORTANT UI CAPABILITY:
-- This UI CAN display charts automatically if (and only if) you include a Chart.js config JSON wrapped EXACTLY like:
-<CHART_CONFIG>
-{ ... valid JSON ... }
-</CHART_CONFIG>
+- This UI CAN display charts automatically. Build them with the build_chart tool and put the
+  <CHART id="..."/> it returns in your reply; the server turns it into the chart.
 - Therefore: NEVER say "I can't display charts" or "copy this config to render". The UI renders it for the user.
 
 Tool rules:
 - Tool methods are strict. If a tool call fails and shows "Available methods", pick from that list and retry.
 - Orders search requires location_ids. If missing, call locations.list first.
+- For totals, counts, averages or chart data (revenue by item/day/month, prices, wages by role), use query_analytics.
+  It aggregates locally and returns dollars already (do NOT divide its values by 100).
 
 Money rules:
-- Square money fields are in cents (amount=3600 means $36.00). Convert to dollars in display.
+- make_api_request results show money already converted, e.g. "36.00 USD" (use as-is, do NOT divide by 100).
+  Raw Square money objects are in cents (amount=3600 means $36.00).
+- Money you SEND in requests is in the smallest unit (cents): $36.00 => {"amount": 3600, "currency": "USD"}.
+- Results may be trimmed; a "proj:..." cursor returns the next slice when passed back as request.cursor.
 
 Wage rules (CRITICAL — no guessing):
 - Wage data is hourly_rate (money) in team member wage_setting/job_assignments.
@@ -31,15 +41,17 @@ Wage rules (CRITICAL — no guessing):
 - For salary/wage/pay/rate questions:
   1) team.searchMembers (use name/context)
   2) team.getWageSetting if needed
-  3) report hourly_rate.amount/100 as $/hr
+  3) report hourly_rate in $/hr
   4) if missing, say not available in Square for that member.
 
 Visualization rule (CRITICAL):
 - If user asks for any chart/graph/plot/visualization OR it would help:
-  1) Fetch needed data via tools.
-  2) Reply briefly AND include <CHART_CONFIG> JSON.
-- If user asks for "labels inside" on pie/doughnut:
-  - Use Chart.js plugin "datalabels" via options.plugins.datalabels (JSON only).
+  1) Call build_chart with a query_analytics query (or a small table of values from other tools),
+     the chart type and grouping. Do NOT write data arrays or Chart.js JSON yourself.
+  2) Reply briefly AND include the <CHART id="..."/> it returned.
+- If user asks for "labels inside" on pie/doughnut: set labels_inside=true.
+- Only if build_chart cannot express the chart, write a Chart.js config JSON wrapped exactly in
+  <CHART_CONFIG>...</CHART_CONFIG>.
 """
 
 READ_ONLY_POLICY = """
@@ -58,12 +70,40 @@ MODE: WRITES ENABLED (APPROVED)
 """
 
 
-async def _get_agent():
-    client = build_square_mcp_client()
-    tools = await client.get_tools()
-    model = ChatOpenAI(model=os.environ.get("CHAT_MODEL", "gpt-4.1"))
-    agent = create_agent(model, tools)
-    return agent, client
+SCHEMA_INDEX_HEADER = """
+Square services and methods (use these exact names; call get_type_info only when you need a method's request fields):
+"""
+
+
+def _schema_section(read_only: bool) -> str:
+    catalog = get_schema_catalog()
+    if not schema_catalog_enabled() or not catalog.ready():
+        return ""
+    return SCHEMA_INDEX_HEADER + catalog.index(read_only=read_only) + "\n"
+
+
+def _tool_profile(messages: List[Dict[str, str]], allow_writes: bool) -> str:
+    """Which tool subset (square_api.TOOL_PROFILES) the turn gets."""
+    if allow_writes:
+        return "write"
+    return "chart" if _looks_like_chart_request(messages) else "read"
+
+
+async def _get_agent(allow_writes: bool, model: str, profile: Optional[str] = None):
+    profile = profile or ("write" if allow_writes else "read")
+    tools, fingerprint = await get_agent_tools(profile)
+    # the schema index is part of the prompt, so its version is part of the cache key
+    return get_registry().get(
+        model,
+        tools,
+        fingerprint=f"{fingerprint}:{get_schema_catalog().version}",
+        policy=profile,
+        system_prompt=(
+            BASE_SYSTEM
+            + _schema_section(read_only=not allow_writes)
+            + (WRITE_ALLOWED_POLICY if allow_writes else READ_ONLY_POLICY)
+        ),
+    )
 
 
 def _looks_like_wage_question(messages: List[Dict[str, str]]) -> bool:
@@ -101,71 +141,303 @@ def _has_chart_config(text: str) -> bool:
     return "<CHART_CONFIG>" in t and "</CHART_CONFIG>" in t
 
 
+def _chart_guard_note(problem: str) -> str:
+    if problem == "missing":
+        return (
+            "The user asked for a chart. You MUST call build_chart and include the <CHART id=\"...\"/> it returns "
+            "(or a valid Chart.js JSON config wrapped in <CHART_CONFIG>...</CHART_CONFIG>). "
+            "Do NOT say you can't display charts. Retry now."
+        )
+    return (
+        f"Your chart config will not render: {problem}. Call build_chart instead of writing the JSON, "
+        "and include the <CHART id=\"...\"/> it returns. Retry now."
+    )
+
+
 def _contains_weekly_salary_hallucination(text: str) -> bool:
     t = (text or "").lower()
     return ("per week" in t or "/week" in t or "weekly" in t) and ("tool" not in t)
 
 
-async def run_agent_turn(messages: List[Dict[str, str]], allow_writes: bool) -> str:
-    agent, client = await _get_agent()
+MAX_ATTEMPTS = 4
+GAVE_UP_REPLY = "I couldn't complete the request after retries. Try rephrasing the question."
+
+
+def _guard_failure(messages: List[Dict[str, str]], answer: str) -> Optional[Dict[str, str]]:
+    """
+    Returns {"reason", "content"} (a system note for the retry) if the answer
+    fails a guard, else None.
+    """
+    # Wage hallucination guard
+    if _looks_like_wage_question(messages) and _contains_weekly_salary_hallucination(answer):
+        return {
+            "reason": "wage_guard",
+            "content": (
+                "Your previous answer invented weekly salary. Not allowed.\n"
+                "Retry: fetch wage_setting/hourly_rate via team.searchMembers and team.getWageSetting.\n"
+                "Return hourly_rate as $/hr. If missing, say not available."
+            ),
+        }
+
+    # Chart omission guard (also catches a hand-written config the UI can't render)
+    if _looks_like_chart_request(messages) or _has_chart_config(answer):
+        problem = chart_block_problem(answer)
+        if problem:
+            return {"reason": "chart_guard", "content": _chart_guard_note(problem)}
+
+    return None
+
+
+def _tool_error_note(e: Exception, attempt: int) -> str:
+    return (
+        f"Tool error (attempt {attempt}/{MAX_ATTEMPTS}).\n\n{str(e)}\n\n"
+        "Recover by using only valid methods shown and retry."
+    )
+
+
+def _resume_after_tool_error(scratch: List[Any], state: List[Any], e: Exception, attempt: int) -> List[Any]:
+    """
+    Conversation to continue from after a ToolException: the steps that
+    already succeeded (`state`) plus the error as the failed calls' result,
+    so the agent doesn't repeat the tool calls that worked.
+    """
+    note = _tool_error_note(e, attempt)
+    resumed = list(state or scratch)
+    ask = next((i for i in range(len(resumed) - 1, -1, -1) if isinstance(resumed[i], AIMessage)), None)
+    calls = resumed[ask].tool_calls if ask is not None else []
+    answered = {m.tool_call_id for m in resumed[(ask or 0) + 1:] if isinstance(m, ToolMessage)}
+    open_calls = [c for c in calls if c["id"] not in answered]
+    if not open_calls:
+        return resumed + [{"role": "system", "content": note}]
+    # every tool_call needs a result before the model can be called again
+    return resumed + [ToolMessage(content=note, tool_call_id=c["id"], status="error") for c in open_calls]
+
+
+# ---- guard repair: fix the final answer from data already fetched
+
+REPAIR_DATA_TOKENS = 3000
+
+REPAIR_SYSTEM = """
+You are fixing the final answer of a Square assistant.
+The tool results below were already fetched for this question; do not ask for more data.
+Money in the results is already converted (e.g. "36.00 USD").
+"""
 
-    scratch = [
-        {"role": "system", "content": BASE_SYSTEM},
-        {"role": "system", "content": WRITE_ALLOWED_POLICY if allow_writes else READ_ONLY_POLICY},
-        *list(messages),
+REPAIR_INSTRUCTIONS = {
+    "chart_guard": (
+        "The user asked for a chart but the answer has no usable one. Using ONLY the tool results, reply with a "
+        "Chart.js config wrapped exactly in <CHART_CONFIG>...</CHART_CONFIG> and nothing else."
+    ),
+    "wage_guard": (
+        "The answer invented a weekly salary; Square only stores hourly_rate. Rewrite the answer using the "
+        "hourly_rate from the tool results as $/hr (say it is not available in Square if missing). "
+        "Do not mention weekly or monthly pay."
+    ),
+}
+
+_CHART_BLOCK = re.compile(r"<CHART_CONFIG>.*?</CHART_CONFIG>", re.S)
+
+
+def _turn_tool_results(state: List[Any]) -> List[str]:
+    """Tool results produced in this turn (after the last user message)."""
+    start = 0
+    for i, m in enumerate(state):
+        if isinstance(m, HumanMessage) or (isinstance(m, dict) and m.get("role") == "user"):
+            start = i + 1
+    return [
+        m.content if isinstance(m.content, str) else str(m.content)
+        for m in state[start:]
+        if isinstance(m, ToolMessage) and m.status != "error"
     ]
 
-    max_attempts = 4
 
+async def _repair(messages: List[Dict[str, str]], state: List[Any], answer: str, failed: Dict[str, str], model: str) -> Optional[str]:
+    """
+    One tool-less model call that fixes `answer` from the tool results the
+    turn already has. Returns the repaired answer, or None if there is
+    nothing to repair from or the repair still fails the guards.
+    """
+    reason = failed["reason"]
+    data = _turn_tool_results(state)
+    if reason not in REPAIR_INSTRUCTIONS or not data:
+        return None
+
+    question = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    per_result = max(200, REPAIR_DATA_TOKENS // len(data))
+    prompt = (
+        f"{REPAIR_INSTRUCTIONS[reason]}\n\n"
+        f"User question:\n{question}\n\n"
+        f"Draft answer:\n{answer}\n\n"
+        "Tool results:\n" + "\n---\n".join(clip_tokens(d, per_result) for d in data)
+    )
+
+    t0 = time.perf_counter()
+    with tracing.span("agent_repair", reason=reason) as s:
+        resp = await get_chat_model(model).ainvoke(
+            [SystemMessage(content=REPAIR_SYSTEM), HumanMessage(content=prompt)],
+            config=tracing.llm_config("repair"),
+        )
+        text = resp.content if isinstance(resp.content, str) else ""
+        if reason == "chart_guard":
+            block = _CHART_BLOCK.search(text)
+            fixed = f"{_CHART_BLOCK.sub('', answer).rstrip()}\n{block.group(0)}" if block else answer
+        else:
+            fixed = text.strip() or answer
+        ok = _guard_failure(messages, fixed) is None
+        s.set(outcome="ok" if ok else "failed")
+
+    metrics.incr("agent_repairs_total", reason=reason, outcome="ok" if ok else "failed")
+    metrics.observe("agent_repair_seconds", time.perf_counter() - t0, reason=reason)
+    return fixed if ok else None
+
+
+def _record_retry(turn, reason: str, attempt: int):
+    metrics.incr("agent_retries_total", reason=reason)
+    turn.set(retry_reason=reason, attempt=attempt)
+
+
+async def run_agent_turn(
+    messages: List[Dict[str, str]], allow_writes: bool, route: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    `route` (from route_intent, when known) lets the model cascade start
+    complex requests on the strong tier. Same loop as stream_agent_turn,
+    keeping only the final reply.
+    """
+    reply = GAVE_UP_REPLY
+    with tracing.span("agent_turn", writes=allow_writes, messages=len(messages)) as turn:
+        async for ev in _turn_events(messages, allow_writes, route, turn):
+            if ev["type"] == "final":
+                reply = ev["reply"]
+    return reply
+
+
+def _tool_event(kind: str, ev: Dict[str, Any]) -> Dict[str, Any]:
+    data = ev.get("data") or {}
+    args = data.get("input") if isinstance(data.get("input"), dict) else {}
+    out = {"type": kind, "tool": ev.get("name"), "run_id": ev.get("run_id")}
+    if args.get("service"):
+        out["service"] = args.get("service")
+        out["method"] = args.get("method")
+    return out
+
+
+async def stream_agent_turn(
+    messages: List[Dict[str, str]], allow_writes: bool, route: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Runs the agent turn, yielding events as it goes:
+      tool_start / tool_end  (tool, service, method)
+      token                  (text delta from the model)
+      repair                 (reason; the answer is being fixed from data already fetched)
+      retry                  (reason; the client should discard streamed text)
+      final                  (reply, including any <CHART_CONFIG> block)
+    """
+    # spans are opened without becoming "current": context changes don't cross yields
+    turn = tracing.start_span("agent_turn", writes=allow_writes, messages=len(messages), stream=True)
     try:
-        for attempt in range(1, max_attempts + 1):
-            try:
-                result = await agent.ainvoke({"messages": scratch})
-                answer = result["messages"][-1].content
-
-                # Wage hallucination guard
-                if _looks_like_wage_question(messages) and _contains_weekly_salary_hallucination(answer):
-                    scratch.append({
-                        "role": "system",
-                        "content": (
-                            "Your previous answer invented weekly salary. Not allowed.\n"
-                            "Retry: fetch wage_setting/hourly_rate via team.searchMembers and team.getWageSetting.\n"
-                            "Return $/hr (amount/100). If missing, say not available."
-                        )
-                    })
-                    continue
-
-                # Chart omission guard
-                if _looks_like_chart_request(messages) and not _has_chart_config(answer):
-                    scratch.append({
-                        "role": "system",
-                        "content": (
-                            "The user asked for a chart. You MUST include a valid Chart.js JSON config wrapped in "
-                            "<CHART_CONFIG>...</CHART_CONFIG>. Do NOT say you can't display charts. Retry now."
-                        )
-                    })
-                    continue
-
-                return answer
-
-            except ToolException as e:
-                scratch.append({
-                    "role": "system",
-                    "content": (
-                        f"Tool error (attempt {attempt}/{max_attempts}).\n\n{str(e)}\n\n"
-                        "Recover by using only valid methods shown and retry."
-                    ),
-                })
-
-        return "I couldn't complete the request after retries. Try rephrasing the question."
-
+        async for ev in _turn_events(messages, allow_writes, route, turn):
+            yield ev
     finally:
+        tracing.end_span(turn)
+
+
+async def _turn_events(
+    messages: List[Dict[str, str]], allow_writes: bool, route: Optional[Dict[str, Any]], turn
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    The agent turn loop behind run_agent_turn and stream_agent_turn: attempts
+    with guard repair, tool-error resume and model-cascade escalation. Always
+    ends with exactly one "final" event.
+    """
+    cascade = get_cascade()
+    start = tier = cascade.start_tier(route, allow_writes)
+    t0 = time.perf_counter()
+    profile = _tool_profile(messages, allow_writes)
+    wants_chart = _looks_like_chart_request(messages)
+    turn.set(profile=profile, model=cascade.model(tier))
+    agent = await _get_agent(allow_writes, cascade.model(tier), profile)
+
+    # BASE_SYSTEM + policy are compiled into the cached agent as its system prompt.
+    # Each attempt continues from the previous one's messages (tool results
+    # included) instead of starting the turn over.
+    scratch: List[Any] = list(messages)
+    tool_errors = 0
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        answer = ""
+        turn.set(attempts=attempt)
+        # rebuilt from events so a retry can continue from the steps already taken
+        state: List[Any] = list(scratch)
+        tool_error: Optional[ToolException] = None
+        span = tracing.start_span("agent_attempt", parent=turn, attempt=attempt, model=cascade.model(tier))
         try:
-            if hasattr(client, "aclose"):
-                await client.aclose()
-            elif hasattr(client, "close"):
-                maybe = client.close()
-                if hasattr(maybe, "__await__"):
-                    await maybe
-        except Exception:
-            pass
+            async for ev in agent.astream_events({"messages": scratch}, config=tracing.llm_config("agent"), version="v2"):
+                kind = ev.get("event")
+                if kind == "on_tool_start":
+                    yield _tool_event("tool_start", ev)
+                elif kind == "on_tool_end":
+                    output = (ev.get("data") or {}).get("output")
+                    if isinstance(output, ToolMessage):
+                        state.append(output)
+                    yield _tool_event("tool_end", ev)
+                elif kind == "on_chat_model_stream":
+                    chunk = (ev.get("data") or {}).get("chunk")
+                    text = getattr(chunk, "content", "")
+                    if isinstance(text, str) and text:
+                        yield {"type": "token", "text": text}
+                elif kind == "on_chat_model_end":
+                    output = (ev.get("data") or {}).get("output")
+                    if isinstance(output, AIMessage):
+                        state.append(output)
+                    content = getattr(output, "content", "")
+                    if isinstance(content, str):
+                        answer = content
+        except ToolException as e:
+            tool_error = e
+        finally:
+            tracing.end_span(span)
+
+        if tool_error is not None:
+            _record_retry(turn, "tool_error", attempt)
+            tool_errors += 1
+            scratch = _resume_after_tool_error(scratch, state, tool_error, attempt)
+            next_tier = cascade.escalate(tier, "tool_errors", tool_errors)
+            if next_tier != tier:
+                tier = next_tier
+                agent = await _get_agent(allow_writes, cascade.model(tier), profile)
+            yield {"type": "retry", "reason": "tool_error"}
+            continue
+
+        # <CHART id/> references -> the configs build_chart made this turn
+        answer = attach_charts(answer, state, wants_chart)
+        # state carries earlier attempts' tool results, so this is the turn total
+        turn.set(tool_calls=sum(isinstance(m, ToolMessage) for m in state))
+        failed = _guard_failure(messages, answer)
+        if not failed:
+            turn.set(model=cascade.model(tier))
+            cascade.record_turn(start, tier, time.perf_counter() - t0)
+            yield {"type": "final", "reply": answer}
+            return
+
+        # a cheaper tier's answer isn't worth repairing: continue on the next tier
+        next_tier = cascade.escalate(tier, "guard")
+        if next_tier == tier:
+            yield {"type": "repair", "reason": failed["reason"]}
+            repaired = await _repair(messages, state, answer, failed, cascade.model(tier))
+            if repaired is not None:
+                turn.set(model=cascade.model(tier))
+                cascade.record_turn(start, tier, time.perf_counter() - t0)
+                yield {"type": "final", "reply": repaired}
+                return
+        else:
+            tier = next_tier
+            agent = await _get_agent(allow_writes, cascade.model(tier), profile)
+
+        _record_retry(turn, failed["reason"], attempt)
+        scratch = state + [{"role": "system", "content": failed["content"]}]
+        yield {"type": "retry", "reason": failed["reason"]}
+
+    turn.set(gave_up=True, model=cascade.model(tier))
+    cascade.record_turn(start, tier, time.perf_counter() - t0)
+    yield {"type": "final", "reply": GAVE_UP_REPLY}
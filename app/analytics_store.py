@@ -0,0 +1,390 @@
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+from typing import Any, Dict, Iterable, List, Literal, Optional
+
+from langchain_core.tools import StructuredTool, ToolException
+from pydantic import BaseModel, Field
+
+from . import metrics
+from .answer_cache import note_service
+from .projection import CURRENCY_EXPONENT
+from .snapshot import get_snapshot
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog_items (
+    item_id TEXT, variation_id TEXT, item_name TEXT, variation_name TEXT,
+    category_id TEXT, price_cents INTEGER, currency TEXT
+);
+CREATE TABLE IF NOT EXISTS team_wages (
+    member_id TEXT, name TEXT, status TEXT, job_title TEXT, pay_type TEXT,
+    hourly_rate_cents INTEGER, currency TEXT
+);
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY, location_id TEXT, state TEXT, created_at TEXT,
+    created_day TEXT, created_month TEXT, total_cents INTEGER, currency TEXT
+);
+CREATE TABLE IF NOT EXISTS order_line_items (
+    order_id TEXT, location_id TEXT, state TEXT, created_at TEXT, created_day TEXT,
+    created_month TEXT, item_name TEXT, catalog_object_id TEXT, quantity REAL,
+    gross_cents INTEGER, currency TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_orders_day ON orders(created_day);
+CREATE INDEX IF NOT EXISTS ix_li_day ON order_line_items(created_day);
+CREATE INDEX IF NOT EXISTS ix_li_item ON order_line_items(item_name);
+"""
+
+# dataset -> (table, allowed dimensions, metrics {name: (sql expr, is_money)}, has dates)
+DATASETS: Dict[str, Dict[str, Any]] = {
+    "order_line_items": {
+        "table": "order_line_items",
+        "dimensions": ["item_name", "created_day", "created_month", "location_id", "state"],
+        "metrics": {
+            "revenue": ("SUM(gross_cents)", True),
+            "quantity": ("SUM(quantity)", False),
+            "orders": ("COUNT(DISTINCT order_id)", False),
+            "avg_line_revenue": ("AVG(gross_cents)", True),
+        },
+        "dated": True,
+    },
+    "orders": {
+        "table": "orders",
+        "dimensions": ["created_day", "created_month", "location_id", "state"],
+        "metrics": {
+            "revenue": ("SUM(total_cents)", True),
+            "orders": ("COUNT(*)", False),
+            "avg_order_value": ("AVG(total_cents)", True),
+        },
+        "dated": True,
+    },
+    "catalog_items": {
+        "table": "catalog_items",
+        "dimensions": ["item_name", "variation_name", "category_id"],
+        "metrics": {
+            "price": ("AVG(price_cents)", True),
+            "min_price": ("MIN(price_cents)", True),
+            "max_price": ("MAX(price_cents)", True),
+            "variations": ("COUNT(*)", False),
+            "items": ("COUNT(DISTINCT item_id)", False),
+        },
+        "dated": False,
+    },
+    "team_wages": {
+        "table": "team_wages",
+        "dimensions": ["name", "job_title", "status", "pay_type"],
+        "metrics": {
+            "hourly_rate": ("AVG(hourly_rate_cents)", True),
+            "max_hourly_rate": ("MAX(hourly_rate_cents)", True),
+            "members": ("COUNT(DISTINCT member_id)", False),
+        },
+        "dated": False,
+    },
+}
+
+SOURCES = {
+    "catalog": ["catalog_items"],
+    "team": ["team_wages"],
+    "orders": ["orders", "order_line_items"],
+}
+
+
+def _cents(money: Optional[dict]) -> Optional[int]:
+    if not money or money.get("amount") is None:
+        return None
+    return int(money["amount"])
+
+
+def _currency(money: Optional[dict]) -> str:
+    return (money or {}).get("currency") or "USD"
+
+
+def _catalog_rows(objects: Iterable[dict]) -> List[tuple]:
+    rows = []
+    for obj in objects:
+        if obj.get("type") != "ITEM":
+            continue
+        item = obj.get("item_data", {}) or {}
+        category = item.get("category_id") or ((item.get("categories") or [{}])[0] or {}).get("id")
+        for var in item.get("variations", []) or []:
+            vdata = var.get("item_variation_data", {}) or {}
+            pm = vdata.get("price_money")
+            rows.append((obj.get("id"), var.get("id"), item.get("name"), vdata.get("name"),
+                         category, _cents(pm), _currency(pm)))
+    return rows
+
+
+def _team_rows(members: Iterable[dict]) -> List[tuple]:
+    rows = []
+    for tm in members:
+        name = f"{tm.get('given_name','')} {tm.get('family_name','')}".strip()
+        jobs = (tm.get("wage_setting") or {}).get("job_assignments", []) or []
+        if not jobs:
+            rows.append((tm.get("id"), name, tm.get("status"), None, None, None, "USD"))
+        for j in jobs:
+            hr = j.get("hourly_rate")
+            rows.append((tm.get("id"), name, tm.get("status"), j.get("job_title"), j.get("pay_type"),
+                         _cents(hr), _currency(hr)))
+    return rows
+
+
+def _order_rows(orders: Iterable[dict]):
+    order_rows, line_rows = [], []
+    for o in orders:
+        created = o.get("created_at") or ""
+        day, month = created[:10], created[:7]
+        total = o.get("total_money")
+        order_rows.append((o.get("id"), o.get("location_id"), o.get("state"), created, day, month,
+                           _cents(total), _currency(total)))
+        for li in o.get("line_items", []) or []:
+            money = li.get("total_money") or li.get("gross_sales_money")
+            try:
+                qty = float(li.get("quantity") or 0)
+            except ValueError:
+                qty = 0.0
+            line_rows.append((o.get("id"), o.get("location_id"), o.get("state"), created, day, month,
+                              li.get("name"), li.get("catalog_object_id"), qty, _cents(money), _currency(money)))
+    return order_rows, line_rows
+
+
+class AnalyticsStore:
+    """
+    Embedded SQLite store of Square data for local aggregate queries.
+    Money is stored as integer cents and converted to dollars once, on output.
+    Fed from the snapshot (rebuilt per service when it changes).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.environ.get("ANALYTICS_DB_PATH", ":memory:")
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            if self.path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+        self.loaded: Dict[str, float] = {}
+        self._attached = False
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    def load_service(self, service: str, objects: Iterable[dict]):
+        """Rebuild the tables fed by one snapshot service (runs in a worker thread)."""
+        t0 = time.perf_counter()
+        if service == "catalog":
+            batches = {"catalog_items": _catalog_rows(objects)}
+        elif service == "team":
+            batches = {"team_wages": _team_rows(objects)}
+        elif service == "orders":
+            order_rows, line_rows = _order_rows(objects)
+            batches = {"orders": order_rows, "order_line_items": line_rows}
+        else:
+            return
+
+        with self._lock, self._conn:
+            for table, rows in batches.items():
+                self._conn.execute(f"DELETE FROM {table}")
+                if rows:
+                    marks = ",".join("?" * len(rows[0]))
+                    self._conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({marks})", rows)
+        self.loaded[service] = time.time()
+        metrics.observe("analytics_load_seconds", time.perf_counter() - t0, service=service)
+
+    def attach_snapshot(self):
+        if self._attached:
+            return
+        self._attached = True
+        snap = get_snapshot()
+        snap.watch_writes()
+        snap.add_listener(lambda service, objects, _changes: self._schedule_load(service, objects))
+        for service in SOURCES:
+            if service in snap.synced_at:
+                self._schedule_load(service, snap.data[service])
+
+    def _schedule_load(self, service: str, objects: Dict[str, dict]):
+        if service not in SOURCES:
+            return
+        # copy the values now: the snapshot keeps mutating its dicts on the loop thread
+        items = list(objects.values())
+        loop = asyncio.get_running_loop()
+        self._loading[service] = loop.run_in_executor(None, self.load_service, service, items)
+
+    async def ensure_loaded(self, dataset: str):
+        """
+        Make sure the source service has been synced at least once, has no
+        approved write it hasn't synced yet, and is not older than its
+        schedule when the background sync isn't running.
+        """
+        self.attach_snapshot()
+        service = next(s for s, tables in SOURCES.items() if dataset in tables)
+        snap = get_snapshot()
+        dirty = service in snap.dirty
+        age = time.time() - snap.synced_at.get(service, 0.0)
+        if service in self.loaded and not dirty and (snap.running or age < snap.schedule.get(service, 60.0)):
+            return
+        # no background sync, never synced, or changed by a write: refresh now, incrementally
+        if dirty or not snap.running or service not in snap.synced_at:
+            await snap.sync(service)
+        pending = self._loading.get(service)
+        if pending is not None:
+            await pending
+        if service not in self.loaded:
+            await asyncio.to_thread(self.load_service, service, list(snap.data[service].values()))
+
+    def query(
+        self,
+        dataset: str,
+        metric: str,
+        group_by: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        order: str = "desc",
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        spec = DATASETS.get(dataset)
+        if spec is None:
+            raise ToolException(f"Unknown dataset {dataset!r}. Available: {list(DATASETS)}")
+        if metric not in spec["metrics"]:
+            raise ToolException(f"Unknown metric {metric!r} for {dataset}. Available: {list(spec['metrics'])}")
+        group_by = list(group_by or [])
+        bad = [g for g in group_by + list((filters or {}).keys()) if g not in spec["dimensions"]]
+        if bad:
+            raise ToolException(f"Unknown dimension(s) {bad} for {dataset}. Available: {spec['dimensions']}")
+
+        expr, is_money = spec["metrics"][metric]
+        where, params = [], []
+        for col, val in (filters or {}).items():
+            if isinstance(val, list):
+                where.append(f"{col} IN ({','.join('?' * len(val))})")
+                params.extend(val)
+            else:
+                where.append(f"{col} = ?")
+                params.append(val)
+        if spec["dated"] and start:
+            where.append("created_at >= ?")
+            params.append(start)
+        if spec["dated"] and end:
+            where.append("created_at < ?")
+            params.append(end)
+
+        select = ", ".join(group_by + [f"{expr} AS {metric}"])
+        if is_money:
+            # amounts are in the smallest unit of their currency: never sum across currencies
+            select += ", currency"
+        sql = f"SELECT {select} FROM {spec['table']}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        grouping = group_by + (["currency"] if is_money else [])
+        if grouping:
+            sql += " GROUP BY " + ", ".join(grouping)
+        if group_by:
+            # time series read naturally in time order
+            if group_by[0] in ("created_day", "created_month"):
+                sql += f" ORDER BY {group_by[0]} ASC"
+            else:
+                sql += f" ORDER BY {metric} {'ASC' if order == 'asc' else 'DESC'}"
+        sql += " LIMIT ?"
+        params.append(max(1, min(int(limit), 1000)))
+
+        t0 = time.perf_counter()
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        metrics.observe("analytics_query_seconds", time.perf_counter() - t0, dataset=dataset)
+
+        currencies: set = set()
+        if is_money:
+            scaled = []
+            for r in rows:
+                *dims, v, currency = r
+                currency = (currency or "USD").upper()
+                currencies.add(currency)
+                exp = CURRENCY_EXPONENT.get(currency, 2)
+                scaled.append(dims + [None if v is None else round(v / (10 ** exp), exp)])
+            rows = scaled
+        else:
+            rows = [list(r[:-1]) + [round(r[-1], 4) if isinstance(r[-1], float) else r[-1]] for r in rows]
+
+        column = metric
+        if is_money:
+            if currencies <= {"USD"}:
+                column += "_dollars"
+            else:
+                column += "_" + currencies.copy().pop().lower() if len(currencies) == 1 else "_amount"
+        result: Dict[str, Any] = {
+            "dataset": dataset,
+            "columns": group_by + [column],
+            "rows": rows,
+        }
+        if is_money:
+            result["currency"] = sorted(currencies)[0] if len(currencies) == 1 else sorted(currencies)
+            if len(currencies) > 1:
+                result["note"] = f"Amounts mix currencies ({', '.join(sorted(currencies))}); only compare values in the same currency."
+        if spec["dated"]:
+            days = get_snapshot().orders_days
+            result["window"] = {
+                "orders_days": days,
+                "note": f"Only orders from the last {days:g} days are kept locally; older orders are not included.",
+            }
+        if len(group_by) == 1:
+            result["chart"] = {"labels": [r[0] for r in rows], "data": [r[-1] for r in rows]}
+        return result
+
+
+_STORE: Optional[AnalyticsStore] = None
+
+
+def get_store() -> AnalyticsStore:
+    global _STORE
+    if _STORE is None:
+        _STORE = AnalyticsStore()
+    return _STORE
+
+
+class AnalyticsQuery(BaseModel):
+    dataset: Literal["order_line_items", "orders", "catalog_items", "team_wages"] = Field(
+        description="order_line_items (revenue/quantity per item), orders, catalog_items (prices), team_wages (hourly rates)"
+    )
+    metric: str = Field(
+        description=(
+            "order_line_items: revenue|quantity|orders|avg_line_revenue; orders: revenue|orders|avg_order_value; "
+            "catalog_items: price|min_price|max_price|variations|items; team_wages: hourly_rate|max_hourly_rate|members"
+        )
+    )
+    group_by: List[str] = Field(
+        default_factory=list,
+        description=(
+            "dimensions: item_name, created_day, created_month, location_id, state (orders); "
+            "item_name, variation_name, category_id (catalog); name, job_title, status, pay_type (team)"
+        ),
+    )
+    filters: Dict[str, Any] = Field(default_factory=dict, description="equality filters on dimensions")
+    start: Optional[str] = Field(default=None, description="ISO date/time lower bound on created_at (orders only)")
+    end: Optional[str] = Field(default=None, description="ISO date/time upper bound on created_at (orders only)")
+    order: Literal["asc", "desc"] = "desc"
+    limit: int = 50
+
+
+async def query_analytics(**kwargs) -> Dict[str, Any]:
+    """The query_analytics tool: an AnalyticsQuery run on fresh local data."""
+    store = get_store()
+    await store.ensure_loaded(kwargs["dataset"])
+    for service, tables in SOURCES.items():
+        if kwargs["dataset"] in tables:
+            note_service(service)
+    return store.query(**kwargs)
+
+
+def analytics_tool() -> StructuredTool:
+    return StructuredTool.from_function(
+        coroutine=query_analytics,
+        name="query_analytics",
+        description=(
+            "Read-only aggregate queries over a local copy of Square orders, catalog and team data. "
+            "Use for totals, counts, averages and chart data (e.g. revenue by item, wages by role). "
+            "Money is returned in major units (dollars, not cents) with its currency. "
+            f"Orders and order_line_items only cover the last {get_snapshot().orders_days:g} days "
+            "(SNAPSHOT_ORDERS_DAYS); say so when answering about longer periods. "
+            "Result includes chart.labels/chart.data when grouping by one dimension."
+        ),
+        args_schema=AnalyticsQuery,
+    )
@@ -0,0 +1,202 @@
+"""
+Answer cache for read-intent chat turns.
+
+Only routes the router marked context_free (no earlier turns in the
+session: its first message, or the first after a clear) are cached or
+served, since a request routed with history may resolve "his"/"that" from
+it. Follow-up questions always run the agent.
+
+Keyed by the router's normalized_request: an exact normalized-text match
+first, then the closest entry by cosine similarity of the same hashed
+n-gram features the local intent classifier uses. Each entry remembers the
+Square services its turn read (make_api_request / query_analytics) and their
+read-cache generations, so an approved write to any of them invalidates it;
+entries also expire with the shortest read-cache TTL of those services
+(capped by ANSWER_CACHE_TTL).
+"""
+
+import os
+import re
+import time
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from . import metrics
+from .intent_classifier import featurize, normalize_text
+from .square_cache import get_cache
+
+# requests that still point at earlier turns can't be shared across sessions
+_DEICTIC = re.compile(
+    r"\b(it|its|that|this|those|these|them|him|his|her|hers|he|she|they|their|theirs|there|"
+    r"same|again|above|former|latter|previous)\b"
+)
+_NUMBERS = re.compile(r"\d+(?:\.\d+)?")
+# words that don't change the question ("show me the menu" == "show menu")
+_FILLER = {"a", "an", "the", "me", "my", "our", "please", "can", "you", "could", "would", "kindly", "us", "i", "want", "to", "see"}
+
+_USED: contextvars.ContextVar[Optional[Set[str]]] = contextvars.ContextVar("answer_cache_services", default=None)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def answer_cache_enabled() -> bool:
+    return os.environ.get("ANSWER_CACHE", "true").lower() == "true"
+
+
+@contextmanager
+def track_services() -> Iterator[Set[str]]:
+    """Collects the Square services read by code running in this context."""
+    used: Set[str] = set()
+    token = _USED.set(used)
+    try:
+        yield used
+    finally:
+        _USED.reset(token)
+
+
+def note_service(service: str):
+    used = _USED.get()
+    if used is not None:
+        used.add(service)
+
+
+def _similarity(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class _Entry:
+    __slots__ = ("key", "features", "numbers", "reply", "generations", "expires_at", "seconds", "hits")
+
+    def __init__(self, key, features, numbers, reply, generations, expires_at, seconds):
+        self.key = key
+        self.features = features
+        self.numbers = numbers
+        self.reply = reply
+        self.generations = generations
+        self.expires_at = expires_at
+        self.seconds = seconds
+        self.hits = 0
+
+
+class AnswerCache:
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None, threshold: Optional[float] = None):
+        self.max_entries = max_entries or int(_env_float("ANSWER_CACHE_MAX_ENTRIES", 256))
+        self.ttl = ttl or _env_float("ANSWER_CACHE_TTL", 300.0)
+        self.threshold = threshold or _env_float("ANSWER_CACHE_SIMILARITY", 0.9)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def cache_key(route: Dict[str, Any]) -> Optional[str]:
+        # only routes explicitly made without session history: one resolved with
+        # history may answer about someone else in another session
+        if route.get("intent") != "read" or route.get("context_free") is not True:
+            return None
+        text = normalize_text(route.get("normalized_request") or "")
+        if not text or _DEICTIC.search(text):
+            return None
+        return " ".join(w for w in text.split() if w not in _FILLER) or text
+
+    def _fresh(self, e: _Entry) -> bool:
+        if e.expires_at < time.monotonic():
+            return False
+        cache = get_cache()
+        return all(cache.generation(s) == g for s, g in e.generations.items())
+
+    def _find(self, key: str) -> Tuple[Optional[_Entry], str]:
+        e = self._entries.get(key)
+        if e is not None:
+            return e, "exact"
+        feats = featurize(key)
+        numbers = frozenset(_NUMBERS.findall(key))
+        best, best_sim = None, self.threshold
+        for cand in self._entries.values():
+            # "top 5" vs "top 10" are near-identical as text but not as questions
+            if cand.numbers != numbers:
+                continue
+            sim = _similarity(feats, cand.features)
+            if sim >= best_sim:
+                best, best_sim = cand, sim
+        return best, "similar"
+
+    def get(self, route: Dict[str, Any]) -> Optional[str]:
+        key = self.cache_key(route)
+        if key is None:
+            return None
+        e, match = self._find(key)
+        if e is not None and not self._fresh(e):
+            self._entries.pop(e.key, None)
+            metrics.incr("answer_cache_lookups_total", result="stale")
+            e = None
+        if e is None:
+            self.misses += 1
+            metrics.incr("answer_cache_lookups_total", result="miss")
+            return None
+        self._entries.move_to_end(e.key)
+        e.hits += 1
+        self.hits += 1
+        self.saved_seconds += e.seconds
+        metrics.incr("answer_cache_lookups_total", result="hit", match=match)
+        metrics.incr("answer_cache_saved_seconds_total", e.seconds)
+        return e.reply
+
+    def put(self, route: Dict[str, Any], reply: str, services: Set[str], seconds: float):
+        key = self.cache_key(route)
+        if key is None or not reply:
+            return
+        cache = get_cache()
+        ttl = min([self.ttl] + [cache.ttl_for(s) for s in services])
+        self._entries[key] = _Entry(
+            key=key,
+            features=featurize(key),
+            numbers=frozenset(_NUMBERS.findall(key)),
+            reply=reply,
+            generations={s: cache.generation(s) for s in services},
+            expires_at=time.monotonic() + ttl,
+            seconds=seconds,
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            metrics.incr("answer_cache_evictions_total")
+
+    def invalidate_service(self, service: str):
+        for key in [k for k, e in self._entries.items() if service in e.generations]:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+_ANSWERS: Optional[AnswerCache] = None
+
+
+def get_answer_cache() -> AnswerCache:
+    global _ANSWERS
+    if _ANSWERS is None:
+        _ANSWERS = AnswerCache()
+        # drop entries eagerly on writes (lookups also check generations)
+        get_cache().add_invalidation_listener(_ANSWERS.invalidate_service)
+    return _ANSWERS
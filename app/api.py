@@ -1,61 +1,126 @@
 import os
 import json
+import time
 import asyncio
 import pathlib
-from typing import Any, Dict, Optional
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Set, Tuple
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
-from .mcp_client import build_square_mcp_client
-from .agent_runtime import run_agent_turn
+from . import metrics, tracing
+from .admission import AdmissionRejected, get_admission
+from .mcp_pool import get_pool
+from .graph_workflow import get_square_summary
+from .snapshot import SERVICES as SNAPSHOT_SERVICES, get_snapshot, snapshot_enabled
+from .square_cache import get_cache
+from .agent_runtime import GAVE_UP_REPLY, run_agent_turn, stream_agent_turn
+from .answer_cache import answer_cache_enabled, get_answer_cache, track_services
+from .context_window import get_context_window
+from .model_cascade import get_cascade
+from .schema_catalog import get_schema_catalog, schema_catalog_enabled
 from .intent_router import route_intent
+from .resilience import get_resilience
+from .write_jobs import get_write_jobs, job_reply, write_jobs_enabled
 from .memory_store import (
     get_history,
     append_message,
     clear_history,
     set_pending,
     get_pending,
+    pop_pending,
     clear_pending,
+    get_store,
 )
 
-app = FastAPI(title="Square MCP Dashboard + Agent")
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the MCP session pool once; requests reuse its sessions.
+    pool = get_pool()
+    try:
+        await pool.start()
+    except Exception as e:
+        # Don't block startup (e.g. missing token); the pool retries lazily on first use.
+        logger.warning("MCP pool warm-up failed: %s", e)
+    if schema_catalog_enabled():
+        await get_schema_catalog().start()
+    if snapshot_enabled():
+        await get_snapshot().start()
+    if write_jobs_enabled():
+        # also resumes jobs a previous process left queued or unfinished
+        await get_write_jobs().start(_write_job_events)
+    try:
+        yield
+    finally:
+        # only what was started: the getters would create (and open files for) the others
+        if write_jobs_enabled():
+            await get_write_jobs().stop()
+        if snapshot_enabled():
+            await get_snapshot().stop()
+        if schema_catalog_enabled():
+            await get_schema_catalog().stop()
+        await pool.close()
+
+
+app = FastAPI(title="Square MCP Dashboard + Agent", lifespan=lifespan)
 
 WEB_DIR = pathlib.Path(__file__).resolve().parent.parent / "web"
 app.mount("/web", StaticFiles(directory=WEB_DIR), name="web")
 
 
-def unwrap_mcp_json(result: Any) -> Dict[str, Any]:
-    if isinstance(result, dict):
-        return result
-    if isinstance(result, str):
-        try:
-            return json.loads(result)
-        except Exception:
-            return {"raw": result}
-    if isinstance(result, list):
-        for block in result:
-            if isinstance(block, dict) and block.get("type") == "text" and "text" in block:
-                try:
-                    return json.loads(block["text"])
-                except Exception:
-                    return {"raw": block.get("text")}
-        return {"raw": result}
-    return {"raw": result}
-
-
-def money_to_decimal(money: Optional[dict]) -> Optional[float]:
-    if not money:
-        return None
-    amt = money.get("amount")
-    if amt is None:
-        return None
-    return round(amt / 100.0, 2)
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # One trace per API call; static pages and /metrics aren't traced.
+    if not request.url.path.startswith("/api/"):
+        return await call_next(request)
+
+    trace = tracing.start_trace(f"{request.method} {request.url.path}", **{"http.method": request.method})
+    try:
+        response = await call_next(request)
+    except BaseException as e:
+        tracing.end_span(trace.root, e)
+        tracing.finish_trace(trace)
+        raise
+    trace.root.set(**{"http.status_code": response.status_code})
+    response.headers["X-Trace-Id"] = trace.trace_id
+
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        # the body is still being produced; close the trace when the stream ends
+        body = response.body_iterator
+
+        async def traced_body():
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                tracing.finish_trace(trace)
+
+        response.body_iterator = traced_body()
+        return response
+
+    if tracing.debug_header_enabled() or request.headers.get("x-debug-timing") == "1":
+        response.headers["Server-Timing"] = trace.server_timing()
+    tracing.finish_trace(trace)
+    return response
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -69,94 +134,65 @@ def chat_page():
 
 
 @app.get("/api/summary")
-async def get_summary():
-    client = build_square_mcp_client()
-    tools = await client.get_tools()
-    make_api = next((t for t in tools if t.name.endswith("make_api_request")), None)
-    if make_api is None:
-        raise RuntimeError("make_api_request tool not found")
-
-    try:
-        loc_raw = await make_api.ainvoke({"service": "locations", "method": "list", "request": {}})
-        loc = unwrap_mcp_json(loc_raw)
-        locations = loc.get("locations", []) or []
-        location_id = locations[0]["id"] if locations else None
-
-        cat_raw = await make_api.ainvoke({
-            "service": "catalog",
-            "method": "list",
-            "request": {"types": "ITEM", "limit": 200},
-        })
-        cat = unwrap_mcp_json(cat_raw)
-        objects = cat.get("objects", []) or []
-
-        catalog_items = []
-        for obj in objects:
-            if obj.get("type") != "ITEM":
-                continue
-            item = obj.get("item_data", {})
-            variations = item.get("variations", [])
-            first_var = variations[0] if variations else {}
-            vdata = first_var.get("item_variation_data", {})
-            price_money = vdata.get("price_money", {})
-
-            catalog_items.append({
-                "id": obj.get("id"),
-                "name": item.get("name"),
-                "variation_id": first_var.get("id"),
-                "price": money_to_decimal(price_money),
-                "currency": price_money.get("currency", "USD") if price_money else "USD",
-            })
-
-        team_raw = await make_api.ainvoke({
-            "service": "team",
-            "method": "searchMembers",
-            "request": {"limit": 200},
-        })
-        team = unwrap_mcp_json(team_raw)
-        members = team.get("team_members", []) or []
-
-        team_members = []
-        for tm in members:
-            jobs = tm.get("wage_setting", {}).get("job_assignments", [])
-            hourly_money = None
-            for j in jobs:
-                if j.get("hourly_rate"):
-                    hourly_money = j.get("hourly_rate")
-                    break
-
-            team_members.append({
-                "id": tm.get("id"),
-                "name": f"{tm.get('given_name','')} {tm.get('family_name','')}".strip(),
-                "status": tm.get("status"),
-                "email": tm.get("email_address"),
-                "phone": tm.get("phone_number"),
-                "wage_per_hour": money_to_decimal(hourly_money),
-                "currency": (hourly_money or {}).get("currency", "USD") if hourly_money else "USD",
-            })
-
-        return {
-            "primary_location": {
-                "id": location_id,
-                "name": locations[0]["name"] if locations else None,
-                "status": locations[0]["status"] if locations else None,
-            },
-            "locations": locations,
-            "catalog_items": catalog_items,
-            "team_members": team_members,
-            "note": "Money values are normalized from cents to dollars (amount/100).",
-        }
-
-    finally:
-        try:
-            if hasattr(client, "aclose"):
-                await client.aclose()
-            elif hasattr(client, "close"):
-                maybe = client.close()
-                if asyncio.iscoroutine(maybe):
-                    await maybe
-        except Exception:
-            pass
+async def get_summary(fresh: bool = False):
+    # Served from the local snapshot when background sync is on and has data;
+    # fresh=true bypasses both the snapshot and the read cache.
+    snap = get_snapshot()
+    if snapshot_enabled() and snap.ready() and not fresh:
+        summary = snap.summary()
+    else:
+        summary = await get_square_summary(fresh=fresh)
+    locations = summary["locations"]
+    primary = locations[0] if locations else {}
+
+    return {
+        "primary_location": {
+            "id": primary.get("id"),
+            "name": primary.get("name"),
+            "status": primary.get("status"),
+        },
+        "locations": locations,
+        "catalog_items": summary["catalog_items"],
+        "team_members": summary["team_members"],
+        "orders": summary["orders"],
+        "sections": summary["meta"]["sections"],
+        "freshness": summary["meta"].get("freshness"),
+        "note": "Money values are normalized from cents to dollars (amount/100).",
+    }
+
+
+@app.post("/api/summary/resync")
+async def resync_summary(service: Optional[str] = None):
+    """Force a full (non-incremental) snapshot resync of one or all services."""
+    if service and service not in SNAPSHOT_SERVICES:
+        raise HTTPException(status_code=400, detail=f"service must be one of {list(SNAPSHOT_SERVICES)}")
+    snap = get_snapshot()
+    changes = await snap.resync([service] if service else None)
+    return {"changes": changes, "freshness": snap.freshness()}
+
+
+@app.get("/api/stats")
+def get_stats():
+    return {
+        "metrics": metrics.snapshot(),
+        "mcp_pool": get_pool().stats(),
+        "square_cache": get_cache().stats(),
+        "sessions": get_store().stats(),
+        "context": get_context_window().stats(),
+        "schema_catalog": get_schema_catalog().stats(),
+        "cascade": get_cascade().stats(),
+        "answer_cache": get_answer_cache().stats(),
+        "resilience": get_resilience().stats(),
+        "write_jobs": get_write_jobs().stats() if write_jobs_enabled() else None,
+        "admission": get_admission().stats(),
+        "tracing": tracing.get_exporter().stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # Prometheus text exposition of the same counters /api/stats returns as JSON
+    return PlainTextResponse(metrics.prometheus_text(), media_type="text/plain; version=0.0.4")
 
 
 class ChatRequest(BaseModel):
@@ -168,26 +204,64 @@ class ChatResponse(BaseModel):
     reply: str
     needs_confirm: bool = False
     pending_action_id: Optional[str] = None
+    # approved writes run as a background job; follow it at /api/jobs/{job_id}
+    job_id: Optional[str] = None
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    reply: str
+    attempts: int
+    created_at: float
+    updated_at: float
 
 
 class SessionOnly(BaseModel):
     session_id: str
 
 
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
-    session_id = req.session_id.strip()
-    user_text = req.message.strip()
+CLEAR_COMMANDS = ["/clear", "clear chat", "reset"]
 
-    # Always record user message
-    append_message(session_id, "user", user_text)
+# the router only looks at the last few turns (trimmed further to ROUTER_CONTEXT_TOKENS)
+ROUTER_HISTORY = 12
 
-    # Route intent using LLM (no hardcoded keywords)
-    history = get_history(session_id)
-    route = await route_intent(user_text, history=history)
 
-    if route["intent"] == "clear" or user_text.lower() in ["/clear", "clear chat", "reset"]:
+def _speculation_enabled() -> bool:
+    return os.environ.get("SPECULATIVE_READ", "false").lower() == "true"
+
+
+def _speculation_fits(route: Dict[str, Any]) -> bool:
+    """Whether the speculative turn (started without a route) ran as the routed turn would."""
+    cascade = get_cascade()
+    return cascade.start_tier(route, allow_writes=False) == cascade.start_tier(None, allow_writes=False)
+
+
+async def _timed(coro, stage: str, mode: str):
+    t0 = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        metrics.observe("chat_stage_seconds", time.perf_counter() - t0, stage=stage, mode=mode)
+
+
+async def _cancel(task: Optional[asyncio.Task]):
+    if task is None or task.done():
+        return
+    task.cancel()
+    try:
+        await task
+    except BaseException:
+        pass
+
+
+def _route_shortcut(session_id: str, user_text: str, route: Dict[str, Any]) -> Optional[ChatResponse]:
+    """
+    Handles clear/write intents (no agent turn needed). Returns None for read/unknown.
+    """
+    if route["intent"] == "clear" or user_text.lower() in CLEAR_COMMANDS:
         clear_history(session_id)
+        get_context_window().forget(session_id)
         return ChatResponse(reply="✅ Cleared chat.", needs_confirm=False)
 
     if route["intent"] == "write" and route["needs_confirm"]:
@@ -199,45 +273,346 @@ async def chat(req: ChatRequest):
             pending_action_id=action_id,
         )
 
-    # Read / unknown: run read-only agent turn
-    reply = await run_agent_turn(get_history(session_id), allow_writes=False)
-    append_message(session_id, "assistant", reply)
-    return ChatResponse(reply=reply, needs_confirm=False)
+    return None
 
 
-@app.post("/api/chat/approve", response_model=ChatResponse)
-async def chat_approve(req: SessionOnly):
-    session_id = req.session_id.strip()
-    pending = get_pending(session_id)
-    if not pending:
-        return ChatResponse(reply="No pending action to approve.", needs_confirm=False)
+def _begin_approval(session_id: str):
+    """
+    Returns (early ChatResponse, None) when nothing can run, else (None, pending)
+    with the pending action consumed and recorded in history. pending["context"]
+    is the history as it was before the approved request (what a write job runs on).
+    """
+    no_pending = ChatResponse(reply="No pending action to approve.", needs_confirm=False)
+    if not get_pending(session_id):
+        return no_pending, None
 
     disallow = (os.environ.get("DISALLOW_WRITES", "true").lower() == "true")
     if disallow:
         return ChatResponse(
             reply="Writes are disabled (DISALLOW_WRITES=true). Set DISALLOW_WRITES=false in .env and restart.",
             needs_confirm=False,
-        )
+        ), None
+
+    # atomic take: a double-clicked Approve (or a second worker) gets nothing
+    pending = pop_pending(session_id)
+    if not pending:
+        return no_pending, None
+    pending["context"] = get_history(session_id)
+    append_message(session_id, "user", pending["user_request"])
+    return None, pending
 
-    user_request = pending["user_request"]
-    clear_pending(session_id)
 
-    # Execute with writes enabled
-    append_message(session_id, "user", user_request)
-    reply = await run_agent_turn(get_history(session_id), allow_writes=True)
+async def _read_turn(history, route: Optional[Dict[str, Any]] = None) -> Tuple[str, Set[str], float]:
+    """Read-only agent turn plus the Square services it read and how long it took."""
+    t0 = time.perf_counter()
+    with track_services() as used:
+        reply = await run_agent_turn(history, allow_writes=False, route=route)
+    return reply, used, time.perf_counter() - t0
+
+
+def _cached_answer(route: Dict[str, Any]) -> Optional[str]:
+    return get_answer_cache().get(route) if answer_cache_enabled() else None
+
+
+def _remember_answer(route: Dict[str, Any], reply: str, used: Set[str], seconds: float):
+    if answer_cache_enabled() and reply != GAVE_UP_REPLY:
+        get_answer_cache().put(route, reply, used, seconds)
+
+
+async def _agent_history(session_id: str):
+    """Session history fitted to CONTEXT_BUDGET_TOKENS (older turns folded into a summary)."""
+    return await get_context_window().fit(session_id, get_history(session_id), get_pending(session_id))
+
+
+def _router_history(session_id: str):
+    """What the router sees, on every path: the newest ROUTER_HISTORY messages."""
+    return get_history(session_id, last=ROUTER_HISTORY)
+
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    session_id = req.session_id.strip()
+    # one turn at a time per session (FIFO), bounded concurrency overall
+    async with get_admission().turn(session_id):
+        return await _chat_turn(session_id, req.message.strip())
+
+
+async def _chat_turn(session_id: str, user_text: str) -> ChatResponse:
+    t0 = time.perf_counter()
+
+    # Always record user message
+    append_message(session_id, "user", user_text)
+
+    # Fitting the history may mean an LLM summary call: it runs while the router does
+    history_task = asyncio.create_task(_agent_history(session_id))
+
+    # Speculative mode: start the read-only turn while the router runs.
+    # Safe because the read-only policy never sees write permission. It runs
+    # without a route, so it is discarded if the route would change the turn.
+    speculative = None
+    mode = "serial"
+    if _speculation_enabled() and user_text.lower() not in CLEAR_COMMANDS:
+        mode = "speculative"
+
+        async def speculate():
+            # shielded: discarding the speculation must not cancel the history the real turn needs
+            return await _read_turn(await asyncio.shield(history_task))
+
+        speculative = asyncio.create_task(_timed(speculate(), "agent", mode))
+
+    # Route intent using LLM (no hardcoded keywords)
+    try:
+        route = await _timed(route_intent(user_text, history=_router_history(session_id)), "route", mode)
+    except BaseException:
+        await _cancel(speculative)
+        await _cancel(history_task)
+        raise
+
+    shortcut = _route_shortcut(session_id, user_text, route)
+    if shortcut is not None:
+        # history first, before anything awaits: a summary must not land after a clear
+        await _cancel(history_task)
+        await _cancel(speculative)
+        if speculative is not None:
+            metrics.incr("chat_speculation_total", outcome="cancelled")
+        return shortcut
+
+    # Read / unknown: a cached answer for the same question and data, else a
+    # read-only agent turn (or the speculative one)
+    reply = _cached_answer(route)
+    if reply is not None:
+        await _cancel(speculative)
+        await _cancel(history_task)
+        if speculative is not None:
+            metrics.incr("chat_speculation_total", outcome="cancelled")
+    else:
+        if speculative is not None and not _speculation_fits(route):
+            # e.g. a complex request that starts on the strong tier
+            await _cancel(speculative)
+            metrics.incr("chat_speculation_total", outcome="discarded")
+            speculative = None
+        if speculative is not None:
+            metrics.incr("chat_speculation_total", outcome="used")
+            reply, used, seconds = await speculative
+        else:
+            reply, used, seconds = await _timed(_read_turn(await history_task, route), "agent", mode)
+        _remember_answer(route, reply, used, seconds)
     append_message(session_id, "assistant", reply)
+    metrics.observe("chat_stage_seconds", time.perf_counter() - t0, stage="total", mode=mode)
+    return ChatResponse(reply=reply, needs_confirm=False)
+
+
+@app.post("/api/chat/approve", response_model=ChatResponse)
+async def chat_approve(req: SessionOnly):
+    session_id = req.session_id.strip()
+    if write_jobs_enabled():
+        early, pending = _begin_approval(session_id)
+        if early is not None:
+            return early
+        job = get_write_jobs().submit(session_id, pending)
+        return ChatResponse(reply=job_reply(job), needs_confirm=False, job_id=job["job_id"])
+
+    async with get_admission().turn(session_id):
+        early, _ = _begin_approval(session_id)
+        if early is not None:
+            return early
+
+        # Execute with writes enabled
+        reply = await run_agent_turn(await _agent_history(session_id), allow_writes=True)
+        append_message(session_id, "assistant", reply)
 
     return ChatResponse(reply=reply, needs_confirm=False)
 
 
+# ---- Server-sent events (token streaming) ----
+
+def _sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def _sse_final(resp: ChatResponse) -> str:
+    return _sse({
+        "type": "final",
+        "reply": resp.reply,
+        "needs_confirm": resp.needs_confirm,
+        "pending_action_id": resp.pending_action_id,
+        "job_id": resp.job_id,
+    })
+
+
+def _sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _stream_turn(
+    session_id: str,
+    allow_writes: bool,
+    route: Optional[Dict[str, Any]] = None,
+    history_task: Optional[asyncio.Task] = None,
+):
+    t0 = time.perf_counter()
+    history = await (history_task if history_task is not None else _agent_history(session_id))
+    with track_services() as used:
+        async for ev in stream_agent_turn(history, allow_writes=allow_writes, route=route):
+            if ev["type"] == "final":
+                append_message(session_id, "assistant", ev["reply"])
+                if route is not None and not allow_writes:
+                    _remember_answer(route, ev["reply"], used, time.perf_counter() - t0)
+                yield _sse_final(ChatResponse(reply=ev["reply"], needs_confirm=False))
+            else:
+                yield _sse(ev)
+
+
+def _admitted(session_id: str, events):
+    """
+    Runs an SSE generator inside the session's admission turn. Full queues
+    are refused with 429/503 before the stream starts; a turn that still
+    can't get a slot ends the stream with a final message.
+    """
+    get_admission().check(session_id)
+
+    async def run():
+        try:
+            async with get_admission().turn(session_id):
+                async for chunk in events():
+                    yield chunk
+        except AdmissionRejected as e:
+            yield _sse_final(ChatResponse(reply=f"{e.reason} (retry in {e.retry_after}s)", needs_confirm=False))
+
+    return _sse_response(run())
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(req: ChatRequest):
+    session_id = req.session_id.strip()
+    user_text = req.message.strip()
+
+    async def events():
+        # first byte goes out before routing starts
+        yield _sse({"type": "status", "text": "Thinking…"})
+        append_message(session_id, "user", user_text)
+
+        # same router context as /api/chat; the history is fitted meanwhile
+        history_task = asyncio.create_task(_agent_history(session_id))
+        try:
+            route = await route_intent(user_text, history=_router_history(session_id))
+            shortcut = _route_shortcut(session_id, user_text, route)
+            if shortcut is not None:
+                await _cancel(history_task)
+                yield _sse_final(shortcut)
+                return
+
+            cached = _cached_answer(route)
+            if cached is not None:
+                await _cancel(history_task)
+                append_message(session_id, "assistant", cached)
+                yield _sse_final(ChatResponse(reply=cached, needs_confirm=False))
+                return
+
+            async for chunk in _stream_turn(session_id, allow_writes=False, route=route, history_task=history_task):
+                yield chunk
+        finally:
+            # a dropped stream or failed route doesn't leave the summary call running
+            await _cancel(history_task)
+
+    return _admitted(session_id, events)
+
+
+@app.post("/api/chat/approve/stream")
+async def chat_approve_stream(req: SessionOnly):
+    session_id = req.session_id.strip()
+
+    if write_jobs_enabled():
+        async def job_events():
+            early, pending = _begin_approval(session_id)
+            if early is not None:
+                yield _sse_final(early)
+                return
+            job = get_write_jobs().submit(session_id, pending)
+            # the job keeps running if this stream is dropped
+            yield _sse({"type": "job", "job_id": job["job_id"]})
+            async for chunk in _job_stream(job["job_id"]):
+                yield chunk
+
+        return _sse_response(job_events())
+
+    async def events():
+        early, _ = _begin_approval(session_id)
+        if early is not None:
+            yield _sse_final(early)
+            return
+        yield _sse({"type": "status", "text": "Applying changes…"})
+        async for chunk in _stream_turn(session_id, allow_writes=True):
+            yield chunk
+
+    return _admitted(session_id, events)
+
+
+async def _write_job_events(job: Dict[str, Any]):
+    """
+    Runner for write jobs: the approved request on the conversation it was
+    approved in (both stored in the job), in order with the session's other
+    turns. Later messages in the session never reach the write-enabled agent.
+    """
+    messages = list(job["context"]) + [{"role": "user", "content": job["user_request"]}]
+    # queued behind the session's turns, but never refused: the write was approved
+    async with get_admission().session(job["session_id"], check=False):
+        history = await get_context_window().fit(job["session_id"], messages)
+        async for ev in stream_agent_turn(history, allow_writes=True):
+            if ev["type"] == "final" and ev.get("reply") == GAVE_UP_REPLY:
+                # the agent gave up: the job failed, even though the turn ended normally
+                ev = {**ev, "error": "the agent gave up after retries"}
+            yield ev
+
+
+async def _job_stream(job_id: str):
+    async for ev in get_write_jobs().follow(job_id):
+        if ev["type"] == "final":
+            yield _sse_final(ChatResponse(reply=ev["reply"], needs_confirm=False, job_id=job_id))
+        else:
+            yield _sse(ev)
+
+
+def _job_or_404(job_id: str) -> Dict[str, Any]:
+    job = get_write_jobs().get(job_id) if write_jobs_enabled() else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+
+@app.get("/api/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    job = _job_or_404(job_id)
+    return JobStatus(
+        job_id=job["job_id"],
+        status=job["status"],
+        reply=job_reply(job),
+        attempts=job["attempts"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+    )
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def get_job_events(job_id: str):
+    _job_or_404(job_id)
+    return _sse_response(_job_stream(job_id))
+
+
 @app.post("/api/chat/reject", response_model=ChatResponse)
 async def chat_reject(req: SessionOnly):
     session_id = req.session_id.strip()
-    pending = get_pending(session_id)
-    if not pending:
-        return ChatResponse(reply="No pending action to reject.", needs_confirm=False)
-
-    clear_pending(session_id)
-    msg = "✅ Cancelled. No changes were made."
-    append_message(session_id, "assistant", msg)
+    # waits for an in-flight turn of this session (no agent slot needed)
+    async with get_admission().session(session_id):
+        pending = get_pending(session_id)
+        if not pending:
+            return ChatResponse(reply="No pending action to reject.", needs_confirm=False)
+
+        clear_pending(session_id)
+        msg = "✅ Cancelled. No changes were made."
+        append_message(session_id, "assistant", msg)
     return ChatResponse(reply=msg, needs_confirm=False)
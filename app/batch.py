@@ -0,0 +1,232 @@
+"""
+Batch evaluation: replays prompts from a JSONL file through the same
+router + run_agent_turn path the chat API uses, N at a time over one shared
+MCP pool, and appends one result line per prompt as it finishes.
+
+    MODE=batch BATCH_INPUT=prompts.jsonl BATCH_OUTPUT=results.jsonl BATCH_CONCURRENCY=8 python -m app.main
+
+Input lines are JSON objects with the prompt in "prompt", "message", "text",
+"input" or "body" (or "messages": [{"role", "content"}, ...] for a
+multi-turn history), an optional "id"/"request_id", or bare JSON strings.
+Write-intent prompts are routed but not executed unless BATCH_ALLOW_WRITES=true.
+
+Each result has the route, reply, latency, LLM calls and tokens, tool calls,
+guard retries/repairs and the final model, taken from the prompt's trace.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from . import metrics, tracing
+from .agent_runtime import GAVE_UP_REPLY, run_agent_turn
+from .intent_router import route_intent
+from .mcp_pool import get_pool
+from .schema_catalog import get_schema_catalog, schema_catalog_enabled
+
+PROMPT_FIELDS = ("prompt", "message", "text", "input", "body")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def parse_line(line: str, lineno: int) -> Optional[Dict[str, Any]]:
+    """{"id", "messages"} for one input line, or None for blanks/unusable lines."""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        data = json.loads(line)
+    except ValueError:
+        # plain-text prompt files work too
+        data = line
+    if isinstance(data, str):
+        return {"id": str(lineno), "messages": [{"role": "user", "content": data}]}
+    if not isinstance(data, dict):
+        return None
+
+    item_id = str(data.get("id") or data.get("request_id") or lineno)
+    messages = data.get("messages")
+    if isinstance(messages, list) and messages:
+        messages = [
+            {"role": str(m.get("role") or "user"), "content": str(m.get("content") or "")}
+            for m in messages if isinstance(m, dict)
+        ]
+    else:
+        text = next((data[f] for f in PROMPT_FIELDS if isinstance(data.get(f), str) and data[f].strip()), None)
+        if text is None:
+            return None
+        messages = [{"role": "user", "content": text}]
+    if not messages or messages[-1]["role"] != "user":
+        return None
+    return {"id": item_id, "messages": messages}
+
+
+def read_prompts(path: str, limit: int = 0) -> Iterator[Dict[str, Any]]:
+    n = 0
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            item = parse_line(line, lineno)
+            if item is None:
+                continue
+            yield item
+            n += 1
+            if limit and n >= limit:
+                return
+
+
+def trace_summary(trace: tracing.Trace) -> Dict[str, Any]:
+    """LLM calls/tokens, tool calls and retries recorded under one trace."""
+    out: Dict[str, Any] = {
+        "llm_calls": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "tool_calls": 0,
+        "square_requests": 0,
+        "retries": 0,
+        "repairs": 0,
+        "model": None,
+    }
+    for s in trace.spans:
+        a = s.attributes
+        if s.name == "llm":
+            out["llm_calls"] += 1
+            out["input_tokens"] += a.get("llm.input_tokens") or 0
+            out["output_tokens"] += a.get("llm.output_tokens") or 0
+        elif s.name == "square_request":
+            out["square_requests"] += 1
+        elif s.name == "agent_repair":
+            out["repairs"] += 1
+        elif s.name == "agent_turn":
+            out["tool_calls"] += a.get("tool_calls") or 0
+            out["retries"] += max(0, (a.get("attempts") or 1) - 1)
+            out["model"] = a.get("model")
+    return out
+
+
+async def run_one(item: Dict[str, Any], allow_writes: bool) -> Dict[str, Any]:
+    trace = tracing.start_trace("batch", **{"batch.id": item["id"]})
+    messages = item["messages"]
+    user_text = messages[-1]["content"]
+    result: Dict[str, Any] = {"id": item["id"], "prompt": user_text}
+    t0 = time.perf_counter()
+    try:
+        route = await route_intent(user_text, history=messages[:-1])
+        result["intent"] = route.get("intent")
+        result["complexity"] = route.get("complexity")
+        if route["intent"] == "clear":
+            result["status"] = "skipped"
+        elif route["intent"] == "write" and route.get("needs_confirm") and not allow_writes:
+            result["status"] = "needs_confirm"
+        else:
+            writes = route["intent"] == "write"
+            if writes:
+                # what /api/chat/approve would run
+                messages = messages[:-1] + [{"role": "user", "content": route.get("normalized_request") or user_text}]
+            reply = await run_agent_turn(messages, allow_writes=writes, route=route)
+            result["status"] = "gave_up" if reply == GAVE_UP_REPLY else "ok"
+            result["reply"] = reply
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"[:500]
+        tracing.end_span(trace.root, e)
+    result["seconds"] = round(time.perf_counter() - t0, 3)
+    tracing.finish_trace(trace)
+    result.update(trace_summary(trace))
+    result["trace_id"] = trace.trace_id
+    metrics.incr("batch_prompts_total", status=result["status"])
+    metrics.observe("batch_prompt_seconds", result["seconds"], status=result["status"])
+    return result
+
+
+async def run_batch(
+    input_path: str,
+    output_path: str,
+    concurrency: int = 4,
+    limit: int = 0,
+    allow_writes: bool = False,
+) -> Dict[str, Any]:
+    """
+    Runs every prompt in `input_path`, `concurrency` at a time, appending
+    results to `output_path` in completion order. Returns a summary.
+    """
+    pool = get_pool()
+    await pool.start()
+    catalog = get_schema_catalog()
+    if schema_catalog_enabled():
+        await catalog.start()
+
+    queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize=concurrency * 2)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    tokens = [0, 0]
+    t0 = time.perf_counter()
+
+    out = open(output_path, "a", encoding="utf-8")
+
+    async def feed():
+        for item in read_prompts(input_path, limit):
+            await queue.put(item)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            # own task: start_trace() must not leak into the next prompt's context
+            result = await asyncio.create_task(run_one(item, allow_writes))
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            latencies.append(result["seconds"])
+            statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+            tokens[0] += result["input_tokens"]
+            tokens[1] += result["output_tokens"]
+
+    try:
+        await asyncio.gather(feed(), *(worker() for _ in range(concurrency)))
+    finally:
+        out.close()
+        await catalog.stop()
+        await pool.close()
+
+    elapsed = time.perf_counter() - t0
+    return {
+        "prompts": len(latencies),
+        "statuses": statuses,
+        "seconds": round(elapsed, 3),
+        "prompts_per_second": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "p50_seconds": round(metrics.quantile(latencies, 0.50), 3),
+        "p95_seconds": round(metrics.quantile(latencies, 0.95), 3),
+        "p99_seconds": round(metrics.quantile(latencies, 0.99), 3),
+        "input_tokens": tokens[0],
+        "output_tokens": tokens[1],
+        "concurrency": concurrency,
+        "output": output_path,
+    }
+
+
+def batch_settings() -> Tuple[str, str, int, int, bool]:
+    input_path = os.environ.get("BATCH_INPUT") or "requests.jsonl"
+    output_path = os.environ.get("BATCH_OUTPUT") or "batch_results.jsonl"
+    concurrency = max(1, _env_int("BATCH_CONCURRENCY", 4))
+    limit = max(0, _env_int("BATCH_LIMIT", 0))
+    allow_writes = os.environ.get("BATCH_ALLOW_WRITES", "false").lower() == "true"
+    return input_path, output_path, concurrency, limit, allow_writes
+
+
+async def run_batch_from_env():
+    input_path, output_path, concurrency, limit, allow_writes = batch_settings()
+    if not os.path.exists(input_path):
+        print(f"BATCH_INPUT not found: {input_path}", file=sys.stderr)
+        return
+    summary = await run_batch(input_path, output_path, concurrency, limit, allow_writes)
+    print(json.dumps(summary, indent=2))
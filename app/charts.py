@@ -0,0 +1,416 @@
+"""
+Server-side chart builder (the build_chart tool).
+
+The agent sends a compact spec: chart type, the data (a query_analytics
+query or a small inline table) and how to group it. The server aggregates,
+downsamples, validates and colors it into a Chart.js config. The model only
+sees a short summary with a chart id and writes <CHART id="..."/> in its
+reply; attach_charts() swaps that for the <CHART_CONFIG> block the UI renders.
+The full config travels as the ToolMessage artifact, so data arrays never
+pass through the model.
+
+- time-ordered series longer than CHART_MAX_POINTS (default 200) are
+  downsampled with LTTB (largest triangle three buckets)
+- category charts keep the CHART_MAX_CATEGORIES (default 20) largest
+  labels and fold the rest into "Other"
+"""
+
+import os
+import re
+import json
+import math
+import hashlib
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple
+
+from langchain_core.messages import HumanMessage, ToolMessage
+from langchain_core.tools import StructuredTool, ToolException
+from pydantic import BaseModel, Field
+
+from . import metrics, tracing
+from .analytics_store import AnalyticsQuery, query_analytics
+
+CHART_TOOL = "build_chart"
+
+CHART_TYPES = ("bar", "line", "pie", "doughnut", "polarArea", "radar")
+RADIAL = ("pie", "doughnut", "polarArea")
+TIME_DIMENSIONS = ("created_day", "created_month")
+MAX_SERIES = 12
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}(-\d{2})?")
+CHART_REF = re.compile(r"<CHART\s+id=[\"']?(ch_[0-9a-f]+)[\"']?\s*/?>")
+_CHART_BLOCK = re.compile(r"<CHART_CONFIG>(.*?)</CHART_CONFIG>", re.S)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class ChartTable(BaseModel):
+    columns: List[str] = Field(description="column names")
+    rows: List[List[Any]] = Field(description="rows of values, one per record")
+
+
+class ChartSpec(BaseModel):
+    type: Literal["bar", "line", "pie", "doughnut", "polarArea", "radar"] = "bar"
+    title: Optional[str] = None
+    query: Optional[AnalyticsQuery] = Field(
+        default=None,
+        description="query_analytics arguments to chart (preferred); group_by[0] is the x axis, group_by[1] splits series",
+    )
+    table: Optional[ChartTable] = Field(
+        default=None, description="inline data when the numbers came from make_api_request instead"
+    )
+    x: Optional[str] = Field(default=None, description="table column for labels (default: first column)")
+    y: Optional[str] = Field(default=None, description="table column to plot (default: last column)")
+    series: Optional[str] = Field(default=None, description="table column that splits the data into datasets")
+    agg: Literal["sum", "avg", "count", "min", "max"] = Field(
+        default="sum", description="how table rows with the same label (and series) are combined"
+    )
+    stacked: bool = False
+    horizontal: bool = False
+    labels_inside: bool = Field(default=False, description="value labels on slices/bars (datalabels plugin)")
+
+
+def _number(v: Any) -> Optional[float]:
+    if isinstance(v, bool) or v is None:
+        return None
+    if isinstance(v, (int, float)):
+        return float(v) if math.isfinite(v) else None
+    if isinstance(v, str):
+        try:
+            f = float(v.replace(",", "").replace("$", "").split()[0])
+        except (ValueError, IndexError):
+            return None
+        return f if math.isfinite(f) else None
+    return None
+
+
+def _column(columns: List[str], name: Optional[str], default: int) -> int:
+    if name is None:
+        return default if columns else -1
+    if name not in columns:
+        raise ToolException(f"Unknown column {name!r}. Columns: {columns}")
+    return columns.index(name)
+
+
+def aggregate(
+    columns: List[str],
+    rows: Sequence[Sequence[Any]],
+    x: Optional[str] = None,
+    y: Optional[str] = None,
+    series: Optional[str] = None,
+    agg: str = "sum",
+) -> Tuple[List[str], Dict[str, List[Optional[float]]]]:
+    """(labels, {series name: values aligned with labels}) from tabular rows."""
+    if not columns:
+        raise ToolException("The table has no columns.")
+    xi = _column(columns, x, 0)
+    yi = _column(columns, y, len(columns) - 1)
+    si = _column(columns, series, -1) if series else -1
+
+    labels: Dict[str, None] = {}
+    names: Dict[str, None] = {}
+    cells: Dict[Tuple[str, str], List[float]] = {}
+    for row in rows:
+        if len(row) != len(columns):
+            continue
+        label = "" if row[xi] is None else str(row[xi])
+        name = str(row[si]) if si >= 0 else (columns[yi] if agg != "count" else "count")
+        value = 1.0 if agg == "count" else _number(row[yi])
+        labels.setdefault(label, None)
+        names.setdefault(name, None)
+        if value is not None:
+            cells.setdefault((label, name), []).append(value)
+
+    def combine(vals: List[float]) -> Optional[float]:
+        if not vals:
+            return None
+        if agg == "avg":
+            return sum(vals) / len(vals)
+        if agg == "min":
+            return min(vals)
+        if agg == "max":
+            return max(vals)
+        return sum(vals)
+
+    out = {n: [combine(cells.get((label, n), [])) for label in labels] for n in names}
+    return list(labels), out
+
+
+def lttb(values: Sequence[Optional[float]], threshold: int) -> List[int]:
+    """Indices of `values` kept by largest-triangle-three-buckets downsampling."""
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    ys = [v or 0.0 for v in values]
+    keep = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # average of the next bucket is the third triangle point
+        start = int(math.floor((i + 1) * every)) + 1
+        end = min(int(math.floor((i + 2) * every)) + 1, n)
+        avg_x = (start + end - 1) / 2.0
+        avg_y = sum(ys[start:end]) / max(1, end - start)
+
+        lo = int(math.floor(i * every)) + 1
+        hi = int(math.floor((i + 1) * every)) + 1
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((a - avg_x) * (ys[j] - ys[a]) - (a - j) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        keep.append(best)
+        a = best
+    keep.append(n - 1)
+    return keep
+
+
+def _ordered(labels: List[str], x_name: Optional[str]) -> bool:
+    if x_name in TIME_DIMENSIONS:
+        return True
+    return bool(labels) and all(_ISO_DATE.match(label) for label in labels)
+
+
+def downsample(
+    chart_type: str, labels: List[str], data: Dict[str, List[Optional[float]]], ordered: bool
+) -> Tuple[List[str], Dict[str, List[Optional[float]]]]:
+    """Fewer points for long time series (LTTB) or many categories (top N + Other)."""
+    if ordered and chart_type not in RADIAL:
+        limit = max(3, _env_int("CHART_MAX_POINTS", 200))
+        if len(labels) <= limit:
+            return labels, data
+        # one index set for every series so they share the label axis
+        totals = [sum(v[i] or 0.0 for v in data.values()) for i in range(len(labels))]
+        keep = lttb(totals, limit)
+        return [labels[i] for i in keep], {n: [v[i] for i in keep] for n, v in data.items()}
+
+    limit = max(2, _env_int("CHART_MAX_CATEGORIES", 20))
+    if len(labels) <= limit:
+        return labels, data
+    totals = [sum(abs(v[i] or 0.0) for v in data.values()) for i in range(len(labels))]
+    top = sorted(sorted(range(len(labels)), key=lambda i: -totals[i])[: limit - 1])
+    kept = set(top)
+    rest = [i for i in range(len(labels)) if i not in kept]
+    out = {}
+    for n, v in data.items():
+        other = [v[i] for i in rest if v[i] is not None]
+        out[n] = [v[i] for i in top] + [sum(other) if other else None]
+    return [labels[i] for i in top] + [f"Other ({len(rest)})"], out
+
+
+def _hue(i: int) -> int:
+    # same palette as ensureDatasetColors in web/chat.js
+    return (i * 57) % 360
+
+
+def _color_datasets(chart_type: str, datasets: List[Dict[str, Any]], n_labels: int):
+    for idx, d in enumerate(datasets):
+        if chart_type in RADIAL:
+            d["backgroundColor"] = [f"hsla({_hue(i)}, 70%, 55%, 0.55)" for i in range(n_labels)]
+            d["borderColor"] = [f"hsl({_hue(i)}, 70%, 45%)" for i in range(n_labels)]
+        else:
+            d["borderColor"] = f"hsl({_hue(idx)}, 70%, 55%)"
+            d["backgroundColor"] = f"hsla({_hue(idx)}, 70%, 55%, 0.35)"
+
+
+def _series_label(name: str) -> str:
+    # column names (revenue_dollars, hourly_rate) read better as "Revenue ($)", "Hourly Rate"
+    if name.endswith("_dollars"):
+        return name[: -len("_dollars")].replace("_", " ").title() + " ($)"
+    return name.replace("_", " ").title() if re.fullmatch(r"[a-z_]+", name) else name
+
+
+def chart_config(spec: ChartSpec, labels: List[str], data: Dict[str, List[Optional[float]]]) -> Dict[str, Any]:
+    datasets = [
+        {"label": _series_label(n), "data": [None if v is None else round(v, 2) for v in values]}
+        for n, values in data.items()
+    ]
+    if spec.type == "line":
+        for d in datasets:
+            d["tension"] = 0.2
+            d["pointRadius"] = 0 if len(labels) > 60 else 3
+    _color_datasets(spec.type, datasets, len(labels))
+
+    plugins: Dict[str, Any] = {"legend": {"display": len(datasets) > 1 or spec.type in RADIAL}}
+    if spec.title:
+        plugins["title"] = {"display": True, "text": spec.title}
+    if spec.labels_inside:
+        plugins["datalabels"] = {"color": "#fff", "font": {"weight": "bold"}}
+    options: Dict[str, Any] = {"responsive": True, "maintainAspectRatio": False, "plugins": plugins}
+    if spec.type in ("bar", "line"):
+        options["scales"] = {"x": {"stacked": spec.stacked}, "y": {"stacked": spec.stacked, "beginAtZero": True}}
+        if spec.horizontal and spec.type == "bar":
+            options["indexAxis"] = "y"
+    return {"type": spec.type, "data": {"labels": labels, "datasets": datasets}, "options": options}
+
+
+def validate_config(config: Any) -> Optional[str]:
+    """Why `config` would not render as a Chart.js chart, or None if it looks fine."""
+    if not isinstance(config, dict):
+        return "config must be a JSON object"
+    if config.get("type") not in CHART_TYPES + ("scatter", "bubble"):
+        return f"type must be one of {list(CHART_TYPES)}"
+    data = config.get("data")
+    if not isinstance(data, dict) or not isinstance(data.get("datasets"), list) or not data["datasets"]:
+        return "data.datasets must be a non-empty list"
+    labels = data.get("labels")
+    if labels is not None and not isinstance(labels, list):
+        return "data.labels must be a list"
+    for d in data["datasets"]:
+        if not isinstance(d, dict) or not isinstance(d.get("data"), list):
+            return "every dataset needs a data list"
+        if config["type"] in ("scatter", "bubble"):
+            continue
+        if labels is not None and len(d["data"]) != len(labels):
+            return f"dataset {d.get('label')!r} has {len(d['data'])} values for {len(labels)} labels"
+        if any(v is not None and _number(v) is None for v in d["data"]):
+            return f"dataset {d.get('label')!r} has non-numeric values"
+    return None
+
+
+def _chart_id(config: Dict[str, Any]) -> str:
+    raw = json.dumps(config, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return "ch_" + hashlib.sha1(raw).hexdigest()[:10]
+
+
+def _summary(chart_id: str, spec: ChartSpec, labels: List[str], data: Dict[str, List[Optional[float]]], kept: int) -> str:
+    # enough for the model to describe the chart, without the data arrays
+    preview = {}
+    for n, values in list(data.items())[:3]:
+        ranked = sorted(((v, l) for l, v in zip(labels, values) if v is not None), reverse=True)
+        preview[_series_label(n)] = {
+            "total": round(sum(v for v, _ in ranked), 2),
+            "top": [[l, round(v, 2)] for v, l in ranked[:3]],
+        }
+    out = {
+        "chart_id": chart_id,
+        "type": spec.type,
+        "labels": kept,
+        "series": [_series_label(n) for n in data],
+        "preview": preview,
+        "use": f'Put <CHART id="{chart_id}"/> in your reply where the chart goes. Do not write the data out.',
+    }
+    if kept < len(labels):
+        out["downsampled_from"] = len(labels)
+    return json.dumps(out, ensure_ascii=False, separators=(",", ":"))
+
+
+async def _build_chart(**kwargs) -> Tuple[str, Dict[str, Any]]:
+    spec = ChartSpec(**kwargs)
+    with tracing.span("build_chart", type=spec.type) as s:
+        if spec.query is not None:
+            query = spec.query.model_dump()
+            if "limit" not in spec.query.model_fields_set:
+                # downsampling, not the 50-row default, decides how much is drawn
+                query["limit"] = 1000
+            result = await query_analytics(**query)
+            columns, rows = result["columns"], result["rows"]
+            group_by = spec.query.group_by
+            x = group_by[0] if group_by else None
+            series = group_by[1] if len(group_by) > 1 else None
+            if not group_by:
+                columns, rows = ["label"] + columns, [[spec.query.metric] + list(r) for r in rows]
+            labels, data = aggregate(columns, rows, x=x, series=series)
+        elif spec.table is not None:
+            x = spec.x
+            labels, data = aggregate(spec.table.columns, spec.table.rows, x=spec.x, y=spec.y, series=spec.series, agg=spec.agg)
+            if x is None and spec.table.columns:
+                x = spec.table.columns[0]
+        else:
+            raise ToolException("build_chart needs either query (query_analytics arguments) or table.")
+
+        if not labels:
+            raise ToolException("No data to chart for that query.")
+        if len(data) > MAX_SERIES:
+            raise ToolException(f"Too many series ({len(data)}); at most {MAX_SERIES}. Group by fewer values.")
+        if spec.type in RADIAL and len(data) > 1:
+            raise ToolException(f"A {spec.type} chart shows one series; drop the second grouping or use a bar chart.")
+
+        # the summary describes every point, not just the ones drawn
+        summary_data = (labels, data)
+        points = len(labels)
+        labels, data = downsample(spec.type, labels, data, _ordered(labels, x))
+        config = chart_config(spec, labels, data)
+        problem = validate_config(config)
+        if problem:
+            raise ToolException(f"Could not build the chart: {problem}")
+
+        chart_id = _chart_id(config)
+        s.set(points=points, kept=len(labels), series=len(data))
+    metrics.incr("charts_built_total", type=spec.type, source="query" if spec.query is not None else "table")
+    if points > len(labels):
+        metrics.incr("chart_points_dropped_total", points - len(labels))
+    return _summary(chart_id, spec, *summary_data, kept=len(labels)), {"chart_id": chart_id, "config": config}
+
+
+def chart_tool() -> StructuredTool:
+    return StructuredTool.from_function(
+        coroutine=_build_chart,
+        name=CHART_TOOL,
+        description=(
+            "Build a chart on the server from a compact spec: type, a query_analytics query (or a small table "
+            "of values from other tools) and grouping. Aggregates, downsamples and styles the data, then returns "
+            "a chart id to reference as <CHART id=\"...\"/> in the reply instead of writing Chart.js JSON."
+        ),
+        args_schema=ChartSpec,
+        response_format="content_and_artifact",
+    )
+
+
+def _turn_charts(state: Sequence[Any]) -> Dict[str, Dict[str, Any]]:
+    """chart_id -> config for the charts built in this turn (after the last user message)."""
+    start = 0
+    for i, m in enumerate(state):
+        if isinstance(m, HumanMessage) or (isinstance(m, dict) and m.get("role") == "user"):
+            start = i + 1
+    charts: Dict[str, Dict[str, Any]] = {}
+    for m in state[start:]:
+        if isinstance(m, ToolMessage) and m.name == CHART_TOOL and isinstance(m.artifact, dict):
+            charts[m.artifact["chart_id"]] = m.artifact["config"]
+    return charts
+
+
+def _block(config: Dict[str, Any]) -> str:
+    return f"<CHART_CONFIG>\n{json.dumps(config, ensure_ascii=False, separators=(',', ':'))}\n</CHART_CONFIG>"
+
+
+def attach_charts(answer: str, state: Sequence[Any], want_chart: bool) -> str:
+    """
+    Replaces <CHART id="..."/> references in `answer` with the configs built
+    this turn. If a chart was wanted and built but not referenced, the last
+    one is appended (no repair round trip needed).
+    """
+    charts = _turn_charts(state)
+    if not charts and "<CHART " not in (answer or ""):
+        return answer
+
+    def expand(m: "re.Match") -> str:
+        config = charts.get(m.group(1))
+        return _block(config) if config else ""
+
+    text = CHART_REF.sub(expand, answer or "")
+    if charts and want_chart and not has_chart_block(text):
+        text = f"{text.rstrip()}\n{_block(list(charts.values())[-1])}"
+        metrics.incr("charts_attached_total")
+    return text
+
+
+def has_chart_block(text: str) -> bool:
+    t = text or ""
+    return "<CHART_CONFIG>" in t and "</CHART_CONFIG>" in t
+
+
+def chart_block_problem(text: str) -> Optional[str]:
+    """Why the first <CHART_CONFIG> block in `text` won't render, or None."""
+    m = _CHART_BLOCK.search(text or "")
+    if m is None:
+        return "missing"
+    try:
+        config = json.loads(m.group(1).strip())
+    except ValueError as e:
+        return f"invalid JSON ({e})"
+    return validate_config(config)
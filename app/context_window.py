@@ -0,0 +1,267 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from . import metrics, tracing
+from .llm import chat_model_name, get_chat_model, router_model_name
+
+logger = logging.getLogger(__name__)
+
+# role/separator overhead the chat format adds per message
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PREFIX = "Summary of the earlier conversation (older turns were folded to save context):\n"
+
+SUMMARY_SYSTEM = """
+You maintain a running summary of a chat between a user and a Square Sandbox assistant.
+Update the summary with the new turns. Keep names, IDs, locations, prices, wages, dates,
+decisions and open requests; drop chit-chat and raw JSON. Plain bullet points only.
+"""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+@lru_cache(maxsize=1)
+def _encoder():
+    """tiktoken encoding for the chat model, or None (falls back to ~4 chars/token)."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(chat_model_name())
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # offline hosts can't download the BPE files
+        logger.info("tiktoken unavailable (%s); estimating tokens from length", e)
+        return None
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    enc = _encoder()
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def message_tokens(m: Dict[str, str]) -> int:
+    return count_tokens(m.get("content") or "") + MESSAGE_OVERHEAD
+
+
+def clip_tokens(text: str, max_tokens: int) -> str:
+    """`text` cut to about max_tokens (marked with " …" when cut)."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    return text[: max_tokens * 4] + " …"
+
+
+def router_context(history: List[Dict[str, str]], budget: Optional[int] = None) -> List[Dict[str, str]]:
+    """
+    Newest messages that fit the router's token budget (ROUTER_CONTEXT_TOKENS).
+    Long messages (chart configs, tables) are clipped rather than dropping
+    everything before them.
+    """
+    budget = budget if budget is not None else _env_int("ROUTER_CONTEXT_TOKENS", 300)
+    per_message = max(16, budget // 3)
+    out: List[Dict[str, str]] = []
+    used = 0
+    for m in reversed(history or []):
+        content = clip_tokens(m.get("content") or "", per_message)
+        cost = count_tokens(content) + MESSAGE_OVERHEAD
+        if out and used + cost > budget:
+            break
+        out.append({"role": m.get("role", ""), "content": content})
+        used += cost
+    out.reverse()
+    return out
+
+
+def _digest_at(messages: List[Dict[str, str]], i: int) -> str:
+    """Identifies message i by itself and its predecessor (repeated "show me"s don't collide)."""
+    h = hashlib.sha1()
+    for m in messages[max(0, i - 1) : i + 1]:
+        h.update(f"{m.get('role')}\x00{m.get('content')}\x01".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _has_chart(m: Dict[str, str]) -> bool:
+    return m.get("role") == "assistant" and "<CHART_CONFIG>" in (m.get("content") or "")
+
+
+class _Summary:
+    __slots__ = ("text", "upto")
+
+    def __init__(self, text: str, upto: str):
+        self.text = text
+        self.upto = upto  # digest of the last folded message
+
+
+class ContextWindow:
+    """
+    Fits a session's history into CONTEXT_BUDGET_TOKENS for the agent.
+
+    Under budget the history goes through unchanged. Over budget the newest
+    turns are kept verbatim (at least CONTEXT_KEEP_MESSAGES, filling about
+    60% of the budget so the next few turns don't fold again), the most
+    recent chart config and the pending action stay pinned, and everything
+    older is folded into a rolling summary. Summaries are cached per session
+    and only extended with the turns folded since the last call.
+    """
+
+    def __init__(self, budget: Optional[int] = None, keep_messages: Optional[int] = None, max_sessions: int = 1024):
+        self.budget = budget or max(500, _env_int("CONTEXT_BUDGET_TOKENS", 6000))
+        self.keep_messages = keep_messages or max(2, _env_int("CONTEXT_KEEP_MESSAGES", 6))
+        self.summary_tokens = max(100, _env_int("CONTEXT_SUMMARY_TOKENS", 400))
+        self.max_sessions = max_sessions
+        self._summaries: "OrderedDict[str, _Summary]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _split(self, messages: List[Dict[str, str]]) -> int:
+        """Index of the first message kept verbatim."""
+        target = int(self.budget * 0.6)
+        used = 0
+        cut = len(messages)
+        for i in range(len(messages) - 1, -1, -1):
+            used += message_tokens(messages[i])
+            if len(messages) - i > self.keep_messages and used > target:
+                break
+            cut = i
+        return cut
+
+    async def fit(
+        self,
+        session_id: str,
+        messages: List[Dict[str, str]],
+        pending: Optional[dict] = None,
+    ) -> List[Dict[str, str]]:
+        pinned: List[Dict[str, str]] = []
+        if pending and pending.get("user_request"):
+            pinned.append({
+                "role": "system",
+                "content": f"Pending write awaiting the user's Approve/Reject: {pending['user_request']}",
+            })
+
+        total = sum(message_tokens(m) for m in messages) + sum(message_tokens(m) for m in pinned)
+        metrics.observe("context_history_tokens", total)
+        if total <= self.budget:
+            return pinned + messages if pinned else messages
+
+        # reuse the cached fold point while the unfolded tail still fits
+        cut = self._cached_cut(session_id, messages)
+        if cut is not None:
+            summary_cost = count_tokens(self._summaries[session_id].text) + MESSAGE_OVERHEAD
+            if summary_cost + sum(message_tokens(m) for m in messages[cut:]) > self.budget:
+                cut = None
+        if cut is None:
+            cut = self._split(messages)
+        older, recent = messages[:cut], messages[cut:]
+
+        # keep the latest chart verbatim so "make it a pie instead" still works
+        if not any(_has_chart(m) for m in recent):
+            for i in range(len(older) - 1, -1, -1):
+                if _has_chart(older[i]):
+                    pinned.append(older[i])
+                    break
+
+        summary = await self._summarize(session_id, older) if older else ""
+        out: List[Dict[str, str]] = []
+        if summary:
+            out.append({"role": "system", "content": SUMMARY_PREFIX + summary})
+        out.extend(pinned)
+        out.extend(recent)
+        metrics.observe("context_window_tokens", sum(message_tokens(m) for m in out))
+        return out
+
+    def _cached_cut(self, session_id: str, messages: List[Dict[str, str]]) -> Optional[int]:
+        cached = self._summaries.get(session_id)
+        if cached is None:
+            return None
+        for i in range(len(messages) - 1, -1, -1):
+            if _digest_at(messages, i) == cached.upto:
+                return i + 1
+        return None
+
+    async def _summarize(self, session_id: str, older: List[Dict[str, str]]) -> str:
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            cached = self._summaries.get(session_id)
+            new = older
+            base = ""
+            if cached is not None:
+                upto = _digest_at(older, len(older) - 1)
+                if upto == cached.upto:
+                    self._summaries.move_to_end(session_id)
+                    metrics.incr("context_summary_total", outcome="cached")
+                    return cached.text
+                for i in range(len(older) - 1, -1, -1):
+                    if _digest_at(older, i) == cached.upto:
+                        base = cached.text
+                        new = older[i + 1 :]
+                        break
+
+            t0 = time.perf_counter()
+            with tracing.span("context_summary", folded=len(new), incremental=bool(base)):
+                text = await self._extend(base, new)
+            metrics.observe("context_summary_seconds", time.perf_counter() - t0)
+            metrics.incr("context_summary_total", outcome="incremental" if base else "full")
+
+            self._summaries[session_id] = _Summary(text, _digest_at(older, len(older) - 1))
+            self._summaries.move_to_end(session_id)
+            while len(self._summaries) > self.max_sessions:
+                evicted, _ = self._summaries.popitem(last=False)
+                self._locks.pop(evicted, None)
+            return text
+
+    async def _extend(self, base: str, new: List[Dict[str, str]]) -> str:
+        per_message = max(50, self.summary_tokens // 2)
+        turns = "\n".join(f"{m.get('role', '')}: {clip_tokens(m.get('content') or '', per_message)}" for m in new)
+        prompt = f"Current summary:\n{base or '(empty)'}\n\nNew turns:\n{turns}\n\nReturn the updated summary."
+        model_name = os.environ.get("SUMMARY_MODEL") or router_model_name()
+        try:
+            resp = await get_chat_model(model_name, temperature=0).ainvoke([
+                {"role": "system", "content": SUMMARY_SYSTEM},
+                {"role": "user", "content": prompt},
+            ], config=tracing.llm_config("summary"))
+            text = resp.content if isinstance(resp.content, str) else ""
+        except Exception as e:
+            logger.warning("Context summary failed, keeping an extractive one: %s", e)
+            text = ""
+        if not text.strip():
+            # extractive fallback: clipped lines, dropping the oldest past the cap
+            lines = (base.splitlines() if base else []) + [
+                f"- {m.get('role', '')}: {clip_tokens(m.get('content') or '', 40)}" for m in new
+            ]
+            while len(lines) > 1 and count_tokens("\n".join(lines)) > self.summary_tokens:
+                lines.pop(0)
+            text = "\n".join(lines)
+        return clip_tokens(text.strip(), self.summary_tokens)
+
+    def forget(self, session_id: str):
+        self._summaries.pop(session_id, None)
+        self._locks.pop(session_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"budget": self.budget, "cached_summaries": len(self._summaries)}
+
+
+_WINDOW: Optional[ContextWindow] = None
+
+
+def get_context_window() -> ContextWindow:
+    global _WINDOW
+    if _WINDOW is None:
+        _WINDOW = ContextWindow()
+    return _WINDOW
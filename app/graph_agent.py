@@ -2,16 +2,28 @@ from langchain.agents import create_agent
 from langchain_openai import ChatOpenAI
 
 from .mcp_client import build_square_mcp_client
+from .schema_catalog import get_schema_catalog
 
 
 SYSTEM_INSTRUCTIONS = (
     "You are a Square Sandbox assistant.\n"
     "- Prefer read-only calls.\n"
     "- If a request would create/update/delete anything, ask for confirmation first.\n"
-    "- When unsure, use get_service_info and get_type_info before make_api_request.\n"
+    "- Use the service/method names listed below; call get_type_info only when you need a method's request fields.\n"
 )
 
 
+def system_instructions() -> str:
+    # index harvested by the app (models/square_schema.json); without it the
+    # agent falls back to discovering methods through get_service_info
+    catalog = get_schema_catalog()
+    if not catalog.ready():
+        catalog.load()
+    if not catalog.ready():
+        return SYSTEM_INSTRUCTIONS + "- When unsure, use get_service_info before make_api_request.\n"
+    return SYSTEM_INSTRUCTIONS + "\nSquare services and methods:\n" + catalog.index() + "\n"
+
+
 async def run_agent_demo():
     client = build_square_mcp_client()
     tools = await client.get_tools()
@@ -21,9 +33,9 @@ async def run_agent_demo():
     # ---- FIX: your create_agent does not accept state_modifier
     # Try system_prompt first; if that fails, try prompt (below).
     try:
-        agent = create_agent(model, tools, system_prompt=SYSTEM_INSTRUCTIONS)
+        agent = create_agent(model, tools, system_prompt=system_instructions())
     except TypeError:
-        agent = create_agent(model, tools, prompt=SYSTEM_INSTRUCTIONS)
+        agent = create_agent(model, tools, prompt=system_instructions())
 
     prompts = [
         "List my Square sandbox locations (id, name, status).",
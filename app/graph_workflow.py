@@ -1,151 +1,219 @@
-import json
+import os
+import time
 import asyncio
-from typing import Any, Dict, List, Optional
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from langchain_core.tools import ToolException
-from .mcp_client import build_square_mcp_client
+from .mcp_json import unwrap_mcp_json
+from .projection import money_to_decimal
+from .square_api import make_api_request
 
+logger = logging.getLogger(__name__)
 
-def unwrap_mcp_json(result: Any) -> Dict[str, Any]:
-    if isinstance(result, dict):
-        return result
-    if isinstance(result, str):
-        try:
-            return json.loads(result)
-        except Exception:
-            return {"raw": result}
-    if isinstance(result, list):
-        for block in result:
-            if isinstance(block, dict) and block.get("type") == "text" and "text" in block:
-                try:
-                    return json.loads(block["text"])
-                except Exception:
-                    return {"raw": block.get("text")}
-        return {"raw": result}
-    return {"raw": result}
-
-
-def money_to_decimal(amount: Optional[int], currency: str = "USD") -> float:
-    # Square returns smallest unit (USD cents). 400 => 4.00
-    if amount is None:
-        return 0.0
-    return round(amount / 100.0, 2)
-
-
-async def get_square_summary() -> Dict[str, Any]:
-    client = build_square_mcp_client()
-    tools = await client.get_tools()
-    make_api = next((t for t in tools if t.name.endswith("make_api_request")), None)
-    if make_api is None:
-        raise RuntimeError("Could not find make_api_request tool from Square MCP server.")
-
-    # 1) Locations
-    loc_raw = await make_api.ainvoke({"service": "locations", "method": "list", "request": {}})
-    locations = unwrap_mcp_json(loc_raw).get("locations", [])
-    location_ids = [l.get("id") for l in locations if isinstance(l, dict) and l.get("id")]
-    first_location_id = location_ids[0] if location_ids else None
 
-    # 2) Catalog items
-    cat_raw = await make_api.ainvoke({
-        "service": "catalog",
-        "method": "list",
-        "request": {"types": "ITEM", "limit": 200},
-    })
-    catalog = unwrap_mcp_json(cat_raw).get("objects", [])
-
-    catalog_items = []
-    for obj in catalog:
-        if obj.get("type") != "ITEM":
-            continue
-        item = obj.get("item_data", {})
-        variations = item.get("variations", [])
-        # show first variation price for simplicity (you can list all later)
-        price = None
-        currency = None
-        if variations:
-            vdata = variations[0].get("item_variation_data", {})
-            pm = vdata.get("price_money", {})
-            price = money_to_decimal(pm.get("amount"), pm.get("currency", "USD"))
-            currency = pm.get("currency", "USD")
-
-        catalog_items.append({
-            "id": obj.get("id"),
-            "name": item.get("name"),
-            "price": price,
-            "currency": currency,
-            "variation_id": variations[0].get("id") if variations else None
-        })
-
-    # 3) Team members
+# Square's SearchOrders accepts at most 10 location_ids per request
+ORDERS_LOCATIONS_PER_REQUEST = 10
+
+
+def _env_int(name: str, default: int) -> int:
     try:
-        team_raw = await make_api.ainvoke({
-            "service": "team",
-            "method": "searchMembers",
-            "request": {"limit": 200},
-        })
-        team_members = unwrap_mcp_json(team_raw).get("team_members", [])
-    except ToolException:
-        team_members = []
-
-    team_out = []
-    for tm in team_members:
-        wage = None
-        wage_currency = None
-        jobs = tm.get("wage_setting", {}).get("job_assignments", [])
-        for j in jobs:
-            hr = j.get("hourly_rate")
-            if hr:
-                wage = money_to_decimal(hr.get("amount"), hr.get("currency", "USD"))
-                wage_currency = hr.get("currency", "USD")
-                break
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+async def iter_pages(
+    service: str,
+    method: str,
+    request: Dict[str, Any],
+    items_key: str,
+    sem: asyncio.Semaphore,
+    *,
+    max_pages: int,
+    fresh: bool = False,
+) -> AsyncIterator[Tuple[List[dict], bool]]:
+    """
+    Follows Square `cursor` pagination, yielding (items, is_last_page) per page
+    as soon as it arrives. Stops early (is_last_page=False) after max_pages.
+    """
+    cursor = None
+    for _ in range(max_pages):
+        req = dict(request)
+        if cursor:
+            req["cursor"] = cursor
+        async with sem:
+            raw = await make_api_request(service, method, req, fresh=fresh)
+        data = unwrap_mcp_json(raw, source="workflow")
+        cursor = data.get("cursor")
+        last = not cursor
+        yield data.get(items_key, []) or [], last
+        if last:
+            return
+
+
+def _money(money: Optional[dict]) -> Tuple[Optional[float], str]:
+    # (amount, currency): no money or no amount is None, not 0.0; currency defaults to USD
+    currency = (money or {}).get("currency") or "USD"
+    if not money or money.get("amount") is None:
+        return None, currency
+    return money_to_decimal(money["amount"], currency), currency
+
+
+def catalog_row(obj: dict) -> Optional[dict]:
+    if obj.get("type") != "ITEM":
+        return None
+    item = obj.get("item_data", {})
+    variations = item.get("variations", [])
+    # show first variation price for simplicity (you can list all later)
+    pm = variations[0].get("item_variation_data", {}).get("price_money") if variations else None
+    price, currency = _money(pm)
+
+    return {
+        "id": obj.get("id"),
+        "name": item.get("name"),
+        "price": price,
+        "currency": currency,
+        "variation_id": variations[0].get("id") if variations else None
+    }
+
+
+def team_row(tm: dict) -> dict:
+    jobs = tm.get("wage_setting", {}).get("job_assignments", [])
+    hr = next((j.get("hourly_rate") for j in jobs if j.get("hourly_rate")), None)
+    wage, wage_currency = _money(hr)
+
+    return {
+        "id": tm.get("id"),
+        "name": f"{tm.get('given_name','')} {tm.get('family_name','')}".strip(),
+        "status": tm.get("status"),
+        "email": tm.get("email_address"),
+        "phone": tm.get("phone_number"),
+        "wage_per_hour": wage,
+        "currency": wage_currency,
+        "assigned_locations": tm.get("assigned_locations", {}),
+    }
 
-        team_out.append({
-            "id": tm.get("id"),
-            "name": f"{tm.get('given_name','')} {tm.get('family_name','')}".strip(),
-            "status": tm.get("status"),
-            "email": tm.get("email_address"),
-            "phone": tm.get("phone_number"),
-            "wage_per_hour": wage,
-            "currency": wage_currency,
-            "assigned_locations": tm.get("assigned_locations", {}),
-        })
-
-    # 4) Orders (might be empty if you haven’t created any)
-    orders_out = []
-    if first_location_id:
+
+def order_row(o: dict) -> dict:
+    total, currency = _money(o.get("total_money"))
+    return {
+        "id": o.get("id"),
+        "location_id": o.get("location_id"),
+        "state": o.get("state"),
+        "created_at": o.get("created_at"),
+        "total": total,
+        "currency": currency,
+    }
+
+
+async def _collect_paged(rows: List[dict], pages, to_row) -> bool:
+    complete = False
+    async for items, last in pages:
+        for it in items:
+            row = to_row(it)
+            if row is not None:
+                rows.append(row)
+        complete = last
+    return complete
+
+
+async def _collect_orders(location_ids: List[str], sem, max_pages: int, max_orders: int, fresh: bool) -> Tuple[List[dict], bool]:
+    chunks = [
+        location_ids[i : i + ORDERS_LOCATIONS_PER_REQUEST]
+        for i in range(0, len(location_ids), ORDERS_LOCATIONS_PER_REQUEST)
+    ]
+
+    async def one_chunk(ids: List[str]) -> Tuple[List[dict], bool]:
+        rows: List[dict] = []
+        pages = iter_pages(
+            "orders",
+            "search",
+            {
+                "location_ids": ids,
+                "limit": min(max_orders, 500),
+                "query": {"sort": {"sort_field": "CREATED_AT", "sort_order": "DESC"}},
+            },
+            "orders",
+            sem,
+            max_pages=max_pages,
+            fresh=fresh,
+        )
+        complete = False
+        async for items, last in pages:
+            rows.extend(order_row(o) for o in items)
+            complete = last
+            if len(rows) >= max_orders:
+                break
+        return rows, complete
+
+    results = await asyncio.gather(*(one_chunk(c) for c in chunks))
+    orders = [r for rows, _ in results for r in rows]
+    orders.sort(key=lambda r: r.get("created_at") or "", reverse=True)
+    complete = all(c for _, c in results) and len(orders) <= max_orders
+    return orders[:max_orders], complete
+
+
+async def get_square_summary(fresh: bool = False) -> Dict[str, Any]:
+    """
+    Locations, catalog, team and recent orders for the dashboard.
+
+    Independent sections run concurrently (bounded by SUMMARY_CONCURRENCY),
+    paginated sections follow cursors up to SUMMARY_MAX_PAGES, and orders are
+    fetched across all locations. meta.sections reports per-section timing
+    and whether the section is complete.
+    """
+    sem = asyncio.Semaphore(max(1, _env_int("SUMMARY_CONCURRENCY", 4)))
+    max_pages = max(1, _env_int("SUMMARY_MAX_PAGES", 50))
+    max_orders = max(1, _env_int("SUMMARY_MAX_ORDERS", 200))
+    sections: Dict[str, Dict[str, Any]] = {}
+
+    async def section(name: str, coro, empty):
+        t0 = time.perf_counter()
+        info: Dict[str, Any] = {"complete": False}
         try:
-            orders_raw = await make_api.ainvoke({
-                "service": "orders",
-                "method": "search",
-                "request": {
-                    "location_ids": [first_location_id],
-                    "limit": 20,
-                    "sort": {"sort_field": "CREATED_AT", "sort_order": "DESC"},
-                },
-            })
-            orders = unwrap_mcp_json(orders_raw).get("orders", []) or []
-            for o in orders:
-                total = o.get("total_money", {})
-                orders_out.append({
-                    "id": o.get("id"),
-                    "state": o.get("state"),
-                    "created_at": o.get("created_at"),
-                    "total": money_to_decimal(total.get("amount"), total.get("currency", "USD")),
-                    "currency": total.get("currency", "USD"),
-                })
-        except ToolException:
-            orders_out = []
-
-    # close client safely (works across versions)
-    try:
-        if hasattr(client, "aclose"):
-            await client.aclose()
-        elif hasattr(client, "close"):
-            maybe = client.close()
-            if asyncio.iscoroutine(maybe):
-                await maybe
-    except Exception:
-        pass
+            value, info["complete"] = await coro
+        except Exception as e:
+            # one failing section must not sink the summary: serve it empty, marked incomplete
+            logger.warning("summary section %s failed: %s", name, e)
+            value = empty
+            info["complete"] = False
+            info["error"] = str(e)[:300] or type(e).__name__
+        info["seconds"] = round(time.perf_counter() - t0, 3)
+        sections[name] = info
+        return value
+
+    async def locations_section() -> Tuple[List[dict], bool]:
+        async with sem:
+            loc_raw = await make_api_request("locations", "list", {}, fresh=fresh)
+        return unwrap_mcp_json(loc_raw, source="workflow").get("locations", []) or [], True
+
+    async def catalog_section() -> Tuple[List[dict], bool]:
+        rows: List[dict] = []
+        pages = iter_pages("catalog", "list", {"types": "ITEM"}, "objects", sem, max_pages=max_pages, fresh=fresh)
+        return rows, await _collect_paged(rows, pages, catalog_row)
+
+    async def team_section() -> Tuple[List[dict], bool]:
+        rows: List[dict] = []
+        pages = iter_pages("team", "searchMembers", {"limit": 200}, "team_members", sem, max_pages=max_pages, fresh=fresh)
+        return rows, await _collect_paged(rows, pages, team_row)
+
+    async def locations_then_orders():
+        locations = await section("locations", locations_section(), [])
+        ids = [l.get("id") for l in locations if isinstance(l, dict) and l.get("id")]
+        if not ids:
+            sections["orders"] = {"complete": True, "seconds": 0.0}
+            return locations, []
+        orders = await section("orders", _collect_orders(ids, sem, max_pages, max_orders, fresh), [])
+        return locations, orders
+
+    catalog_items, team_out, (locations, orders_out) = await asyncio.gather(
+        section("catalog", catalog_section(), []),
+        section("team", team_section(), []),
+        locations_then_orders(),
+    )
+
+    location_ids = [l.get("id") for l in locations if isinstance(l, dict) and l.get("id")]
+    first_location_id = location_ids[0] if location_ids else None
 
     return {
         "locations": locations,
@@ -155,6 +223,25 @@ async def get_square_summary() -> Dict[str, Any]:
         "meta": {
             "location_ids": location_ids,
             "primary_location_id": first_location_id,
+            "sections": sections,
             "note": "Money amounts are normalized from cents to dollars.",
         }
     }
+
+
+async def run_workflow_demo():
+    """MODE=workflow: builds the dashboard summary once and prints per-section timing."""
+    from .mcp_pool import get_pool
+
+    try:
+        summary = await get_square_summary(fresh=True)
+    finally:
+        await get_pool().close()
+
+    for name, info in summary["meta"]["sections"].items():
+        status = "error: " + info["error"] if info.get("error") else ("complete" if info.get("complete") else "truncated")
+        print(f"{name:10} {info.get('seconds', 0.0):7.3f}s  {status}")
+    print(
+        f"locations={len(summary['locations'])} catalog_items={len(summary['catalog_items'])} "
+        f"team_members={len(summary['team_members'])} orders={len(summary['orders'])}"
+    )
@@ -0,0 +1,377 @@
+"""
+Local (no-LLM) tier for the intent router.
+
+- LocalClassifier: multinomial logistic regression over hashed word/char n-grams,
+  trained offline from logged LLM router decisions.
+- RouteCache: LRU of normalized messages the LLM router already classified.
+
+CLI:
+    python -m app.intent_classifier train --data router_log.jsonl
+    python -m app.intent_classifier bench --data router_log.jsonl [--llm]
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import zlib
+import random
+import asyncio
+import argparse
+import pathlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+INTENTS = ["clear", "write", "read", "unknown"]
+
+DEFAULT_MODEL_PATH = pathlib.Path(__file__).resolve().parent.parent / "models" / "router_classifier.json"
+N_BUCKETS = 1 << 18
+
+_PUNCT = re.compile(r"[^\w\s/$.%-]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    t = (text or "").lower().strip()
+    t = _PUNCT.sub(" ", t)
+    return _SPACES.sub(" ", t).strip(" .")
+
+
+def _bucket(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) & (N_BUCKETS - 1)
+
+
+def featurize(text: str) -> Dict[int, float]:
+    """Hashed word unigrams/bigrams + char trigrams, L2-normalized."""
+    norm = normalize_text(text)
+    words = norm.split()
+    feats: Dict[int, float] = {}
+
+    def add(f: str):
+        b = _bucket(f)
+        feats[b] = feats.get(b, 0.0) + 1.0
+
+    add("__bias__")
+    for w in words:
+        add("w:" + w)
+    for a, b in zip(words, words[1:]):
+        add("b:" + a + " " + b)
+    padded = f" {norm} "
+    for i in range(len(padded) - 2):
+        add("c:" + padded[i : i + 3])
+
+    n = math.sqrt(sum(v * v for v in feats.values())) or 1.0
+    return {k: v / n for k, v in feats.items()}
+
+
+class LocalClassifier:
+    def __init__(self, weights: Optional[Dict[str, Dict[int, float]]] = None):
+        self.weights: Dict[str, Dict[int, float]] = weights or {c: {} for c in INTENTS}
+
+    def _scores(self, feats: Dict[int, float]) -> Dict[str, float]:
+        return {c: sum(w.get(k, 0.0) * v for k, v in feats.items()) for c, w in self.weights.items()}
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        scores = self._scores(featurize(text))
+        m = max(scores.values())
+        exp = {c: math.exp(s - m) for c, s in scores.items()}
+        z = sum(exp.values())
+        return {c: v / z for c, v in exp.items()}
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        proba = self.predict_proba(text)
+        intent = max(proba, key=proba.get)
+        return intent, proba[intent]
+
+    def fit(self, samples: List[Tuple[str, str]], epochs: int = 20, lr: float = 0.5, l2: float = 1e-5, seed: int = 0):
+        rng = random.Random(seed)
+        data = [(featurize(t), y) for t, y in samples if y in INTENTS]
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            step = lr / (1.0 + epoch * 0.2)
+            for feats, y in data:
+                scores = self._scores(feats)
+                m = max(scores.values())
+                exp = {c: math.exp(s - m) for c, s in scores.items()}
+                z = sum(exp.values())
+                for c, w in self.weights.items():
+                    grad = exp[c] / z - (1.0 if c == y else 0.0)
+                    if grad == 0.0:
+                        continue
+                    for k, v in feats.items():
+                        w[k] = w.get(k, 0.0) * (1.0 - step * l2) - step * grad * v
+        return self
+
+    def save(self, path: pathlib.Path):
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        compact = {c: {str(k): round(v, 6) for k, v in w.items() if abs(v) > 1e-6} for c, w in self.weights.items()}
+        path.write_text(json.dumps({"n_buckets": N_BUCKETS, "weights": compact}), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "LocalClassifier":
+        data = json.loads(pathlib.Path(path).read_text(encoding="utf-8"))
+        if data.get("n_buckets") != N_BUCKETS:
+            raise ValueError("router classifier was trained with a different feature size")
+        weights = {c: {int(k): float(v) for k, v in w.items()} for c, w in data["weights"].items()}
+        for c in INTENTS:
+            weights.setdefault(c, {})
+        return cls(weights)
+
+
+class RouteCache:
+    """LRU of normalized message -> route result from the LLM router."""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def get(self, text: str) -> Optional[Dict[str, Any]]:
+        key = normalize_text(text)
+        hit = self._data.get(key)
+        if hit is not None:
+            self._data.move_to_end(key)
+        return hit
+
+    def put(self, text: str, route: Dict[str, Any]):
+        key = normalize_text(text)
+        if not key:
+            return
+        self._data[key] = route
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def _model_path() -> pathlib.Path:
+    return pathlib.Path(os.environ.get("ROUTER_CLASSIFIER_PATH", DEFAULT_MODEL_PATH))
+
+
+def confidence_threshold() -> float:
+    return float(os.environ.get("ROUTER_LOCAL_THRESHOLD", "0.9"))
+
+
+_CLASSIFIER: Optional[LocalClassifier] = None
+_CLASSIFIER_LOADED = False
+_CACHE = RouteCache(int(os.environ.get("ROUTER_CACHE_SIZE", "2048")))
+
+
+def get_classifier() -> Optional[LocalClassifier]:
+    global _CLASSIFIER, _CLASSIFIER_LOADED
+    if not _CLASSIFIER_LOADED:
+        _CLASSIFIER_LOADED = True
+        path = _model_path()
+        if path.exists():
+            try:
+                _CLASSIFIER = LocalClassifier.load(path)
+            except Exception:
+                _CLASSIFIER = None
+    return _CLASSIFIER
+
+
+def get_route_cache() -> RouteCache:
+    return _CACHE
+
+
+def has_prior_turns(user_text: str, history: Optional[List[Dict[str, str]]]) -> bool:
+    """Whether `history` holds anything besides the message being routed (if it's included)."""
+    if not history:
+        return False
+    last = history[-1]
+    if last.get("role") == "user" and last.get("content") == user_text:
+        return len(history) > 1
+    return True
+
+
+def classify_local(user_text: str, history: Optional[List[Dict[str, str]]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Returns a confident route (same shape as route_intent) or None to fall
+    through to the LLM router. Only a route with no prior turns in `history`
+    is marked context_free: otherwise its normalized_request is the raw text,
+    which may point at earlier turns ("show their wages"), so it must not be
+    shared.
+    """
+    if os.environ.get("ROUTER_LOCAL_TIER", "true").lower() != "true":
+        return None
+
+    hit = _CACHE.get(user_text)
+    if hit is not None:
+        route = {**hit, "tier": "cache"}
+    else:
+        clf = get_classifier()
+        if clf is None:
+            return None
+        intent, p = clf.predict(user_text)
+        if p < confidence_threshold() or intent == "unknown":
+            return None
+        route = {
+            "intent": intent,
+            "needs_confirm": intent == "write",
+            "reason": f"local classifier (p={p:.2f})",
+            "normalized_request": user_text[:500],
+            "tier": "local",
+        }
+    route["context_free"] = not has_prior_turns(user_text, history)
+    return route
+
+
+def remember(user_text: str, route: Dict[str, Any]):
+    # The cache is keyed by the raw text and shared by every session, but a
+    # normalized_request routed with history may resolve pronouns from it
+    # ("what's his wage?" -> "What is John's hourly wage?"), so only routes
+    # the router marked context_free are cached, whatever the intent.
+    if route.get("intent") == "unknown" or route.get("context_free") is not True:
+        return
+    keys = ("intent", "needs_confirm", "reason", "normalized_request", "complexity")
+    _CACHE.put(user_text, {k: route[k] for k in keys if k in route})
+
+
+def log_decision(user_text: str, route: Dict[str, Any]):
+    path = os.environ.get("ROUTER_LOG_PATH")
+    if not path:
+        return
+    row = {"ts": time.time(), "text": user_text, **route}
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+
+def load_samples(path: str) -> List[Tuple[str, str]]:
+    """Labelled samples from a router log; only LLM decisions count as ground truth."""
+    out = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            if row.get("tier", "llm") != "llm":
+                continue
+            text, intent = row.get("text"), row.get("intent")
+            if text and intent in INTENTS:
+                out.append((text, intent))
+    return out
+
+
+def _split(samples, holdout: float, seed: int = 0):
+    samples = list(samples)
+    random.Random(seed).shuffle(samples)
+    n = int(len(samples) * holdout)
+    return samples[n:], samples[:n]
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    v = sorted(values)
+    return v[min(len(v) - 1, int(round(q * (len(v) - 1))))]
+
+
+def _cmd_train(args):
+    samples = load_samples(args.data)
+    if not samples:
+        sys.exit(f"No LLM-labelled samples in {args.data}")
+    train, test = _split(samples, args.holdout)
+    clf = LocalClassifier().fit(train, epochs=args.epochs)
+    if test:
+        acc = sum(1 for t, y in test if clf.predict(t)[0] == y) / len(test)
+        print(f"holdout accuracy: {acc:.3f} on {len(test)} samples")
+    out = pathlib.Path(args.out or _model_path())
+    clf.save(out)
+    print(f"saved {out} (trained on {len(train)} samples)")
+
+
+def _cmd_bench(args):
+    samples = load_samples(args.data)
+    train, test = _split(samples, args.holdout)
+    if not test:
+        sys.exit("Not enough samples for a holdout set")
+
+    clf = LocalClassifier.load(args.model) if args.model else LocalClassifier().fit(train)
+    cache = RouteCache(len(train) + 1)
+    for t, y in train:
+        cache.put(t, {"intent": y})
+
+    rows = []
+
+    # tier 1: route cache
+    lat, hits, correct = [], 0, 0
+    for t, y in test:
+        t0 = time.perf_counter()
+        hit = cache.get(t)
+        lat.append(time.perf_counter() - t0)
+        if hit is not None:
+            hits += 1
+            correct += hit["intent"] == y
+    rows.append(("cache", hits, correct, lat))
+
+    # tier 2: classifier (confident answers only)
+    lat, answered, correct = [], 0, 0
+    for t, y in test:
+        t0 = time.perf_counter()
+        intent, p = clf.predict(t)
+        lat.append(time.perf_counter() - t0)
+        if p >= args.threshold and intent != "unknown":
+            answered += 1
+            correct += intent == y
+    rows.append(("local", answered, correct, lat))
+
+    # tier 3: LLM router (optional; costs API calls)
+    if args.llm:
+        from dotenv import load_dotenv
+        from .intent_router import route_intent
+
+        load_dotenv()
+
+        os.environ["ROUTER_LOCAL_TIER"] = "false"
+
+        async def _run():
+            lat, correct = [], 0
+            for t, y in test:
+                t0 = time.perf_counter()
+                r = await route_intent(t)
+                lat.append(time.perf_counter() - t0)
+                correct += r["intent"] == y
+            return lat, correct
+
+        lat, correct = asyncio.run(_run())
+        rows.append(("llm", len(test), correct, lat))
+
+    print(f"{'tier':<6} {'coverage':>9} {'accuracy':>9} {'p50_us':>10} {'p95_us':>10}")
+    for name, answered, correct, lat in rows:
+        cov = answered / len(test)
+        acc = (correct / answered) if answered else 0.0
+        print(f"{name:<6} {cov:>9.3f} {acc:>9.3f} {_pct(lat, 0.5) * 1e6:>10.1f} {_pct(lat, 0.95) * 1e6:>10.1f}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.intent_classifier")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("train", help="train the local classifier from a router log (JSONL)")
+    p.add_argument("--data", required=True)
+    p.add_argument("--out")
+    p.add_argument("--epochs", type=int, default=20)
+    p.add_argument("--holdout", type=float, default=0.2)
+    p.set_defaults(func=_cmd_train)
+
+    p = sub.add_parser("bench", help="accuracy/latency per router tier on a holdout split")
+    p.add_argument("--data", required=True)
+    p.add_argument("--model", help="trained model JSON (default: train on the split)")
+    p.add_argument("--holdout", type=float, default=0.2)
+    p.add_argument("--threshold", type=float, default=confidence_threshold())
+    p.add_argument("--llm", action="store_true", help="also call the LLM router on the holdout set")
+    p.set_defaults(func=_cmd_bench)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
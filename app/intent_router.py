@@ -1,8 +1,11 @@
 import json
-import os
+import time
 from typing import Any, Dict, List
 
-from langchain_openai import ChatOpenAI
+from . import metrics, tracing
+from .context_window import router_context
+from .intent_classifier import classify_local, has_prior_turns, log_decision, remember
+from .llm import get_chat_model, router_model_name
 
 
 ROUTER_SYSTEM = """
@@ -19,7 +22,8 @@ Return ONLY valid JSON with this schema:
   "intent": "clear" | "write" | "read" | "unknown",
   "needs_confirm": true | false,
   "reason": "short reason",
-  "normalized_request": "rewrite the user request clearly (1 sentence)"
+  "normalized_request": "rewrite the user request clearly (1 sentence)",
+  "complexity": "simple" | "complex"
 }
 
 Rules:
@@ -27,6 +31,8 @@ Rules:
 - If intent == "read" -> needs_confirm must be false.
 - Charts/graphs/visualizations are ALWAYS "read" unless user explicitly asks to modify Square data too.
 - If unclear whether it's read or write, choose "unknown" with needs_confirm false.
+- "complex": multi-step analysis, comparisons across several services/entities, or ambiguous references that need reasoning.
+  "simple": a single lookup, list or count (e.g. "how many items are on my menu").
 """
 
 
@@ -47,17 +53,31 @@ async def route_intent(user_text: str, history: List[Dict[str, str]] | None = No
     """
     Uses the LLM to decide if a message is read vs write (needs approval) vs clear.
     No keyword hardcoding required.
+
+    A local tier (route cache + trained n-gram classifier) answers confident
+    cases first; only low-confidence messages reach the LLM.
     """
-    model = ChatOpenAI(
-        model=os.environ.get("ROUTER_MODEL", os.environ.get("CHAT_MODEL", "gpt-4.1")),
-        temperature=0,
-    )
+    with tracing.span("route") as sp:
+        route = await _route_intent(user_text, history)
+        sp.set(tier=route.get("tier"), intent=route.get("intent"))
+        return route
+
+
+async def _route_intent(user_text: str, history: List[Dict[str, str]] | None) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    local = classify_local(user_text, history)
+    if local is not None:
+        metrics.incr("router_tier_total", tier=local["tier"])
+        metrics.observe("router_seconds", time.perf_counter() - t0, tier=local["tier"])
+        return local
+
+    model = get_chat_model(router_model_name(), temperature=0)
 
     # Provide tiny context if available (helps with "him", "the cook", etc.)
     context_snippet = ""
     if history:
-        # last few turns only
-        tail = history[-6:]
+        # newest turns that fit ROUTER_CONTEXT_TOKENS
+        tail = router_context(history)
         context_snippet = "\n".join([f"{m.get('role','')}: {m.get('content','')}" for m in tail])
 
     user_prompt = {
@@ -68,7 +88,7 @@ async def route_intent(user_text: str, history: List[Dict[str, str]] | None = No
     resp = await model.ainvoke([
         {"role": "system", "content": ROUTER_SYSTEM},
         user_prompt
-    ])
+    ], config=tracing.llm_config("router"))
 
     try:
         data = _safe_json_loads(resp.content)
@@ -92,9 +112,20 @@ async def route_intent(user_text: str, history: List[Dict[str, str]] | None = No
     elif intent in ("read", "clear"):
         needs_confirm = False
 
-    return {
+    route = {
         "intent": intent,
         "needs_confirm": needs_confirm,
         "reason": str(data.get("reason", ""))[:200],
         "normalized_request": str(data.get("normalized_request", user_text))[:500],
+        "complexity": "complex" if data.get("complexity") == "complex" else "simple",
+        "tier": "llm",
     }
+    # normalized_request may carry this session's context; only a route made
+    # without it may be shared (route cache, answer cache)
+    route["context_free"] = not has_prior_turns(user_text, history)
+
+    metrics.incr("router_tier_total", tier="llm")
+    metrics.observe("router_seconds", time.perf_counter() - t0, tier="llm")
+    remember(user_text, route)
+    log_decision(user_text, route)
+    return route
@@ -0,0 +1,37 @@
+import os
+from functools import lru_cache
+from typing import Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_openai import ChatOpenAI
+
+from .admission import get_rate_limiter
+
+
+def chat_model_name() -> str:
+    return os.environ.get("CHAT_MODEL", "gpt-4.1")
+
+
+def router_model_name() -> str:
+    return os.environ.get("ROUTER_MODEL", chat_model_name())
+
+
+@lru_cache(maxsize=32)
+def get_chat_model(model: str, temperature: Optional[float] = None) -> BaseChatModel:
+    """
+    Process-wide ChatOpenAI instances (one per model/temperature).
+    They hold an HTTP client, so reusing them also reuses connections.
+
+    "fake:<script>" returns the scripted offline model from bench/.
+    All of them share the LLM_RATE_LIMIT token bucket (if set).
+    """
+    limiter = get_rate_limiter("llm")
+    if model.startswith("fake:"):
+        from bench.fake_llm import build_fake_model
+
+        fake = build_fake_model(model[len("fake:"):])
+        return fake.model_copy(update={"rate_limiter": limiter}) if limiter else fake
+    kwargs = {"rate_limiter": limiter} if limiter else {}
+    if temperature is None:
+        return ChatOpenAI(model=model, **kwargs)
+    return ChatOpenAI(model=model, temperature=temperature, **kwargs)
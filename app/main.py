@@ -2,6 +2,7 @@ import os
 import asyncio
 from dotenv import load_dotenv
 
+from .batch import run_batch_from_env
 from .graph_agent import run_agent_demo
 from .graph_workflow import run_workflow_demo
 
@@ -14,6 +15,8 @@ def main():
 
     if mode == "workflow":
         asyncio.run(run_workflow_demo())
+    elif mode == "batch":
+        asyncio.run(run_batch_from_env())
     else:
         asyncio.run(run_agent_demo())
 
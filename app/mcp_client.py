@@ -1,4 +1,5 @@
 import os
+import shlex
 from langchain_mcp_adapters.client import MultiServerMCPClient
 
 
@@ -6,7 +7,22 @@ def build_square_mcp_client() -> MultiServerMCPClient:
     """
     Connect to Square MCP server over stdio using local npx.
     Sandbox is enabled via env var SANDBOX=true.
+
+    SQUARE_MCP_COMMAND replaces the npx server with another stdio command
+    (e.g. "python -m bench.fake_square_mcp" for offline benchmarks).
     """
+    custom = os.environ.get("SQUARE_MCP_COMMAND", "").strip()
+    if custom:
+        argv = shlex.split(custom, posix=os.name != "nt")
+        return MultiServerMCPClient({
+            "square": {
+                "transport": "stdio",
+                "command": argv[0],
+                "args": argv[1:],
+                "env": dict(os.environ),
+            }
+        })
+
     token = os.environ.get("SQUARE_ACCESS_TOKEN") or os.environ.get("ACCESS_TOKEN")
     if not token:
         raise RuntimeError(
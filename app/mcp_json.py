@@ -0,0 +1,142 @@
+"""
+One decoder for MCP tool results (make_api_request, get_type_info, ...).
+
+Results arrive as a JSON string or a list of content blocks
+[{"type": "text", "text": "..."}]. Every module that needs the JSON goes
+through parse_mcp_text / unwrap_mcp_json here:
+
+- the backend is picked at import: orjson when installed, else stdlib json
+  (BACKEND says which); loads() also takes bytes/bytearray/memoryview, which
+  orjson parses in place without building a str first
+- a single text block is parsed as-is (no join copy)
+- large results are memoized per text (MCP_DECODE_MEMO entries, default 32,
+  0 disables): a cached read served to the projection, the workflow and a
+  retry is decoded once. Decoded values are shared, so callers must not
+  mutate them
+- text that is not JSON counts in mcp_decode_failures_total{source}
+"""
+
+import os
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is the fallback
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+# smaller results are cheaper to parse than to keep around
+MEMO_MIN_CHARS = 2048
+
+Buffer = Union[str, bytes, bytearray, memoryview]
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+if orjson is not None:
+    _DECODE_ERRORS: Tuple[type, ...] = (orjson.JSONDecodeError, ValueError, TypeError)
+
+    def loads(data: Buffer) -> Any:
+        return orjson.loads(data)
+
+    def dumps(obj: Any) -> str:
+        """Compact JSON text (non-ASCII kept as-is)."""
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            # ints beyond 64 bits, non-str keys: stdlib handles those
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+else:
+    _DECODE_ERRORS = (ValueError, TypeError)
+
+    def loads(data: Buffer) -> Any:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    def dumps(obj: Any) -> str:
+        """Compact JSON text (non-ASCII kept as-is)."""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+_MEMO: "OrderedDict[str, Any]" = OrderedDict()
+_MEMO_SIZE = max(0, _env_int("MCP_DECODE_MEMO", 32))
+
+
+def result_text(raw: Any) -> str:
+    """The text of an MCP result: the string itself or its text blocks joined."""
+    if isinstance(raw, str):
+        return raw
+    if isinstance(raw, list):
+        blocks = [b.get("text", "") for b in raw if isinstance(b, dict) and b.get("type") == "text"]
+        # one block (the usual case) is returned as is: no copy, and its hash stays cached
+        return blocks[0] if len(blocks) == 1 else "".join(blocks)
+    return ""
+
+
+def _is_blocks(raw: Any) -> bool:
+    return isinstance(raw, list) and bool(raw) and isinstance(raw[0], dict) and raw[0].get("type") == "text"
+
+
+def _decode(text: str, source: str) -> Optional[Any]:
+    memo = _MEMO_SIZE and len(text) >= MEMO_MIN_CHARS
+    if memo:
+        try:
+            data = _MEMO[text]
+        except KeyError:
+            pass
+        else:
+            _MEMO.move_to_end(text)
+            metrics.incr("mcp_decode_memo_hits_total", source=source)
+            return data
+    try:
+        data = loads(text)
+    except _DECODE_ERRORS:
+        metrics.incr("mcp_decode_failures_total", source=source)
+        logger.debug("MCP result from %s is not JSON: %.200s", source, text)
+        return None
+    if memo:
+        _MEMO[text] = data
+        while len(_MEMO) > _MEMO_SIZE:
+            _MEMO.popitem(last=False)
+    return data
+
+
+def parse_mcp_text(raw: Any, source: str = "mcp") -> Tuple[Optional[Any], str]:
+    """(parsed JSON or None, original text) for an MCP tool result."""
+    if isinstance(raw, (dict, list)) and not _is_blocks(raw):
+        return raw, ""
+    text = result_text(raw)
+    if not text:
+        return None, text
+    return _decode(text, source), text
+
+
+def unwrap_mcp_json(raw: Any, source: str = "mcp") -> Dict[str, Any]:
+    """The JSON object in an MCP result, or {"raw": ...} when there isn't one."""
+    if isinstance(raw, dict):
+        return raw
+    data, text = parse_mcp_text(raw, source)
+    if isinstance(data, dict):
+        return data
+    return {"raw": text or raw}
+
+
+def load_file(path: Union[str, "os.PathLike[str]"]) -> Any:
+    """JSON from a file, parsed from its bytes (no intermediate str)."""
+    with open(path, "rb") as f:
+        return loads(f.read())
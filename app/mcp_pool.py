@@ -0,0 +1,309 @@
+import os
+import asyncio
+import hashlib
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+from langchain_mcp_adapters.tools import load_mcp_tools
+
+from . import tracing
+from .admission import get_rate_limiter
+from .mcp_client import build_square_mcp_client
+
+logger = logging.getLogger(__name__)
+
+SERVER_NAME = "square"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def tools_fingerprint(tools: List[BaseTool]) -> str:
+    """
+    Stable hash of tool names + schemas. Changes whenever the MCP server
+    exposes a different tool list (new server version, different flags).
+    """
+    parts = []
+    for t in sorted(tools, key=lambda x: x.name):
+        schema = t.args_schema if isinstance(t.args_schema, dict) else getattr(t, "args", {})
+        parts.append({"name": t.name, "description": t.description, "schema": schema})
+    blob = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest()[:16]
+
+
+class _PooledSession:
+    """
+    One warm `square-mcp-server` stdio process + initialized MCP session.
+
+    The stdio transport uses anyio task groups, which must be entered and
+    exited from the same task, so every session is owned by its own runner task.
+    """
+
+    def __init__(self, index: int):
+        self.index = index
+        self.session = None
+        self.tools: Dict[str, BaseTool] = {}
+        self.healthy = False
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._error: Optional[BaseException] = None
+
+    async def start(self):
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._error = None
+        with tracing.span("mcp_session_start", index=self.index):
+            self._task = asyncio.create_task(self._run(), name=f"mcp-session-{self.index}")
+            await self._ready.wait()
+        if self._error is not None:
+            raise RuntimeError(f"MCP session {self.index} failed to start: {self._error}") from self._error
+
+    async def _run(self):
+        client = build_square_mcp_client()
+        try:
+            async with client.session(SERVER_NAME) as session:
+                tools = await load_mcp_tools(session)
+                for t in tools:
+                    # surface MCP errors as ToolException (callers retry/skip caching on it)
+                    t.handle_tool_error = False
+                self.session = session
+                self.tools = {t.name: t for t in tools}
+                self.healthy = True
+                self._ready.set()
+                await self._stop.wait()
+        except Exception as e:
+            self._error = e
+        finally:
+            self.session = None
+            self.healthy = False
+            self._ready.set()
+
+    async def ping(self, timeout: float) -> bool:
+        if not self.healthy or self.session is None:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=timeout)
+            return True
+        except Exception:
+            self.healthy = False
+            return False
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=10)
+            except Exception:
+                self._task.cancel()
+        self._task = None
+        self.healthy = False
+
+
+class MCPSessionPool:
+    """
+    Long-lived pool of warm Square MCP sessions shared by the whole app.
+
+    - size: number of `square-mcp-server` subprocesses (MCP_POOL_SIZE)
+    - checkout is FIFO-fair (asyncio.Queue waiters are served in order)
+    - sessions that raise transport errors or fail the periodic ping are respawned
+    """
+
+    def __init__(self, size: Optional[int] = None, health_interval: Optional[float] = None):
+        self.size = max(1, size or _env_int("MCP_POOL_SIZE", 2))
+        self.health_interval = health_interval or _env_float("MCP_POOL_HEALTH_INTERVAL", 30.0)
+        self.ping_timeout = _env_float("MCP_POOL_PING_TIMEOUT", 5.0)
+        self.checkout_timeout = _env_float("MCP_POOL_CHECKOUT_TIMEOUT", 60.0)
+
+        self._slots: List[_PooledSession] = []
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._start_lock = asyncio.Lock()
+        self._started = False
+        self._closing = False
+        self._health_task: Optional[asyncio.Task] = None
+        self._bg: set = set()
+
+        self._proxy_tools: List[BaseTool] = []
+        self.fingerprint: Optional[str] = None
+        self.respawns = 0
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    async def start(self):
+        async with self._start_lock:
+            if self._started:
+                return
+            self._closing = False
+            self._slots = [_PooledSession(i) for i in range(self.size)]
+            results = await asyncio.gather(*(s.start() for s in self._slots), return_exceptions=True)
+
+            ok = [s for s, r in zip(self._slots, results) if not isinstance(r, BaseException)]
+            if not ok:
+                raise results[0]
+            for s, r in zip(self._slots, results):
+                if isinstance(r, BaseException):
+                    logger.warning("MCP session %s failed to start, will retry: %s", s.index, r)
+                    self._spawn_bg(self._recycle(s))
+
+            self._refresh_tools(ok[0])
+            for s in ok:
+                self._idle.put_nowait(s)
+
+            self._health_task = asyncio.create_task(self._health_loop(), name="mcp-pool-health")
+            self._started = True
+
+    async def close(self):
+        async with self._start_lock:
+            if not self._started:
+                return
+            self._started = False
+            self._closing = True
+            if self._health_task is not None:
+                self._health_task.cancel()
+                self._health_task = None
+            for t in list(self._bg):
+                t.cancel()
+            await asyncio.gather(*(s.stop() for s in self._slots), return_exceptions=True)
+            self._slots = []
+            self._idle = asyncio.Queue()
+
+    def _spawn_bg(self, coro):
+        t = asyncio.create_task(coro)
+        self._bg.add(t)
+        t.add_done_callback(self._bg.discard)
+
+    def _refresh_tools(self, slot: _PooledSession):
+        tools = list(slot.tools.values())
+        fp = tools_fingerprint(tools)
+        if fp != self.fingerprint:
+            self.fingerprint = fp
+            self._proxy_tools = [self._make_proxy(t) for t in tools]
+
+    async def _recycle(self, slot: _PooledSession):
+        """
+        Restart a dead/unhealthy session and return it to the idle queue.
+        Retries with backoff so a crashing server doesn't spin.
+        """
+        delay = 0.5
+        while not self._closing:
+            await slot.stop()
+            try:
+                await slot.start()
+                self.respawns += 1
+                self._refresh_tools(slot)
+                self._idle.put_nowait(slot)
+                return
+            except Exception as e:
+                logger.warning("MCP session %s respawn failed: %s", slot.index, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for _ in range(self._idle.qsize()):
+                try:
+                    slot = self._idle.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if await slot.ping(self.ping_timeout):
+                    self._idle.put_nowait(slot)
+                else:
+                    logger.warning("MCP session %s failed health check, respawning", slot.index)
+                    self._spawn_bg(self._recycle(slot))
+
+    @asynccontextmanager
+    async def checkout(self):
+        if not self._started:
+            await self.start()
+
+        with tracing.span("mcp_checkout", idle=self._idle.qsize()):
+            slot: _PooledSession = await asyncio.wait_for(self._idle.get(), timeout=self.checkout_timeout)
+        try:
+            yield slot
+        except ToolException:
+            raise
+        except Exception:
+            # transport-level failure: the subprocess is likely gone
+            slot.healthy = False
+            raise
+        finally:
+            if slot.healthy:
+                self._idle.put_nowait(slot)
+            else:
+                self._spawn_bg(self._recycle(slot))
+
+    async def call_tool(self, name: str, args: Dict[str, Any]) -> Any:
+        limiter = get_rate_limiter("mcp")
+        if limiter is not None:
+            await limiter.aacquire()
+        async with self.checkout() as slot:
+            tool = slot.tools.get(name)
+            if tool is None:
+                raise ToolException(f"Unknown MCP tool: {name}")
+            with tracing.span("mcp_call", tool=name, session=slot.index):
+                return await tool.ainvoke(args)
+
+    def _make_proxy(self, tool: BaseTool) -> BaseTool:
+        name = tool.name
+
+        async def _call(**kwargs):
+            return await self.call_tool(name, kwargs)
+
+        return StructuredTool(
+            name=name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            coroutine=_call,
+        )
+
+    async def get_tools(self) -> List[BaseTool]:
+        """
+        Session-independent tools: each call checks out a pooled session,
+        so the same tool objects can be shared by every agent/turn.
+        """
+        if not self._started:
+            await self.start()
+        return list(self._proxy_tools)
+
+    def idle_sessions(self) -> int:
+        return self._idle.qsize()
+
+    async def get_tool(self, suffix: str) -> Optional[BaseTool]:
+        tools = await self.get_tools()
+        return next((t for t in tools if t.name.endswith(suffix)), None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "healthy": sum(1 for s in self._slots if s.healthy),
+            "respawns": self.respawns,
+            "fingerprint": self.fingerprint,
+        }
+
+
+_POOL: Optional[MCPSessionPool] = None
+
+
+def get_pool() -> MCPSessionPool:
+    global _POOL
+    if _POOL is None:
+        _POOL = MCPSessionPool()
+    return _POOL
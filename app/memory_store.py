@@ -1,35 +1,466 @@
-from typing import Dict, List, Optional
+"""
+Chat sessions + pending write actions behind a pluggable backend.
+
+SESSION_STORE=memory (default) | sqlite | redis
+- memory: LRU over sessions (SESSION_MAX_SESSIONS) with idle TTL
+- sqlite: SESSION_DB_PATH, WAL mode, shareable across uvicorn workers
+- redis:  SESSION_REDIS_URL, plain RESP over a socket (no client library needed)
+
+Every backend keeps at most SESSION_MAX_MESSAGES per session (oldest dropped),
+expires idle sessions after SESSION_TTL seconds and pending actions after
+PENDING_TTL seconds.
+"""
+
+import os
+import json
+import time
 import uuid
+import socket
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _message(role: str, content: str) -> dict:
+    return {"role": role, "content": content}
+
+
+class MemorySessionStore:
+    def __init__(self, max_messages: int, ttl: int, pending_ttl: int, max_sessions: int):
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.max_sessions = max_sessions
+        # session_id -> (last_touched, messages)
+        self._sessions: "OrderedDict[str, Tuple[float, Deque[dict]]]" = OrderedDict()
+        # session_id -> (expires_at, pending)
+        self._pending: Dict[str, Tuple[float, dict]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, session_id: str) -> Optional[Deque[dict]]:
+        hit = self._sessions.get(session_id)
+        if hit is None:
+            return None
+        touched, messages = hit
+        if time.time() - touched > self.ttl:
+            self._sessions.pop(session_id, None)
+            self._pending.pop(session_id, None)
+            return None
+        return messages
+
+    def history(self, session_id: str, last: Optional[int] = None) -> List[dict]:
+        with self._lock:
+            messages = self._get(session_id)
+            if not messages:
+                return []
+            if last is None or last >= len(messages):
+                return list(messages)
+            return list(islice(messages, len(messages) - last, None))
+
+    def append(self, session_id: str, role: str, content: str):
+        with self._lock:
+            messages = self._get(session_id)
+            if messages is None:
+                messages = deque(maxlen=self.max_messages)
+            messages.append(_message(role, content))
+            self._sessions[session_id] = (time.time(), messages)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                evicted, _ = self._sessions.popitem(last=False)
+                self._pending.pop(evicted, None)
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._pending.pop(session_id, None)
+
+    def set_pending(self, session_id: str, pending: dict):
+        with self._lock:
+            self._pending[session_id] = (time.time() + self.pending_ttl, pending)
+
+    def get_pending(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            hit = self._pending.get(session_id)
+            if hit is None:
+                return None
+            if hit[0] < time.time():
+                self._pending.pop(session_id, None)
+                return None
+            return hit[1]
+
+    def pop_pending(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            hit = self._pending.pop(session_id, None)
+            if hit is None or hit[0] < time.time():
+                return None
+            return hit[1]
+
+    def clear_pending(self, session_id: str):
+        with self._lock:
+            self._pending.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "sessions": len(self._sessions), "pending": len(self._pending)}
+
+
+class SQLiteSessionStore:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS messages (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, seq);
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        touched_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS pending (
+        session_id TEXT PRIMARY KEY,
+        payload TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path: str, max_messages: int, ttl: int, pending_ttl: int):
+        self.path = path
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        with self._conn() as db:
+            db.executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread; WAL lets several workers share the file
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _sweep(self, db: sqlite3.Connection, now: float):
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        cutoff = now - self.ttl
+        db.execute("DELETE FROM messages WHERE session_id IN (SELECT session_id FROM sessions WHERE touched_at < ?)", (cutoff,))
+        db.execute("DELETE FROM sessions WHERE touched_at < ?", (cutoff,))
+        db.execute("DELETE FROM pending WHERE expires_at < ?", (now,))
+
+    def _alive(self, db: sqlite3.Connection, session_id: str) -> bool:
+        row = db.execute("SELECT touched_at FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None and time.time() - row[0] <= self.ttl
+
+    def history(self, session_id: str, last: Optional[int] = None) -> List[dict]:
+        db = self._conn()
+        if not self._alive(db, session_id):
+            return []
+        rows = db.execute(
+            "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+            (session_id, last if last is not None else self.max_messages),
+        ).fetchall()
+        return [_message(role, content) for role, content in reversed(rows)]
+
+    def append(self, session_id: str, role: str, content: str):
+        db = self._conn()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if not self._alive(db, session_id):
+                db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            db.execute(
+                "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                (session_id, role, content, now),
+            )
+            db.execute(
+                "INSERT INTO sessions (session_id, touched_at) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET touched_at = excluded.touched_at",
+                (session_id, now),
+            )
+            db.execute(
+                "DELETE FROM messages WHERE session_id = ? AND seq <= "
+                "(SELECT seq FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                (session_id, session_id, self.max_messages),
+            )
+            self._sweep(db, now)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def clear(self, session_id: str):
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            db.execute("DELETE FROM pending WHERE session_id = ?", (session_id,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def set_pending(self, session_id: str, pending: dict):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO pending (session_id, payload, expires_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(pending), time.time() + self.pending_ttl),
+        )
+
+    def get_pending(self, session_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT payload FROM pending WHERE session_id = ? AND expires_at >= ?",
+            (session_id, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def pop_pending(self, session_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "DELETE FROM pending WHERE session_id = ? RETURNING payload, expires_at",
+            (session_id,),
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def clear_pending(self, session_id: str):
+        self._conn().execute("DELETE FROM pending WHERE session_id = ?", (session_id,))
 
-# session_id -> chat history
-_SESSIONS: Dict[str, List[dict]] = {}
+    def stats(self) -> Dict[str, Any]:
+        db = self._conn()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "sessions": db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0],
+            "pending": db.execute("SELECT COUNT(*) FROM pending").fetchone()[0],
+        }
 
-# session_id -> pending write request
-_PENDING: Dict[str, dict] = {}
 
+class RESPClient:
+    """
+    Just enough of the Redis protocol (RESP2) for the session store. Works
+    against Redis, Valkey, KeyDB or any local stand-in speaking RESP.
+    """
 
-def get_history(session_id: str) -> List[dict]:
-    return _SESSIONS.get(session_id, []).copy()
+    def __init__(self, url: str, timeout: float = 5.0):
+        u = urlparse(url)
+        self.host = u.hostname or "localhost"
+        self.port = u.port or 6379
+        self.password = u.password
+        self.db = int((u.path or "/0").lstrip("/") or 0)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock, self._file = sock, sock.makefile("rb")
+        if self.password:
+            self._roundtrip([("AUTH", self.password)])
+        if self.db:
+            self._roundtrip([("SELECT", self.db)])
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock, self._file = None, None
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for a in args:
+            b = a if isinstance(a, bytes) else str(a).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(b), b))
+        return b"".join(out)
+
+    def _read(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("RESP server closed the connection")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RuntimeError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = self._file.read(n + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._read() for _ in range(n)]
+        raise ConnectionError(f"unexpected RESP reply: {line!r}")
+
+    def _roundtrip(self, commands) -> list:
+        self._sock.sendall(b"".join(self._encode(c) for c in commands))
+        replies = []
+        for _ in commands:
+            try:
+                replies.append(self._read())
+            except RuntimeError as e:
+                replies.append(e)
+        return replies
+
+    def pipeline(self, *commands) -> list:
+        """Sends all commands in one write and returns their replies in order."""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._roundtrip(commands)
+                except (OSError, ConnectionError):
+                    self._close()
+                    if attempt:
+                        raise
+        return []
+
+    def execute(self, *args):
+        reply = self.pipeline(args)[0]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+class RedisSessionStore:
+    """
+    Keys (prefix SESSION_REDIS_PREFIX, default "sq:"):
+    - {prefix}h:{session_id}  list of JSON messages, LTRIM-capped, EXPIRE'd on write
+    - {prefix}p:{session_id}  pending action JSON with EX = PENDING_TTL
+    """
+
+    def __init__(self, url: str, max_messages: int, ttl: int, pending_ttl: int, prefix: str = "sq:"):
+        self.client = RESPClient(url)
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.prefix = prefix
+
+    def _hkey(self, session_id: str) -> str:
+        return f"{self.prefix}h:{session_id}"
+
+    def _pkey(self, session_id: str) -> str:
+        return f"{self.prefix}p:{session_id}"
+
+    def history(self, session_id: str, last: Optional[int] = None) -> List[dict]:
+        start = -last if last is not None else -self.max_messages
+        if last == 0:
+            return []
+        items = self.client.execute("LRANGE", self._hkey(session_id), start, -1) or []
+        return [json.loads(x) for x in items]
+
+    def append(self, session_id: str, role: str, content: str):
+        key = self._hkey(session_id)
+        self.client.pipeline(
+            ("RPUSH", key, json.dumps(_message(role, content), ensure_ascii=False)),
+            ("LTRIM", key, -self.max_messages, -1),
+            ("EXPIRE", key, self.ttl),
+        )
+
+    def clear(self, session_id: str):
+        self.client.execute("DEL", self._hkey(session_id), self._pkey(session_id))
+
+    def set_pending(self, session_id: str, pending: dict):
+        self.client.execute("SET", self._pkey(session_id), json.dumps(pending), "EX", self.pending_ttl)
+
+    def get_pending(self, session_id: str) -> Optional[dict]:
+        raw = self.client.execute("GET", self._pkey(session_id))
+        return json.loads(raw) if raw else None
+
+    def pop_pending(self, session_id: str) -> Optional[dict]:
+        key = self._pkey(session_id)
+        try:
+            raw = self.client.execute("GETDEL", key)
+        except RuntimeError:
+            # servers without GETDEL (< 6.2): MULTI/EXEC keeps it atomic
+            replies = self.client.pipeline(("MULTI",), ("GET", key), ("DEL", key), ("EXEC",))
+            raw = replies[-1][0] if isinstance(replies[-1], list) else None
+        return json.loads(raw) if raw else None
+
+    def clear_pending(self, session_id: str):
+        self.client.execute("DEL", self._pkey(session_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "host": f"{self.client.host}:{self.client.port}"}
+
+
+def build_store():
+    backend = os.environ.get("SESSION_STORE", "memory").lower()
+    max_messages = max(2, _env_int("SESSION_MAX_MESSAGES", 200))
+    ttl = max(60, _env_int("SESSION_TTL", 86400))
+    pending_ttl = max(10, _env_int("PENDING_TTL", 900))
+    if backend == "sqlite":
+        path = os.environ.get("SESSION_DB_PATH", "sessions.db")
+        return SQLiteSessionStore(path, max_messages, ttl, pending_ttl)
+    if backend == "redis":
+        url = os.environ.get("SESSION_REDIS_URL", "redis://localhost:6379/0")
+        prefix = os.environ.get("SESSION_REDIS_PREFIX", "sq:")
+        return RedisSessionStore(url, max_messages, ttl, pending_ttl, prefix)
+    max_sessions = max(1, _env_int("SESSION_MAX_SESSIONS", 10000))
+    return MemorySessionStore(max_messages, ttl, pending_ttl, max_sessions)
+
+
+_STORE = None
+
+
+def get_store():
+    global _STORE
+    if _STORE is None:
+        _STORE = build_store()
+    return _STORE
+
+
+def get_history(session_id: str, last: Optional[int] = None) -> List[dict]:
+    """Session messages, oldest first. `last` returns only the newest N."""
+    return get_store().history(session_id, last)
 
 
 def append_message(session_id: str, role: str, content: str):
-    _SESSIONS.setdefault(session_id, []).append({"role": role, "content": content})
+    get_store().append(session_id, role, content)
 
 
 def clear_history(session_id: str):
-    _SESSIONS[session_id] = []
-    _PENDING.pop(session_id, None)
+    get_store().clear(session_id)
 
 
 def set_pending(session_id: str, user_request: str) -> str:
     action_id = str(uuid.uuid4())
-    _PENDING[session_id] = {"action_id": action_id, "user_request": user_request}
+    get_store().set_pending(session_id, {"action_id": action_id, "user_request": user_request})
     return action_id
 
 
 def get_pending(session_id: str) -> Optional[dict]:
-    return _PENDING.get(session_id)
+    return get_store().get_pending(session_id)
+
+
+def pop_pending(session_id: str) -> Optional[dict]:
+    """Atomically takes the pending action, so a double Approve runs it once."""
+    return get_store().pop_pending(session_id)
 
 
 def clear_pending(session_id: str):
-    _PENDING.pop(session_id, None)
+    get_store().clear_pending(session_id)
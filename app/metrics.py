@@ -0,0 +1,126 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, List, Tuple
+
+# Process-local metrics. Keys are (name, sorted label items).
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_COUNTERS: Dict[_Key, float] = {}
+_GAUGES: Dict[_Key, float] = {}
+_SUMMARIES: Dict[_Key, Dict[str, Any]] = {}
+
+RESERVOIR_SIZE = 2048
+
+
+def _key(name: str, labels: Dict[str, Any]) -> _Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def incr(name: str, value: float = 1.0, **labels):
+    k = _key(name, labels)
+    _COUNTERS[k] = _COUNTERS.get(k, 0.0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    _GAUGES[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels):
+    k = _key(name, labels)
+    s = _SUMMARIES.get(k)
+    if s is None:
+        s = {"count": 0, "sum": 0.0, "recent": deque(maxlen=RESERVOIR_SIZE)}
+        _SUMMARIES[k] = s
+    s["count"] += 1
+    s["sum"] += value
+    s["recent"].append(value)
+
+
+@contextmanager
+def timer(name: str, **labels):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0, **labels)
+
+
+def quantile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def _summary_view(recent: Deque[float], count: int, total: float) -> Dict[str, float]:
+    values = list(recent)
+    return {
+        "count": count,
+        "sum": round(total, 6),
+        "p50": round(quantile(values, 0.50), 6),
+        "p95": round(quantile(values, 0.95), 6),
+        "p99": round(quantile(values, 0.99), 6),
+    }
+
+
+def _fmt(k: _Key) -> str:
+    name, labels = k
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{a}={b}" for a, b in labels) + "}"
+
+
+def snapshot() -> Dict[str, Any]:
+    return {
+        "counters": {_fmt(k): v for k, v in _COUNTERS.items()},
+        "gauges": {_fmt(k): v for k, v in _GAUGES.items()},
+        "summaries": {
+            _fmt(k): _summary_view(s["recent"], s["count"], s["sum"]) for k, s in _SUMMARIES.items()
+        },
+    }
+
+
+def _prom_escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _prom_labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_prom_escape(v)}"' for k, v in items) + "}"
+
+
+def prometheus_text() -> str:
+    """Everything above in the Prometheus text exposition format (0.0.4)."""
+    lines: List[str] = []
+
+    def by_name(d):
+        grouped: Dict[str, List[Tuple[_Key, Any]]] = {}
+        for k, v in sorted(d.items()):
+            grouped.setdefault(k[0], []).append((k, v))
+        return grouped.items()
+
+    for name, rows in by_name(_COUNTERS):
+        lines.append(f"# TYPE {name} counter")
+        lines.extend(f"{name}{_prom_labels(k[1])} {v}" for k, v in rows)
+    for name, rows in by_name(_GAUGES):
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(f"{name}{_prom_labels(k[1])} {v}" for k, v in rows)
+    for name, rows in by_name(_SUMMARIES):
+        lines.append(f"# TYPE {name} summary")
+        for k, s in rows:
+            values = list(s["recent"])
+            for q in ("0.5", "0.95", "0.99"):
+                lines.append(f"{name}{_prom_labels(k[1], (('quantile', q),))} {quantile(values, float(q))}")
+            lines.append(f"{name}_sum{_prom_labels(k[1])} {s['sum']}")
+            lines.append(f"{name}_count{_prom_labels(k[1])} {s['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    _COUNTERS.clear()
+    _GAUGES.clear()
+    _SUMMARIES.clear()
@@ -0,0 +1,120 @@
+"""
+Cost-aware model cascade for agent turns.
+
+A turn starts on the cheapest tier and moves up only when it has to:
+- "guard"       an answer fails a guard (chart omitted, invented weekly salary)
+- "tool_errors" AGENT_CASCADE_TOOL_ERRORS tool errors in one turn (default 2)
+- "complex"     the router marked the request complex (starts on the top tier)
+- "writes"      approved write turns start on the top tier
+
+Configured with AGENT_CASCADE="gpt-4.1-mini,gpt-4.1" (cheap -> strong) and
+AGENT_CASCADE_ESCALATE_ON="guard,tool_errors,complex,writes", or a JSON file
+in AGENT_CASCADE_CONFIG with the same keys ("tiers", "escalate_on",
+"max_tool_errors"); env values win over the file. Without a cascade every
+turn uses CHAT_MODEL.
+"""
+
+import os
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from . import metrics
+from .llm import chat_model_name
+
+logger = logging.getLogger(__name__)
+
+ESCALATION_REASONS = ("guard", "tool_errors", "complex", "writes")
+
+
+def _split(raw: str) -> List[str]:
+    return [x.strip() for x in raw.split(",") if x.strip()]
+
+
+class ModelCascade:
+    def __init__(self, tiers: Optional[List[str]] = None, escalate_on: Optional[List[str]] = None, max_tool_errors: int = 2):
+        # None: single tier that follows CHAT_MODEL
+        self._tiers = tiers or None
+        self.escalate_on = set(escalate_on if escalate_on is not None else ESCALATION_REASONS)
+        self.max_tool_errors = max(1, max_tool_errors)
+
+    @property
+    def tiers(self) -> List[str]:
+        return self._tiers or [chat_model_name()]
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.tiers) > 1
+
+    @property
+    def top(self) -> int:
+        return len(self.tiers) - 1
+
+    def model(self, tier: int) -> str:
+        return self.tiers[min(tier, self.top)]
+
+    def start_tier(self, route: Optional[Dict[str, Any]], allow_writes: bool) -> int:
+        if allow_writes and "writes" in self.escalate_on:
+            return self.top
+        if route and route.get("complexity") == "complex" and "complex" in self.escalate_on:
+            return self.top
+        return 0
+
+    def escalate(self, tier: int, reason: str, tool_errors: int = 0) -> int:
+        """Next tier for `reason`, or `tier` unchanged if the policy doesn't escalate."""
+        if tier >= self.top or reason not in self.escalate_on:
+            return tier
+        if reason == "tool_errors" and tool_errors < self.max_tool_errors:
+            return tier
+        metrics.incr("agent_escalations_total", reason=reason, source=self.model(tier), target=self.model(tier + 1))
+        return tier + 1
+
+    def record_turn(self, start: int, final: int, seconds: float):
+        metrics.incr("agent_cascade_turns_total", start=self.model(start), final=self.model(final))
+        metrics.observe("agent_turn_seconds", seconds, model=self.model(final), escalated=final != start)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tiers": self.tiers, "escalate_on": sorted(self.escalate_on), "max_tool_errors": self.max_tool_errors}
+
+
+def _load_config(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError) as e:
+        logger.warning("AGENT_CASCADE_CONFIG %s ignored: %s", path, e)
+        return {}
+
+
+def build_cascade() -> ModelCascade:
+    cfg = _load_config(os.environ["AGENT_CASCADE_CONFIG"]) if os.environ.get("AGENT_CASCADE_CONFIG") else {}
+
+    tiers = cfg.get("tiers") or []
+    if os.environ.get("AGENT_CASCADE"):
+        tiers = _split(os.environ["AGENT_CASCADE"])
+
+    escalate_on = cfg.get("escalate_on")
+    if os.environ.get("AGENT_CASCADE_ESCALATE_ON") is not None:
+        escalate_on = _split(os.environ["AGENT_CASCADE_ESCALATE_ON"])
+    unknown = set(escalate_on or ()) - set(ESCALATION_REASONS)
+    if unknown:
+        logger.warning("Unknown cascade escalation reasons ignored: %s", sorted(unknown))
+        escalate_on = [r for r in escalate_on if r in ESCALATION_REASONS]
+
+    try:
+        max_tool_errors = int(os.environ.get("AGENT_CASCADE_TOOL_ERRORS", cfg.get("max_tool_errors", 2)))
+    except ValueError:
+        max_tool_errors = 2
+
+    return ModelCascade(tiers=[str(t) for t in tiers], escalate_on=escalate_on, max_tool_errors=max_tool_errors)
+
+
+_CASCADE: Optional[ModelCascade] = None
+
+
+def get_cascade() -> ModelCascade:
+    global _CASCADE
+    if _CASCADE is None:
+        _CASCADE = build_cascade()
+    return _CASCADE
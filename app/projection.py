@@ -0,0 +1,256 @@
+"""
+Compacts Square JSON before it enters the agent's context:
+- keeps only the fields listed for the service (unknown services keep all)
+- drops null / empty values
+- collapses money objects {"amount": 3600, "currency": "USD"} into "36.00 USD"
+- truncates long arrays; the top-level list gets a "proj:" cursor that the
+  make_api_request wrapper serves from memory (no second Square call)
+"""
+
+import os
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from . import metrics
+from .mcp_json import dumps, parse_mcp_text
+
+logger = logging.getLogger(__name__)
+
+
+# currencies whose minor unit isn't 1/100
+CURRENCY_EXPONENT = {
+    "BIF": 0, "CLP": 0, "DJF": 0, "GNF": 0, "ISK": 0, "JPY": 0, "KMF": 0, "KRW": 0,
+    "PYG": 0, "RWF": 0, "UGX": 0, "VND": 0, "VUV": 0, "XAF": 0, "XOF": 0, "XPF": 0,
+    "BHD": 3, "IQD": 3, "JOD": 3, "KWD": 3, "LYD": 3, "OMR": 3, "TND": 3,
+}
+
+# always kept, whatever the service
+COMMON_FIELDS = {"cursor", "errors", "code", "detail", "field", "category", "id", "version", "type"}
+
+# values that carry no information when they're the default
+DEFAULT_VALUES = {"is_deleted": False, "present_at_all_locations": True}
+
+# per-service field names to keep (matched at any depth)
+SERVICE_FIELDS: Dict[str, set] = {
+    "locations": {
+        "locations", "location", "name", "status", "business_name", "timezone", "currency",
+        "country", "address", "address_line_1", "locality", "administrative_district_level_1",
+        "postal_code", "merchant_id",
+    },
+    "catalog": {
+        "objects", "object", "catalog_object", "related_objects", "items", "is_deleted", "updated_at",
+        "present_at_all_locations", "present_at_location_ids", "item_data", "name",
+        "description", "category_id", "categories", "variations", "item_variation_data",
+        "item_id", "price_money", "pricing_type", "sku", "category_data", "tax_data",
+        "percentage", "modifier_data", "id_mappings", "client_object_id", "object_id",
+        "counts", "quantity", "state", "location_id", "catalog_object_id",
+    },
+    "team": {
+        "team_members", "team_member", "wage_setting", "wage_settings", "given_name",
+        "family_name", "email_address", "phone_number", "status", "is_owner",
+        "assigned_locations", "assignment_type", "location_ids", "job_assignments",
+        "job_title", "job_id", "pay_type", "hourly_rate", "annual_rate", "weekly_hours",
+        "team_member_id", "is_overtime_exempt", "jobs", "job", "title", "tip_eligible",
+    },
+    "orders": {
+        "orders", "order", "order_entries", "order_id", "location_id", "state", "created_at",
+        "updated_at", "closed_at", "customer_id", "line_items", "name", "quantity",
+        "variation_name", "catalog_object_id", "base_price_money", "gross_sales_money",
+        "total_money", "total_tax_money", "total_discount_money", "total_tip_money",
+        "total_service_charge_money", "net_amounts", "tenders", "amount_money",
+        "reference_id", "source", "fulfillments", "uid",
+    },
+    "customers": {
+        "customers", "customer", "given_name", "family_name", "company_name", "nickname",
+        "email_address", "phone_number", "created_at", "updated_at", "reference_id",
+        "note", "groups", "segment_ids", "count",
+    },
+    "payments": {
+        "payments", "payment", "refunds", "refund", "status", "created_at", "updated_at",
+        "amount_money", "tip_money", "total_money", "approved_money", "refunded_money",
+        "processing_fee", "source_type", "location_id", "order_id", "customer_id",
+        "receipt_number", "card_details", "card", "card_brand", "last_4", "reason",
+    },
+    "labor": {
+        "shifts", "shift", "wage_settings", "team_member_wages", "team_member_wage",
+        "team_member_id", "location_id", "start_at", "end_at", "status", "wage", "title",
+        "hourly_rate", "job_id", "breaks", "break_type_id", "break_types", "is_paid",
+        "expected_duration", "workweek_configs",
+    },
+    "inventory": {
+        "counts", "count", "changes", "catalog_object_id", "catalog_object_type", "state",
+        "location_id", "quantity", "calculated_at", "occurred_at", "adjustment",
+        "physical_count", "from_state", "to_state",
+    },
+}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def projection_enabled() -> bool:
+    return os.environ.get("PROJECTION", "true").lower() == "true"
+
+
+def measure_enabled() -> bool:
+    return os.environ.get("PROJECTION_MEASURE", "false").lower() == "true"
+
+
+def money_to_decimal(amount: Optional[int], currency: str = "USD") -> float:
+    # Square returns the smallest currency unit (USD cents): 400 => 4.00, JPY 400 => 400
+    if amount is None:
+        return 0.0
+    exp = CURRENCY_EXPONENT.get((currency or "USD").upper(), 2)
+    return round(amount / (10 ** exp), exp)
+
+
+def format_money(money: dict) -> str:
+    currency = money.get("currency") or "USD"
+    exp = CURRENCY_EXPONENT.get(currency.upper(), 2)
+    return f"{money_to_decimal(money.get('amount'), currency):.{exp}f} {currency}"
+
+
+def _is_money(value: Any) -> bool:
+    return (
+        isinstance(value, dict)
+        and isinstance(value.get("amount"), int)
+        and set(value) <= {"amount", "currency"}
+    )
+
+
+class Projector:
+    def __init__(self, max_items: Optional[int] = None, max_nested: Optional[int] = None):
+        self.max_items = max_items or max(1, _env_int("PROJECTION_MAX_ITEMS", 25))
+        self.max_nested = max_nested or max(1, _env_int("PROJECTION_MAX_NESTED", 10))
+        # stash_id -> (service, method, items_key, items, square_cursor)
+        self._pages: "OrderedDict[str, Tuple[str, str, str, list, Optional[str]]]" = OrderedDict()
+        self._max_pages = 64
+
+    def _value(self, value: Any, keep: Optional[set]) -> Any:
+        if _is_money(value):
+            return format_money(value)
+        if isinstance(value, dict):
+            out = {}
+            for k, v in value.items():
+                if keep is not None and k not in keep and k not in COMMON_FIELDS:
+                    continue
+                if DEFAULT_VALUES.get(k, ...) is v:
+                    continue
+                v = self._value(v, keep)
+                if v is None or v == "" or v == [] or v == {}:
+                    continue
+                out[k] = v
+            return out
+        if isinstance(value, list):
+            items = [self._value(v, keep) for v in value[: self.max_nested]]
+            if len(value) > self.max_nested:
+                items.append(f"... {len(value) - self.max_nested} more")
+            return items
+        return value
+
+    def _top(self, data: dict, keep: Optional[set]) -> dict:
+        # top-level lists are the result itself: cap at max_items, not max_nested
+        out = {}
+        for k, v in data.items():
+            if keep is not None and k not in keep and k not in COMMON_FIELDS:
+                continue
+            if isinstance(v, list):
+                items = [self._value(x, keep) for x in v[: self.max_items]]
+                if len(v) > self.max_items:
+                    items.append(f"... {len(v) - self.max_items} more")
+                v = items
+            else:
+                v = self._value(v, keep)
+            if v is None or v == "" or v == [] or v == {}:
+                continue
+            out[k] = v
+        return out
+
+    def project(self, service: str, method: str, data: Any) -> Any:
+        keep = SERVICE_FIELDS.get(service)
+        if not isinstance(data, dict):
+            return self._value(data, keep)
+
+        # the main result list (the one Square paginates) gets a real follow-up cursor
+        items_key = next(
+            (k for k, v in data.items() if isinstance(v, list) and len(v) > self.max_items and k != "errors"),
+            None,
+        )
+        if items_key is None:
+            return self._top(data, keep)
+
+        items = data[items_key]
+        rest = {k: v for k, v in data.items() if k != items_key}
+        return self._page(service, method, items_key, items, 0, rest.pop("cursor", None), rest, keep)
+
+    def _page(self, service, method, items_key, items, offset, square_cursor, rest, keep) -> dict:
+        end = offset + self.max_items
+        out = self._top(rest, keep) if rest else {}
+        out[items_key] = [self._value(v, keep) for v in items[offset:end]]
+        if end < len(items):
+            stash_id = uuid.uuid4().hex[:12]
+            self._pages[stash_id] = (service, method, items_key, items, square_cursor)
+            while len(self._pages) > self._max_pages:
+                self._pages.popitem(last=False)
+            out["cursor"] = f"proj:{stash_id}:{end}"
+            out["truncated"] = {"shown": f"{offset + 1}-{end}", "total_in_page": len(items)}
+        elif square_cursor:
+            out["cursor"] = square_cursor
+        return out
+
+    def next_page(self, service: str, method: str, cursor: str) -> Optional[dict]:
+        """Serves a proj: cursor from memory, or None if it expired."""
+        try:
+            _, stash_id, offset = cursor.split(":", 2)
+            hit = self._pages[stash_id]
+            offset = int(offset)
+        except (KeyError, ValueError):
+            return None
+        s, m, items_key, items, square_cursor = hit
+        if (s, m) != (service, method):
+            return None
+        return self._page(service, method, items_key, items, offset, square_cursor, None, SERVICE_FIELDS.get(service))
+
+    def apply(self, service: str, method: str, raw: Any) -> Any:
+        """Projected JSON text for a make_api_request result (non-JSON passes through)."""
+        data, text = parse_mcp_text(raw, source="projection")
+        if data is None:
+            return raw
+        t0 = time.perf_counter()
+        out = dumps(self.project(service, method, data))
+        metrics.observe("projection_seconds", time.perf_counter() - t0, service=service)
+        self._measure(service, method, text or dumps(data), out)
+        return out
+
+    def _measure(self, service: str, method: str, before: str, after: str):
+        saved = len(before.encode("utf-8")) - len(after.encode("utf-8"))
+        metrics.incr("projection_bytes_saved_total", saved, service=service)
+        if not measure_enabled():
+            return
+        from .context_window import count_tokens
+
+        raw_tokens, tokens = count_tokens(before), count_tokens(after)
+        metrics.incr("projection_raw_tokens_total", raw_tokens, service=service)
+        metrics.incr("projection_tokens_total", tokens, service=service)
+        metrics.observe("projection_tokens_saved", raw_tokens - tokens, service=service)
+        logger.info(
+            "projection %s.%s: %d -> %d bytes, %d -> %d tokens",
+            service, method, len(before), len(after), raw_tokens, tokens,
+        )
+
+
+_PROJECTOR: Optional[Projector] = None
+
+
+def get_projector() -> Projector:
+    global _PROJECTOR
+    if _PROJECTOR is None:
+        _PROJECTOR = Projector()
+    return _PROJECTOR
@@ -0,0 +1,300 @@
+"""
+Resilience for Square MCP calls (make_api_request).
+
+- deadlines: every attempt is bounded by MCP_TIMEOUT (reads, default 20s) or
+  MCP_WRITE_TIMEOUT (writes, default 60s); MCP_TIMEOUTS="orders.search=10,catalog=15"
+  overrides per service or service.method
+- retries: transient failures only (timeouts, transport errors, 429/5xx-style
+  Square errors), up to MCP_RETRIES times with full-jitter exponential backoff;
+  writes are retried only when they carry an idempotency key
+- hedging: a read still running past its recent p95 gets a duplicate request
+  on an idle pool session; the first success wins (MCP_HEDGE=false disables)
+- circuit breaker per service: MCP_BREAKER_FAILURES consecutive transient
+  failures open it for MCP_BREAKER_COOLDOWN seconds, during which calls fail
+  fast with CircuitOpen (reads are then served from stale cache entries by
+  square_api); one probe call is let through to close it again
+"""
+
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import anyio
+from langchain_core.tools import ToolException
+from mcp.shared.exceptions import McpError
+
+from . import metrics, tracing
+from .mcp_pool import get_pool
+from .square_cache import is_read_method
+
+logger = logging.getLogger(__name__)
+
+# Square/transport error text that is worth retrying. Status codes only count
+# next to a status word ("status 503", "HTTP/1.1 502", "status_code": 429) or
+# their reason phrase, so "quantity must be at most 500" is not transient.
+_TRANSIENT = re.compile(
+    r"\b(?:status(?:[ _]?code)?|http(?:/[\d.]+)?|error|code)\W{0,3}(?:429|5\d\d)\b"
+    r"|\b(?:429|5\d\d)\W{0,3}(?:too many requests|internal server error|bad gateway|service unavailable|gateway time-?out)"
+    r"|\b(?:RATE_LIMITED|INTERNAL_SERVER_ERROR|SERVICE_UNAVAILABLE|GATEWAY_TIMEOUT|BAD_GATEWAY)\b"
+    r"|rate.?limit|timed?.?out|temporar(?:il)?y unavailable|service unavailable|ECONNRESET|ECONNREFUSED"
+    r"|socket hang up|connection (?:closed|reset|refused)",
+    re.I,
+)
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _parse_timeouts(spec: str) -> Dict[str, float]:
+    # "orders.search=10,catalog=15"
+    out = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        k, v = part.split("=", 1)
+        try:
+            out[k.strip()] = float(v)
+        except ValueError:
+            continue
+    return out
+
+
+class CircuitOpen(ToolException):
+    def __init__(self, service: str, retry_after: float):
+        super().__init__(
+            f"Square {service} is temporarily unavailable (too many failures); try again in {max(1, round(retry_after))}s."
+        )
+        self.service = service
+        self.retry_after = retry_after
+
+
+def is_transient(e: BaseException) -> bool:
+    if isinstance(e, (asyncio.TimeoutError, ConnectionError, anyio.ClosedResourceError, anyio.BrokenResourceError)):
+        return True
+    if isinstance(e, (ToolException, McpError)):
+        return bool(_TRANSIENT.search(str(e)))
+    return False
+
+
+class CircuitBreaker:
+    def __init__(self, service: str, failures: int, cooldown: float):
+        self.service = service
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def _set(self, state: str):
+        if state != self.state:
+            self.state = state
+            metrics.incr("mcp_breaker_transitions_total", service=self.service, state=state)
+            metrics.set_gauge("mcp_breaker_state", BREAKER_STATES[state], service=self.service)
+            if state == "open":
+                logger.warning("Circuit for Square %s opened after %d failures", self.service, self.failures)
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def before_call(self) -> bool:
+        """True if this call is the half-open probe. Raises CircuitOpen to fail fast."""
+        if self.state == "open" and self.retry_after() <= 0:
+            self._set("half_open")
+        if self.state == "closed":
+            return False
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        metrics.incr("mcp_breaker_rejections_total", service=self.service)
+        raise CircuitOpen(self.service, self.retry_after() or self.cooldown)
+
+    def abandon(self, probe: bool):
+        # a cancelled probe must not leave the breaker stuck half-open
+        if probe:
+            self._probing = False
+
+    def record(self, ok: bool, probe: bool):
+        if probe:
+            self._probing = False
+        if ok:
+            self.failures = 0
+            self._set("closed")
+            return
+        self.failures += 1
+        if probe or self.failures >= self.max_failures:
+            self.opened_at = time.monotonic()
+            self._set("open")
+
+
+class _Latency:
+    """Recent successful attempt durations per (service, method), for the hedge delay."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        self._p95: Dict[Tuple[str, str], float] = {}
+
+    def add(self, key: Tuple[str, str], seconds: float):
+        samples = self._samples.setdefault(key, deque(maxlen=self.window))
+        samples.append(seconds)
+        if len(samples) % 10 == 0:
+            self._p95[key] = metrics.quantile(list(samples), 0.95)
+
+    def p95(self, key: Tuple[str, str], min_samples: int) -> Optional[float]:
+        if len(self._samples.get(key, ())) < min_samples:
+            return None
+        return self._p95.get(key)
+
+
+class Resilience:
+    def __init__(self):
+        self.read_timeout = _env_float("MCP_TIMEOUT", 20.0)
+        self.write_timeout = _env_float("MCP_WRITE_TIMEOUT", 60.0)
+        self.timeouts = _parse_timeouts(os.environ.get("MCP_TIMEOUTS", ""))
+        self.retries = max(0, _env_int("MCP_RETRIES", 2))
+        self.retry_base = _env_float("MCP_RETRY_BASE_MS", 200.0) / 1000.0
+        self.retry_max = _env_float("MCP_RETRY_MAX_MS", 2000.0) / 1000.0
+        self.hedge = os.environ.get("MCP_HEDGE", "true").lower() == "true"
+        self.hedge_min = _env_float("MCP_HEDGE_MIN_MS", 100.0) / 1000.0
+        self.hedge_min_samples = max(1, _env_int("MCP_HEDGE_MIN_SAMPLES", 20))
+        self.breaker_failures = max(1, _env_int("MCP_BREAKER_FAILURES", 5))
+        self.breaker_cooldown = _env_float("MCP_BREAKER_COOLDOWN", 30.0)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latency = _Latency()
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def deadline(self, service: str, method: str) -> float:
+        default = self.read_timeout if is_read_method(method) else self.write_timeout
+        return self.timeouts.get(f"{service}.{method}", self.timeouts.get(service, default))
+
+    def breaker(self, service: str) -> CircuitBreaker:
+        b = self._breakers.get(service)
+        if b is None:
+            b = self._breakers[service] = CircuitBreaker(service, self.breaker_failures, self.breaker_cooldown)
+        return b
+
+    def _backoff(self, retry: int) -> float:
+        # full jitter: uniform(0, min(max, base * 2^n))
+        return random.uniform(0, min(self.retry_max, self.retry_base * (2 ** retry)))
+
+    async def call(self, service: str, method: str, request: Dict[str, Any], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """fetch() with deadline, transient retries, read hedging and the service's circuit breaker."""
+        read = is_read_method(method)
+        retryable = read or bool((request or {}).get("idempotency_key"))
+        deadline = self.deadline(service, method)
+        breaker = self.breaker(service)
+
+        for retry in range(self.retries + 1):
+            probe = breaker.before_call()
+            t0 = time.perf_counter()
+            try:
+                if read and self.hedge:
+                    value = await self._hedged(service, method, fetch, deadline)
+                else:
+                    value = await asyncio.wait_for(fetch(), timeout=deadline)
+            except asyncio.CancelledError:
+                breaker.abandon(probe)
+                raise
+            except Exception as e:
+                transient = is_transient(e)
+                # non-transient errors (bad request, not found) mean the service is up
+                breaker.record(not transient, probe)
+                if isinstance(e, asyncio.TimeoutError):
+                    metrics.incr("mcp_timeouts_total", service=service, method=method)
+                    e = ToolException(f"Square {service}.{method} timed out after {deadline:g}s")
+                if not transient or not retryable or retry >= self.retries or breaker.state == "open":
+                    raise e
+                metrics.incr("mcp_retries_total", service=service, reason=type(e).__name__)
+                tracing.set_attributes(retries=retry + 1)
+                await asyncio.sleep(self._backoff(retry))
+                continue
+            breaker.record(True, probe)
+            self._latency.add((service, method), time.perf_counter() - t0)
+            return value
+
+    async def _hedged(self, service: str, method: str, fetch: Callable[[], Awaitable[Any]], deadline: float) -> Any:
+        p95 = self._latency.p95((service, method), self.hedge_min_samples)
+        delay = max(self.hedge_min, p95) if p95 is not None else None
+        if delay is None or delay >= deadline:
+            return await asyncio.wait_for(fetch(), timeout=deadline)
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        primary = asyncio.ensure_future(fetch())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and get_pool().idle_sessions() > 0:
+                # a duplicate on another session only helps if one is free
+                self.hedges += 1
+                metrics.incr("mcp_hedges_total", service=service)
+                tracing.set_attributes(hedged=True)
+                tasks.add(asyncio.ensure_future(fetch()))
+
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                remaining = deadline - (loop.time() - start)
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError()
+                for t in done:
+                    if t.exception() is None:
+                        if len(tasks) > 1:
+                            winner = "primary" if t is primary else "hedge"
+                            if winner == "hedge":
+                                self.hedge_wins += 1
+                            metrics.incr("mcp_hedge_wins_total", service=service, winner=winner)
+                        return t.result()
+                    error = t.exception()
+            raise error
+        finally:
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+                elif not t.cancelled():
+                    t.exception()  # retrieved: a losing attempt's error isn't "never retrieved"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "breakers": {
+                s: {"state": b.state, "failures": b.failures, "retry_after": round(b.retry_after(), 1)}
+                for s, b in self._breakers.items()
+            },
+            "hedges": self.hedges,
+            "hedge_win_rate": round(self.hedge_wins / self.hedges, 3) if self.hedges else 0.0,
+            "retries": self.retries,
+            "read_timeout": self.read_timeout,
+        }
+
+
+_RESILIENCE: Optional[Resilience] = None
+
+
+def get_resilience() -> Resilience:
+    global _RESILIENCE
+    if _RESILIENCE is None:
+        _RESILIENCE = Resilience()
+    return _RESILIENCE
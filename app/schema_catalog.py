@@ -0,0 +1,347 @@
+"""
+Local catalog of Square services, methods and request types.
+
+Harvested once from the MCP server's get_service_info / get_type_info tools
+(in the background after the pool starts, and again whenever the tool
+fingerprint changes), persisted to SCHEMA_CACHE_PATH, and used to:
+- give the agent a compact "service: method, method, ..." index in its prompt
+- answer get_service_info / get_type_info locally (no MCP round trip)
+- reject make_api_request calls with an unknown service/method before dispatch
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import pathlib
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from . import metrics
+from .mcp_pool import get_pool
+from .mcp_json import load_file, parse_mcp_text
+from .square_cache import is_read_method
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = pathlib.Path(__file__).resolve().parent.parent / "models" / "square_schema.json"
+
+# services exposed by square-mcp-server; used when the make_api_request
+# description doesn't list them (unknown ones are skipped during harvest)
+DEFAULT_SERVICES = [
+    "applePay", "bankAccounts", "bookingCustomAttributes", "bookings", "cards", "cashDrawers",
+    "catalog", "checkout", "customerCustomAttributes", "customerGroups", "customerSegments",
+    "customers", "devices", "disputes", "events", "giftCardActivities", "giftCards", "inventory",
+    "invoices", "labor", "locationCustomAttributes", "locations", "loyalty",
+    "merchantCustomAttributes", "merchants", "orderCustomAttributes", "orders", "payments",
+    "payouts", "refunds", "sites", "snippets", "subscriptions", "team", "terminal", "vendors",
+    "webhookSubscriptions",
+]
+
+_SERVICES_LINE = re.compile(r"(?:available\s+)?services?\s*:\s*([A-Za-z0-9_,\s]+)", re.I)
+_METHOD_LINE = re.compile(r"^\s*(?:[-*•]\s*|\d+\.\s*)?`?([A-Za-z][A-Za-z0-9_]*)`?\s*(?:[:(\-—]|$)", re.M)
+# get_service_info errors that mean "this server doesn't have it", not "try again"
+_NOT_OFFERED = re.compile(r"unknown service|invalid service|not (?:found|supported)|unsupported|no such", re.I)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def schema_catalog_enabled() -> bool:
+    return os.environ.get("SCHEMA_CATALOG", "true").lower() == "true"
+
+
+def _cache_path() -> Optional[pathlib.Path]:
+    raw = os.environ.get("SCHEMA_CACHE_PATH")
+    if raw is None:
+        return DEFAULT_CACHE_PATH
+    return pathlib.Path(raw) if raw else None
+
+
+def services_from_description(description: str) -> List[str]:
+    m = _SERVICES_LINE.search(description or "")
+    if not m:
+        return []
+    return [s.strip() for s in m.group(1).split(",") if re.fullmatch(r"[A-Za-z][A-Za-z0-9_]*", s.strip())]
+
+
+def parse_methods(raw: Any) -> Dict[str, str]:
+    """
+    {method: description} from a get_service_info result. Accepts the shapes
+    seen in practice: {"methods": [...]}, {"methods": {name: {...}}}, a list
+    of names/objects, or plain text with one method per line.
+    """
+    data, text = parse_mcp_text(raw, source="schema")
+    if isinstance(data, dict):
+        data = data.get("methods", data)
+    if isinstance(data, dict):
+        return {
+            k: (v.get("description", "") if isinstance(v, dict) else str(v or ""))[:200]
+            for k, v in data.items()
+        }
+    if isinstance(data, list):
+        out = {}
+        for m in data:
+            if isinstance(m, str):
+                out[m] = ""
+            elif isinstance(m, dict) and (m.get("name") or m.get("method")):
+                out[m.get("name") or m.get("method")] = str(m.get("description") or "")[:200]
+        return out
+    return {name: "" for name in _METHOD_LINE.findall(text or "") if name.lower() not in ("service", "methods")}
+
+
+class SchemaCatalog:
+    def __init__(self, path: Optional[pathlib.Path] = None):
+        self.path = path
+        self.fingerprint: Optional[str] = None
+        self.harvested_at: Optional[float] = None
+        # service -> {method: description}
+        self.methods: Dict[str, Dict[str, str]] = {}
+        # "service.method" -> raw get_type_info text
+        self.types: Dict[str, str] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._index: Dict[bool, str] = {}
+        # services whose get_service_info errored in the last harvest: they keep
+        # their previous entry, are retried, and unknown services aren't rejected
+        # while any are missing
+        self.failed: Set[str] = set()
+        # last harvest attempt (fingerprint, time), so a failing server is
+        # retried every SCHEMA_RETRY_SECONDS rather than on every turn
+        self._attempted: Optional[Tuple[str, float]] = None
+
+    # ---- state
+
+    def ready(self) -> bool:
+        return bool(self.methods)
+
+    @property
+    def version(self) -> str:
+        """Short hash of the method index (part of the agent cache key)."""
+        if not self.methods:
+            return "none"
+        blob = json.dumps({s: sorted(m) for s, m in self.methods.items()}, sort_keys=True)
+        return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:8]
+
+    def index(self, read_only: bool = False) -> str:
+        """One line per service: "catalog: list, retrieve, search, ..." (read methods only if read_only)."""
+        if read_only not in self._index:
+            lines = []
+            for s, m in sorted(self.methods.items(), key=lambda kv: kv[0].lower()):
+                names = sorted(n for n in m if not read_only or is_read_method(n))
+                if names:
+                    lines.append(f"{s}: {', '.join(names)}")
+            self._index[read_only] = "\n".join(lines)
+        return self._index[read_only]
+
+    def _service_key(self, service: str) -> Optional[str]:
+        if service in self.methods:
+            return service
+        low = (service or "").lower()
+        return next((s for s in self.methods if s.lower() == low), None)
+
+    # ---- lookups
+
+    def validate(self, service: str, method: str, request: Any = None) -> Optional[str]:
+        """Error text for a call that can't succeed, or None (also None when not harvested)."""
+        if not self.ready():
+            return None
+        key = self._service_key(service)
+        if key is None:
+            if self.failed:
+                # the harvest didn't hear back from every service: this may be one of them
+                return None
+            return f"Unknown service '{service}'. Available services: {', '.join(sorted(self.methods))}"
+        if method not in self.methods[key]:
+            return f"Invalid method '{method}' for {key}. Available methods: {', '.join(sorted(self.methods[key]))}"
+        if request is not None and not isinstance(request, dict):
+            return "request must be a JSON object"
+        return None
+
+    def service_info(self, service: str) -> Optional[str]:
+        key = self._service_key(service)
+        if key is None:
+            return None
+        return json.dumps({"service": key, "methods": self.methods[key]}, ensure_ascii=False)
+
+    def type_info(self, service: str, method: str) -> Optional[str]:
+        key = self._service_key(service)
+        return self.types.get(f"{key}.{method}") if key else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready(),
+            "fingerprint": self.fingerprint,
+            "services": len(self.methods),
+            "methods": sum(len(m) for m in self.methods.values()),
+            "types": len(self.types),
+            "failed_services": sorted(self.failed),
+            "harvested_at": self.harvested_at,
+            "path": str(self.path) if self.path else None,
+        }
+
+    # ---- harvest
+
+    def ensure_current(self, fingerprint: Optional[str]):
+        """Schedules a background harvest if the MCP tool set changed or some services failed."""
+        if not fingerprint or (fingerprint == self.fingerprint and not self.failed):
+            return
+        if self._task is not None and not self._task.done():
+            return
+        now = time.time()
+        if self._attempted and self._attempted[0] == fingerprint:
+            if now - self._attempted[1] < max(1, _env_int("SCHEMA_RETRY_SECONDS", 60)):
+                return
+        self._attempted = (fingerprint, now)
+        self._task = asyncio.create_task(self.harvest(fingerprint), name="schema-harvest")
+
+    async def start(self):
+        """Loads the on-disk catalog; harvests in the background if it's stale."""
+        pool = get_pool()
+        if not pool.started:
+            return
+        self.load(pool.fingerprint)
+        self.ensure_current(pool.fingerprint)
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def harvest(self, fingerprint: str):
+        async with self._lock:
+            # same server with failed services: only those are asked again
+            retry = sorted(self.failed) if fingerprint == self.fingerprint else None
+            if fingerprint == self.fingerprint and not retry:
+                return
+            t0 = time.perf_counter()
+            try:
+                methods, types, failed = await self._fetch_all(retry)
+            except Exception as e:
+                metrics.incr("schema_harvest_errors_total")
+                logger.warning("Schema harvest failed: %s", e)
+                return
+            if not methods and retry is None:
+                logger.warning("Schema harvest returned no services; keeping the previous catalog")
+                return
+            if retry is not None:
+                methods = {**self.methods, **methods}
+                types = {**self.types, **types}
+            # an errored service keeps what we knew about it rather than disappearing
+            for service in failed:
+                if service in self.methods and service not in methods:
+                    methods[service] = self.methods[service]
+                    types.update((k, v) for k, v in self.types.items() if k.startswith(service + "."))
+            self.methods, self.types, self.failed = methods, types, set(failed)
+            self.fingerprint = fingerprint
+            self.harvested_at = time.time()
+            self._index = {}
+            metrics.observe("schema_harvest_seconds", time.perf_counter() - t0)
+            metrics.set_gauge("schema_failed_services", len(failed))
+            self._save()
+            logger.info("Schema catalog: %d services, %d methods", len(methods), sum(len(m) for m in methods.values()))
+            if failed:
+                metrics.incr("schema_harvest_errors_total", len(failed))
+                logger.warning("Schema harvest: get_service_info failed for %s; retrying later", ", ".join(failed))
+
+    async def _fetch_all(self, services: Optional[List[str]] = None):
+        """(methods, types, services whose get_service_info errored) for `services` (default: all)."""
+        pool = get_pool()
+        service_tool = await pool.get_tool("get_service_info")
+        type_tool = await pool.get_tool("get_type_info")
+        make_tool = await pool.get_tool("make_api_request")
+        if service_tool is None:
+            return {}, {}, []
+
+        if services is None:
+            services = services_from_description(make_tool.description if make_tool else "") or DEFAULT_SERVICES
+        sem = asyncio.Semaphore(max(1, _env_int("SCHEMA_CONCURRENCY", pool.size)))
+
+        async def call(tool, args):
+            async with sem:
+                return await tool.ainvoke(args)
+
+        async def one_service(service: str):
+            try:
+                return service, parse_methods(await call(service_tool, {"service": service})), False
+            except Exception as e:
+                # "unknown service" means not offered by this server version; anything else is retried
+                logger.debug("get_service_info(%s) failed: %s", service, e)
+                return service, {}, not _NOT_OFFERED.search(str(e))
+
+        results = await asyncio.gather(*(one_service(s) for s in services))
+        methods = {s: m for s, m, _ in results if m}
+        failed = [s for s, _, errored in results if errored]
+
+        types: Dict[str, str] = {}
+        if type_tool is not None:
+            async def one_type(service: str, method: str):
+                try:
+                    _, text = parse_mcp_text(await call(type_tool, {"service": service, "method": method}), source="schema")
+                    return f"{service}.{method}", text
+                except Exception as e:
+                    logger.debug("get_type_info(%s.%s) failed: %s", service, method, e)
+                    return f"{service}.{method}", ""
+
+            pairs = await asyncio.gather(*(one_type(s, m) for s, ms in methods.items() for m in ms))
+            types = {k: v for k, v in pairs if v}
+        return methods, types, failed
+
+    # ---- persistence
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps({
+                "fingerprint": self.fingerprint,
+                "harvested_at": self.harvested_at,
+                "methods": self.methods,
+                "types": self.types,
+                "failed": sorted(self.failed),
+            }), encoding="utf-8")
+            tmp.replace(self.path)
+        except OSError as e:
+            logger.warning("Schema catalog save failed: %s", e)
+
+    def load(self, fingerprint: Optional[str] = None) -> bool:
+        """Reads the on-disk catalog; with a fingerprint, only if it matches."""
+        if not self.path or not self.path.exists():
+            return False
+        try:
+            saved = load_file(self.path)
+        except (OSError, ValueError) as e:
+            logger.warning("Schema catalog load failed: %s", e)
+            return False
+        if fingerprint and saved.get("fingerprint") != fingerprint:
+            # another server version: stale methods would reject valid calls
+            logger.info("Schema catalog on disk is for another MCP server version; re-harvesting")
+            return False
+        self.methods = saved.get("methods") or {}
+        self.types = saved.get("types") or {}
+        self.failed = set(saved.get("failed") or [])
+        self.harvested_at = saved.get("harvested_at")
+        self.fingerprint = saved.get("fingerprint")
+        self._index = {}
+        return self.ready()
+
+
+_CATALOG: Optional[SchemaCatalog] = None
+
+
+def get_schema_catalog() -> SchemaCatalog:
+    global _CATALOG
+    if _CATALOG is None:
+        _CATALOG = SchemaCatalog(_cache_path())
+    return _CATALOG
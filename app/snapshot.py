@@ -0,0 +1,381 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import pathlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from . import metrics
+from .graph_workflow import (
+    ORDERS_LOCATIONS_PER_REQUEST,
+    catalog_row,
+    iter_pages,
+    order_row,
+    team_row,
+)
+from .mcp_json import load_file, unwrap_mcp_json
+from .square_api import make_api_request
+from .square_cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+SERVICES = ("locations", "catalog", "team", "orders")
+
+# seconds between incremental syncs
+DEFAULT_SCHEDULE = {"locations": 600.0, "catalog": 60.0, "team": 300.0, "orders": 30.0}
+
+
+def snapshot_enabled() -> bool:
+    return os.environ.get("SNAPSHOT_SYNC", "false").lower() == "true"
+
+
+def _parse_schedule(spec: str) -> Dict[str, float]:
+    # "catalog=30,orders=10"
+    out = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        k, v = part.split("=", 1)
+        try:
+            out[k.strip()] = float(v)
+        except ValueError:
+            continue
+    return out
+
+
+def _iso(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def _now_iso() -> str:
+    return _iso(datetime.now(timezone.utc))
+
+
+class SquareSnapshot:
+    """
+    Local copy of locations, catalog items, team members and recent orders.
+
+    - catalog: full list once, then catalog.search with begin_time (deleted
+      objects come back with is_deleted and are dropped)
+    - orders: orders.search filtered on updated_at >= last watermark, across
+      all locations; orders older than SNAPSHOT_ORDERS_DAYS are pruned
+    - locations/team: no delta filter in Square, so full fetch + reconcile
+    Each service syncs on its own schedule; writes through make_api_request
+    wake the affected service immediately.
+    """
+
+    def __init__(self):
+        self.data: Dict[str, Dict[str, dict]] = {s: {} for s in SERVICES}
+        self.synced_at: Dict[str, float] = {}
+        self.watermarks: Dict[str, str] = {}
+        self.versions: Dict[str, int] = {s: 0 for s in SERVICES}
+        self.last_changes: Dict[str, Dict[str, int]] = {}
+        # services a write changed since their last sync began
+        self.dirty: Set[str] = set()
+
+        self.schedule = {**DEFAULT_SCHEDULE, **_parse_schedule(os.environ.get("SNAPSHOT_SCHEDULE", ""))}
+        self.orders_days = float(os.environ.get("SNAPSHOT_ORDERS_DAYS", "30"))
+        self.max_pages = int(os.environ.get("SNAPSHOT_MAX_PAGES", "1000"))
+        self.path = os.environ.get("SNAPSHOT_PATH") or None
+
+        self._locks = {s: asyncio.Lock() for s in SERVICES}
+        self._wake = {s: asyncio.Event() for s in SERVICES}
+        self._sem = asyncio.Semaphore(int(os.environ.get("SNAPSHOT_CONCURRENCY", "4")))
+        self._tasks: List[asyncio.Task] = []
+        self._listeners: List[Callable[[str, Dict[str, dict], Dict[str, int]], None]] = []
+
+    # ---- lifecycle ----
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._load()
+        self.watch_writes()
+        self._tasks = [asyncio.create_task(self._loop(s), name=f"snapshot-{s}") for s in SERVICES]
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def watch_writes(self):
+        """Marks services dirty when a write invalidates their cached reads (also without the sync loop)."""
+        get_cache().add_invalidation_listener(self.mark_dirty)
+
+    def mark_dirty(self, service: str):
+        ev = self._wake.get(service)
+        if ev is not None:
+            self.dirty.add(service)
+            ev.set()
+
+    def add_listener(self, fn: Callable[[str, Dict[str, dict], Dict[str, int]], None]):
+        """fn(service, objects_by_id, changes) runs after every sync that changed data."""
+        self._listeners.append(fn)
+
+    async def _loop(self, service: str):
+        while True:
+            # clear before syncing: a mark_dirty that lands mid-sync wakes the next round
+            self._wake[service].clear()
+            try:
+                await self.sync(service)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.incr("snapshot_sync_errors_total", service=service)
+                logger.warning("snapshot sync failed for %s: %s", service, e)
+            try:
+                await asyncio.wait_for(self._wake[service].wait(), timeout=self.schedule.get(service, 60.0))
+            except asyncio.TimeoutError:
+                pass
+
+    # ---- sync ----
+
+    async def sync(self, service: str, full: bool = False) -> Dict[str, int]:
+        async with self._locks[service]:
+            t0 = time.perf_counter()
+            # a write landing mid-sync marks it dirty again
+            self.dirty.discard(service)
+            try:
+                changes = await getattr(self, f"_sync_{service}")(full)
+            except BaseException:
+                self.dirty.add(service)
+                raise
+            self.synced_at[service] = time.time()
+            self.last_changes[service] = changes
+            metrics.observe("snapshot_sync_seconds", time.perf_counter() - t0, service=service, full=full)
+
+            if any(changes.values()):
+                self.versions[service] += 1
+                for k, v in changes.items():
+                    metrics.incr("snapshot_changes_total", v, service=service, kind=k)
+                for fn in list(self._listeners):
+                    try:
+                        fn(service, self.data[service], changes)
+                    except Exception as e:
+                        logger.warning("snapshot listener failed for %s: %s", service, e)
+                self._save()
+            return changes
+
+    async def resync(self, services: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, int]]:
+        """Full (non-incremental) resync, e.g. from the force-resync endpoint."""
+        names = [s for s in (services or SERVICES) if s in SERVICES]
+        if "orders" in names and "locations" in names:
+            names.remove("orders")
+            names.append("orders")  # needs fresh location ids
+        out = {}
+        for s in names:
+            self.watermarks.pop(s, None)
+            out[s] = await self.sync(s, full=True)
+        return out
+
+    def _replace(self, service: str, fresh: Dict[str, dict]) -> Dict[str, int]:
+        old = self.data[service]
+        added = sum(1 for k in fresh if k not in old)
+        updated = sum(1 for k, v in fresh.items() if k in old and old[k] != v)
+        deleted = sum(1 for k in old if k not in fresh)
+        self.data[service] = fresh
+        return {"added": added, "updated": updated, "deleted": deleted}
+
+    def _upsert(self, service: str, obj: dict, changes: Dict[str, int]):
+        oid = obj.get("id")
+        if not oid:
+            return
+        cur = self.data[service].get(oid)
+        if cur is None:
+            changes["added"] += 1
+        elif cur != obj:
+            changes["updated"] += 1
+        else:
+            return
+        self.data[service][oid] = obj
+
+    def _delete(self, service: str, oid: Optional[str], changes: Dict[str, int]):
+        if oid and self.data[service].pop(oid, None) is not None:
+            changes["deleted"] += 1
+
+    async def _full_paged(self, service, method, request, items_key) -> Optional[Dict[str, dict]]:
+        """All pages keyed by id, or None if pagination was cut off (can't reconcile deletes)."""
+        seen: Dict[str, dict] = {}
+        complete = False
+        async for items, last in iter_pages(service, method, request, items_key, self._sem, max_pages=self.max_pages, fresh=True):
+            for it in items:
+                if it.get("id") and not it.get("is_deleted"):
+                    seen[it["id"]] = it
+            complete = last
+        return seen if complete else None
+
+    async def _sync_locations(self, full: bool) -> Dict[str, int]:
+        async with self._sem:
+            raw = await make_api_request("locations", "list", {}, fresh=True)
+        locs = unwrap_mcp_json(raw, source="snapshot").get("locations", []) or []
+        return self._replace("locations", {l["id"]: l for l in locs if isinstance(l, dict) and l.get("id")})
+
+    async def _sync_catalog(self, full: bool) -> Dict[str, int]:
+        started = _now_iso()
+        since = None if full else self.watermarks.get("catalog")
+        changes = {"added": 0, "updated": 0, "deleted": 0}
+
+        if since is None:
+            seen = await self._full_paged("catalog", "list", {"types": "ITEM"}, "objects")
+            if seen is not None:
+                changes = self._replace("catalog", seen)
+            else:
+                return changes  # keep the old watermark; try again next round
+        else:
+            request = {"object_types": ["ITEM"], "begin_time": since, "include_deleted_objects": True}
+            async for items, _ in iter_pages("catalog", "search", request, "objects", self._sem, max_pages=self.max_pages, fresh=True):
+                for obj in items:
+                    if obj.get("is_deleted"):
+                        self._delete("catalog", obj.get("id"), changes)
+                    elif obj.get("type") == "ITEM":
+                        self._upsert("catalog", obj, changes)
+
+        self.watermarks["catalog"] = started
+        return changes
+
+    async def _sync_team(self, full: bool) -> Dict[str, int]:
+        seen = await self._full_paged("team", "searchMembers", {"limit": 200}, "team_members")
+        if seen is None:
+            return {"added": 0, "updated": 0, "deleted": 0}
+        return self._replace("team", seen)
+
+    async def _sync_orders(self, full: bool) -> Dict[str, int]:
+        if not self.data["locations"]:
+            await self.sync("locations")
+        location_ids = list(self.data["locations"])
+        changes = {"added": 0, "updated": 0, "deleted": 0}
+        if not location_ids:
+            return changes
+
+        started = _now_iso()
+        window_start = _iso(datetime.now(timezone.utc) - timedelta(days=self.orders_days))
+        since = None if full else self.watermarks.get("orders")
+        # a full resync fills a new dict and swaps it in only once every chunk
+        # came back complete; until then (or on failure) readers keep the old one
+        fresh: Optional[Dict[str, dict]] = {} if full else None
+
+        async def one_chunk(ids: List[str]) -> bool:
+            request = {
+                "location_ids": ids,
+                "limit": 500,
+                "query": {
+                    "filter": {"date_time_filter": {"updated_at": {"start_at": since or window_start}}},
+                    "sort": {"sort_field": "UPDATED_AT", "sort_order": "ASC"},
+                },
+            }
+            complete = False
+            async for items, last in iter_pages("orders", "search", request, "orders", self._sem, max_pages=self.max_pages, fresh=True):
+                for o in items:
+                    if fresh is None:
+                        self._upsert("orders", o, changes)
+                    elif o.get("id"):
+                        fresh[o["id"]] = o
+                complete = last
+            return complete
+
+        complete = await asyncio.gather(*(
+            one_chunk(location_ids[i : i + ORDERS_LOCATIONS_PER_REQUEST])
+            for i in range(0, len(location_ids), ORDERS_LOCATIONS_PER_REQUEST)
+        ))
+        if fresh is not None:
+            if not all(complete):
+                return changes  # pagination cut off: can't reconcile deletes; keep the old watermark
+            changes = self._replace("orders", {k: o for k, o in fresh.items() if (o.get("created_at") or "") >= window_start})
+
+        for oid in [k for k, o in self.data["orders"].items() if (o.get("created_at") or "") < window_start]:
+            self._delete("orders", oid, changes)
+
+        self.watermarks["orders"] = started
+        return changes
+
+    # ---- reads ----
+
+    def ready(self) -> bool:
+        return all(s in self.synced_at for s in SERVICES)
+
+    def freshness(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            s: {
+                "synced_at": _iso(datetime.fromtimestamp(self.synced_at[s], timezone.utc)) if s in self.synced_at else None,
+                "age_seconds": round(now - self.synced_at[s], 1) if s in self.synced_at else None,
+                "count": len(self.data[s]),
+                "version": self.versions[s],
+            }
+            for s in SERVICES
+        }
+
+    def summary(self, max_orders: int = 200) -> Dict[str, Any]:
+        """Same shape as graph_workflow.get_square_summary, built from local data."""
+        locations = list(self.data["locations"].values())
+        catalog_items = [r for r in (catalog_row(o) for o in self.data["catalog"].values()) if r is not None]
+        catalog_items.sort(key=lambda r: (r.get("name") or "").lower())
+        team_out = [team_row(tm) for tm in self.data["team"].values()]
+        orders = sorted(self.data["orders"].values(), key=lambda o: o.get("created_at") or "", reverse=True)
+        orders_out = [order_row(o) for o in orders[:max_orders]]
+
+        location_ids = [l.get("id") for l in locations]
+        sections = {s: {"complete": s in self.synced_at, "seconds": 0.0, "source": "snapshot"} for s in SERVICES}
+        sections["orders"]["complete"] = sections["orders"]["complete"] and len(orders) <= max_orders
+
+        return {
+            "locations": locations,
+            "catalog_items": catalog_items,
+            "team_members": team_out,
+            "orders": orders_out,
+            "meta": {
+                "location_ids": location_ids,
+                "primary_location_id": location_ids[0] if location_ids else None,
+                "sections": sections,
+                "freshness": self.freshness(),
+                "note": "Money amounts are normalized from cents to dollars.",
+            },
+        }
+
+    # ---- persistence (optional, SNAPSHOT_PATH) ----
+
+    def _save(self):
+        if not self.path:
+            return
+        p = pathlib.Path(self.path)
+        tmp = p.with_suffix(p.suffix + ".tmp")
+        try:
+            tmp.write_text(json.dumps({
+                "data": self.data,
+                "synced_at": self.synced_at,
+                "watermarks": self.watermarks,
+            }), encoding="utf-8")
+            tmp.replace(p)
+        except OSError as e:
+            logger.warning("snapshot save failed: %s", e)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            saved = load_file(self.path)
+        except (OSError, ValueError) as e:
+            logger.warning("snapshot load failed: %s", e)
+            return
+        for s in SERVICES:
+            self.data[s] = saved.get("data", {}).get(s, {}) or {}
+        # watermarks let the first sync after restart be incremental;
+        # synced_at is not restored so /api/summary waits for one live round
+        self.watermarks = saved.get("watermarks", {}) or {}
+
+
+_SNAPSHOT: Optional[SquareSnapshot] = None
+
+
+def get_snapshot() -> SquareSnapshot:
+    global _SNAPSHOT
+    if _SNAPSHOT is None:
+        _SNAPSHOT = SquareSnapshot()
+    return _SNAPSHOT
@@ -0,0 +1,222 @@
+import os
+import json
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+
+from . import metrics, tracing
+from .answer_cache import note_service
+from .mcp_pool import get_pool
+from .projection import get_projector, projection_enabled
+from .resilience import CircuitOpen, get_resilience
+from .schema_catalog import get_schema_catalog, schema_catalog_enabled
+from .square_cache import get_cache, is_read_method
+from .write_jobs import submit_write
+
+MAKE_API_TOOL = "make_api_request"
+SERVICE_INFO_TOOL = "get_service_info"
+TYPE_INFO_TOOL = "get_type_info"
+
+_BYPASS = contextvars.ContextVar("square_cache_bypass", default=False)
+
+
+def cache_enabled() -> bool:
+    return os.environ.get("SQUARE_CACHE", "true").lower() == "true"
+
+
+@contextmanager
+def bypass_cache():
+    """Skip the read cache for every make_api_request call in this context."""
+    token = _BYPASS.set(True)
+    try:
+        yield
+    finally:
+        _BYPASS.reset(token)
+
+
+def _stale_max_age() -> float:
+    try:
+        return float(os.environ.get("SQUARE_CACHE_STALE_MAX_AGE", "600"))
+    except ValueError:
+        return 600.0
+
+
+async def _raw_call(args: Dict[str, Any]) -> Any:
+    tool = await get_pool().get_tool(MAKE_API_TOOL)
+    if tool is None:
+        raise RuntimeError("make_api_request tool not found")
+    # deadline, transient retries, read hedging and the per-service breaker
+    return await get_resilience().call(args["service"], args["method"], args["request"], lambda: tool.ainvoke(args))
+
+
+async def _send(service: str, method: str, request: Dict[str, Any]) -> Any:
+    return await _raw_call({"service": service, "method": method, "request": request})
+
+
+async def make_api_request(service: str, method: str, request: Optional[Dict[str, Any]] = None, *, fresh: bool = False) -> Any:
+    """
+    make_api_request through the shared MCP pool.
+
+    Reads go through the TTL/LRU cache (unless fresh=True, bypass_cache() or
+    SQUARE_CACHE=false). Anything else is treated as a write and invalidates
+    the service's cached reads before and after it runs; inside an approved
+    write job it also gets an idempotency key and may be batched.
+    """
+    args = {"service": service, "method": method, "request": request or {}}
+    cache = get_cache()
+
+    with tracing.span("square_request", service=service, method=method) as sp:
+        if not is_read_method(method):
+            sp.set(cache="write")
+            cache.invalidate_service(service)
+            try:
+                return await submit_write(service, method, args["request"], _send)
+            finally:
+                cache.invalidate_service(service)
+
+        # answers built from this read are only reusable while it is current
+        note_service(service)
+        try:
+            if fresh or _BYPASS.get() or not cache_enabled():
+                sp.set(cache="bypass")
+                return await _raw_call(args)
+
+            return await cache.get_or_fetch(service, method, args["request"], lambda: _raw_call(args))
+        except CircuitOpen:
+            # Square is failing: an outdated answer beats none
+            found, value = cache.get_stale(service, method, args["request"], _stale_max_age())
+            if not found:
+                raise
+            metrics.incr("mcp_stale_served_total", service=service)
+            sp.set(cache="stale")
+            return value
+
+
+READ_ONLY_DESCRIPTION = (
+    "Read Square data. Args: service (e.g. catalog, orders, team, locations), a read method "
+    "(list*/get*/search*/retrieve*/batchRetrieve*/count*) and the request body. Writes are not available here."
+)
+
+ANALYTICS_TOOL = "query_analytics"
+CHART_TOOL = "build_chart"
+
+# tools each agent profile sees (name suffixes); None = every tool
+TOOL_PROFILES: Dict[str, Optional[Tuple[str, ...]]] = {
+    "write": None,
+    "read": (MAKE_API_TOOL, SERVICE_INFO_TOOL, TYPE_INFO_TOOL, ANALYTICS_TOOL, CHART_TOOL),
+    "chart": (MAKE_API_TOOL, ANALYTICS_TOOL, CHART_TOOL),
+}
+
+
+def _cached_make_api_tool(proxy: BaseTool, read_only: bool = False) -> BaseTool:
+    async def _call(service: str, method: str, request: Optional[Dict[str, Any]] = None, **_: Any):
+        if read_only and not is_read_method(method):
+            metrics.incr("schema_rejections_total", service=service)
+            return f"'{method}' is not a read method; writes need the user's approval in the UI."
+
+        # unknown service/method: answer instantly instead of a Square round trip + retry
+        invalid = get_schema_catalog().validate(service, method, request)
+        if invalid:
+            metrics.incr("schema_rejections_total", service=service)
+            return invalid
+
+        try:
+            return await _project(service, method, request)
+        except CircuitOpen as e:
+            # tell the model (no agent retry): Square stays down for a while
+            return str(e)
+
+    return StructuredTool(
+        name=proxy.name,
+        description=READ_ONLY_DESCRIPTION if read_only else proxy.description,
+        args_schema=proxy.args_schema,
+        coroutine=_call,
+    )
+
+
+async def _project(service: str, method: str, request: Optional[Dict[str, Any]]) -> Any:
+    """make_api_request with the result projected (fewer fields, money in dollars, long lists paged)."""
+    if not projection_enabled():
+        return await make_api_request(service, method, request)
+
+    projector = get_projector()
+    cursor = (request or {}).get("cursor")
+    if isinstance(cursor, str) and cursor.startswith("proj:"):
+        page = projector.next_page(service, method, cursor)
+        if page is None:
+            raise ToolException("That cursor has expired. Repeat the original request without a cursor.")
+        return json.dumps(page, ensure_ascii=False, separators=(",", ":"))
+    return projector.apply(service, method, await make_api_request(service, method, request))
+
+
+def _catalog_info_tool(proxy: BaseTool) -> BaseTool:
+    """get_service_info / get_type_info answered from the schema catalog when it has the entry."""
+    is_type = proxy.name.endswith(TYPE_INFO_TOOL)
+
+    async def _call(service: str, method: Optional[str] = None, **kwargs: Any):
+        catalog = get_schema_catalog()
+        hit = catalog.type_info(service, method or "") if is_type else catalog.service_info(service)
+        metrics.incr("schema_catalog_lookups_total", tool=proxy.name, result="hit" if hit else "miss")
+        if hit:
+            return hit
+        args = {"service": service, **kwargs}
+        if method is not None:
+            args["method"] = method
+        return await proxy.ainvoke(args)
+
+    return StructuredTool(
+        name=proxy.name,
+        description=proxy.description,
+        args_schema=proxy.args_schema,
+        coroutine=_call,
+    )
+
+
+def _agent_tool(tool: BaseTool, read_only: bool) -> BaseTool:
+    if tool.name.endswith(MAKE_API_TOOL):
+        return _cached_make_api_tool(tool, read_only=read_only)
+    if schema_catalog_enabled() and tool.name.endswith((SERVICE_INFO_TOOL, TYPE_INFO_TOOL)):
+        return _catalog_info_tool(tool)
+    return tool
+
+
+def _profile_tools(tools: List[BaseTool], profile: str) -> List[BaseTool]:
+    keep = TOOL_PROFILES.get(profile)
+    if keep is None:
+        return [_agent_tool(t, read_only=False) for t in tools]
+    if schema_catalog_enabled() and get_schema_catalog().ready():
+        # the prompt already lists every service and method
+        keep = tuple(k for k in keep if k != SERVICE_INFO_TOOL)
+    return [_agent_tool(t, read_only=True) for t in tools if t.name.endswith(keep)]
+
+
+_AGENT_TOOLS: Dict[Tuple[str, str, bool], List[BaseTool]] = {}
+
+
+async def get_agent_tools(profile: str = "write") -> Tuple[List[BaseTool], str]:
+    """
+    Pool tools with make_api_request routed through the read cache and the
+    schema lookups through the local catalog, plus the query_analytics and
+    build_chart tools, narrowed to `profile` (see TOOL_PROFILES): read/chart
+    turns get a read-only make_api_request and no schema-discovery tools they
+    don't need.
+    Built once per MCP tool fingerprint and profile so agents can be cached on it.
+    """
+    from .analytics_store import analytics_tool  # analytics -> snapshot -> square_api
+    from .charts import chart_tool
+
+    pool = get_pool()
+    tools = await pool.get_tools()
+    fp = pool.fingerprint
+    if schema_catalog_enabled():
+        get_schema_catalog().ensure_current(fp)
+    key = (fp, profile, get_schema_catalog().ready())
+    wrapped = _AGENT_TOOLS.get(key)
+    if wrapped is None:
+        if any(k[0] != fp for k in _AGENT_TOOLS):
+            _AGENT_TOOLS.clear()
+        wrapped = _profile_tools(tools + [analytics_tool(), chart_tool()], profile)
+        _AGENT_TOOLS[key] = wrapped
+    return wrapped, fp
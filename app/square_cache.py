@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from . import metrics, tracing
+
+# Methods that only read Square data (square-mcp-server uses camelCase names)
+READ_PREFIXES = ("list", "get", "search", "retrieve", "batchGet", "batchRetrieve", "count")
+
+DEFAULT_TTLS = {
+    "locations": 600.0,
+    "catalog": 120.0,
+    "team": 120.0,
+    "labor": 60.0,
+    "customers": 60.0,
+    "inventory": 30.0,
+    "orders": 15.0,
+    "payments": 15.0,
+}
+DEFAULT_TTL = 30.0
+
+_Key = Tuple[str, str, str]
+
+
+def is_read_method(method: str) -> bool:
+    return (method or "").startswith(READ_PREFIXES)
+
+
+def canonical_request(request: Any) -> str:
+    return json.dumps(request or {}, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def _parse_ttls(spec: str) -> Dict[str, float]:
+    # "catalog=300,orders=10"
+    out = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        k, v = part.split("=", 1)
+        try:
+            out[k.strip()] = float(v)
+        except ValueError:
+            continue
+    return out
+
+
+class SquareReadCache:
+    """
+    Read-through cache for make_api_request read calls.
+
+    - key: (service, method, canonical JSON of request)
+    - per-service TTLs, LRU bound on entry count
+    - concurrent misses for the same key share one in-flight fetch
+    - writes bump a per-service generation; entries and in-flight fetches
+      from older generations are discarded
+    - expired entries stay (until evicted) so get_stale() can serve them
+      while Square is unreachable
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttls: Optional[Dict[str, float]] = None):
+        self.max_entries = max_entries or int(os.environ.get("SQUARE_CACHE_MAX_ENTRIES", "512"))
+        self.ttls = {**DEFAULT_TTLS, **_parse_ttls(os.environ.get("SQUARE_CACHE_TTLS", "")), **(ttls or {})}
+        self._entries: "OrderedDict[_Key, Tuple[float, int, Any]]" = OrderedDict()
+        self._inflight: Dict[_Key, asyncio.Future] = {}
+        self._generation: Dict[str, int] = {}
+        self._listeners: List[Callable[[str], None]] = []
+
+    def ttl_for(self, service: str) -> float:
+        return self.ttls.get(service, DEFAULT_TTL)
+
+    def generation(self, service: str) -> int:
+        return self._generation.get(service, 0)
+
+    def _lookup(self, key: _Key) -> Tuple[bool, Any]:
+        hit = self._entries.get(key)
+        if hit is None:
+            return False, None
+        expires_at, gen, value = hit
+        if gen != self.generation(key[0]):
+            self._entries.pop(key, None)
+            return False, None
+        if expires_at < time.monotonic():
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _store(self, key: _Key, gen: int, value: Any):
+        if gen != self.generation(key[0]):
+            return  # a write landed while we were fetching
+        self._entries[key] = (time.monotonic() + self.ttl_for(key[0]), gen, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            metrics.incr("square_cache_evictions_total")
+
+    async def get_or_fetch(self, service: str, method: str, request: Any, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        key = (service, method, canonical_request(request))
+
+        found, value = self._lookup(key)
+        if found:
+            metrics.incr("square_cache_hits_total", service=service)
+            tracing.set_attributes(cache="hit")
+            return value
+
+        shared = self._inflight.get(key)
+        if shared is not None:
+            metrics.incr("square_cache_coalesced_total", service=service)
+            tracing.set_attributes(cache="coalesced")
+            return await asyncio.shield(shared)
+
+        metrics.incr("square_cache_misses_total", service=service)
+        tracing.set_attributes(cache="miss")
+        gen = self.generation(service)
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await fetch()
+        except BaseException as e:
+            if not fut.done():
+                if isinstance(e, Exception):
+                    fut.set_exception(e)
+                    fut.exception()  # mark retrieved when nobody else is waiting
+                else:
+                    fut.cancel()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        self._store(key, gen, value)
+        if not fut.done():
+            fut.set_result(value)
+        return value
+
+    def get_stale(self, service: str, method: str, request: Any, max_age: float) -> Tuple[bool, Any]:
+        """An entry up to `max_age` seconds past its TTL (never one from before a write)."""
+        hit = self._entries.get((service, method, canonical_request(request)))
+        if hit is None:
+            return False, None
+        expires_at, gen, value = hit
+        if gen != self.generation(service) or time.monotonic() - expires_at > max_age:
+            return False, None
+        return True, value
+
+    def invalidate_service(self, service: str):
+        self._generation[service] = self.generation(service) + 1
+        for key in [k for k in self._entries if k[0] == service]:
+            self._entries.pop(key, None)
+        metrics.incr("square_cache_invalidations_total", service=service)
+        for fn in list(self._listeners):
+            try:
+                fn(service)
+            except Exception:
+                pass
+
+    def add_invalidation_listener(self, fn: Callable[[str], None]):
+        """fn(service) is called whenever a write invalidates a service."""
+        if fn not in self._listeners:
+            self._listeners.append(fn)
+
+    def clear(self):
+        for service in {k[0] for k in self._entries}:
+            self._generation[service] = self.generation(service) + 1
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "inflight": len(self._inflight), "max_entries": self.max_entries}
+
+
+_CACHE: Optional[SquareReadCache] = None
+
+
+def get_cache() -> SquareReadCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = SquareReadCache()
+    return _CACHE
@@ -0,0 +1,296 @@
+"""
+Lightweight per-request tracing.
+
+A trace is opened per /api request (see the middleware in api.py); code
+inside it wraps stages in `span(...)`. Every finished span feeds
+`span_seconds{span=...}` in metrics, whether or not a trace is active.
+Finished traces can be exported as OTLP/JSON (TRACE_EXPORT_PATH appends one
+ExportTraceServiceRequest per line; TRACE_OTLP_ENDPOINT POSTs it to a
+collector's /v1/traces) and summarized in a Server-Timing header.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import secrets
+import contextvars
+import urllib.request
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "square-agent"
+
+_TRACE: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+_SPAN: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "trace", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace: Optional["Trace"], parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = {k: v for k, v in attributes.items() if v is not None}
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any):
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    @property
+    def seconds(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+
+class Trace:
+    def __init__(self, name: str, **attributes: Any):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self.root = Span(name, self, None, attributes)
+
+    def timing(self) -> Dict[str, Dict[str, float]]:
+        """Total seconds and count per span name (root excluded)."""
+        out: Dict[str, Dict[str, float]] = {}
+        for s in self.spans:
+            t = out.setdefault(s.name, {"seconds": 0.0, "count": 0})
+            t["seconds"] += s.seconds
+            t["count"] += 1
+        return out
+
+    def server_timing(self) -> str:
+        parts = [f"total;dur={self.root.seconds * 1000:.1f}"]
+        for name, t in sorted(self.timing().items(), key=lambda kv: -kv[1]["seconds"]):
+            parts.append(f'{name};dur={t["seconds"] * 1000:.1f};desc="x{t["count"]}"')
+        return ", ".join(parts)
+
+
+def current_trace() -> Optional[Trace]:
+    return _TRACE.get()
+
+
+def current_span() -> Optional[Span]:
+    return _SPAN.get()
+
+
+def set_attributes(**attributes: Any):
+    """Adds attributes to the innermost open span (no-op outside one)."""
+    s = _SPAN.get()
+    if s is not None:
+        s.set(**attributes)
+
+
+def start_span(name: str, parent: Optional[Span] = None, **attributes: Any) -> Span:
+    """
+    Opens a span without making it current (safe across async-generator
+    yields), under `parent` if given, else under the current span.
+    """
+    if parent is not None:
+        return Span(name, parent.trace, parent, attributes)
+    return Span(name, _TRACE.get(), _SPAN.get() or _root(), attributes)
+
+
+def end_span(s: Span, error: Optional[BaseException] = None):
+    if s.end_ns is not None:
+        return
+    s.end_ns = time.time_ns()
+    if error is not None:
+        s.error = type(error).__name__
+        s.attributes.setdefault("error.message", str(error)[:300])
+    metrics.observe("span_seconds", s.seconds, span=s.name)
+    if s.error:
+        metrics.incr("span_errors_total", span=s.name, error=s.error)
+    if s.trace is not None:
+        s.trace.spans.append(s)
+
+
+def _root() -> Optional[Span]:
+    t = _TRACE.get()
+    return t.root if t is not None else None
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    s = start_span(name, **attributes)
+    token = _SPAN.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        end_span(s, e)
+        raise
+    finally:
+        _SPAN.reset(token)
+        end_span(s)
+
+
+def start_trace(name: str, **attributes: Any) -> Trace:
+    trace = Trace(name, **attributes)
+    _TRACE.set(trace)
+    _SPAN.set(None)
+    return trace
+
+
+def finish_trace(trace: Trace):
+    if trace.root.end_ns is not None:
+        return
+    trace.root.end_ns = time.time_ns()
+    get_exporter().export(trace)
+
+
+# ---- OTLP/JSON export
+
+def _otlp_value(v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def _otlp_span(trace: Trace, s: Span) -> Dict[str, Any]:
+    out = {
+        "traceId": trace.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": 2 if s is trace.root else 1,  # SERVER / INTERNAL
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns or s.start_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+        "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+    }
+    if s.parent_id:
+        out["parentSpanId"] = s.parent_id
+    return out
+
+
+def to_otlp(trace: Trace) -> Dict[str, Any]:
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": "app.tracing"},
+                "spans": [_otlp_span(trace, trace.root)] + [_otlp_span(trace, s) for s in trace.spans],
+            }],
+        }]
+    }
+
+
+class Exporter:
+    def __init__(self, path: Optional[str] = None, endpoint: Optional[str] = None):
+        self.path = path
+        self.endpoint = endpoint
+        self.exported = 0
+        self.failed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path or self.endpoint)
+
+    def export(self, trace: Trace):
+        if not self.enabled:
+            return
+        payload = json.dumps(to_otlp(trace), separators=(",", ":"))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(payload)
+            return
+        # file append / HTTP POST stay off the event loop
+        loop.run_in_executor(None, self._write, payload)
+
+    def _write(self, payload: str):
+        try:
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(payload + "\n")
+            if self.endpoint:
+                req = urllib.request.Request(
+                    self.endpoint, data=payload.encode("utf-8"), headers={"Content-Type": "application/json"}
+                )
+                urllib.request.urlopen(req, timeout=5).close()
+            self.exported += 1
+        except Exception as e:
+            self.failed += 1
+            logger.warning("Trace export failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "endpoint": self.endpoint, "exported": self.exported, "failed": self.failed}
+
+
+_EXPORTER: Optional[Exporter] = None
+
+
+def get_exporter() -> Exporter:
+    global _EXPORTER
+    if _EXPORTER is None:
+        _EXPORTER = Exporter(
+            path=os.environ.get("TRACE_EXPORT_PATH") or None,
+            endpoint=os.environ.get("TRACE_OTLP_ENDPOINT") or None,
+        )
+    return _EXPORTER
+
+
+def debug_header_enabled() -> bool:
+    return os.environ.get("TRACE_DEBUG_HEADER", "false").lower() == "true"
+
+
+# ---- LLM calls (LangChain callbacks)
+
+def _usage(response: Any) -> Dict[str, int]:
+    try:
+        msg = response.generations[0][0].message
+        usage = getattr(msg, "usage_metadata", None) or {}
+        if usage:
+            return {"llm.input_tokens": usage.get("input_tokens"), "llm.output_tokens": usage.get("output_tokens")}
+    except (AttributeError, IndexError, TypeError):
+        pass
+    usage = ((getattr(response, "llm_output", None) or {}).get("token_usage")) or {}
+    return {"llm.input_tokens": usage.get("prompt_tokens"), "llm.output_tokens": usage.get("completion_tokens")}
+
+
+class LLMSpanHandler(AsyncCallbackHandler):
+    """One `llm` span per chat-model call, with model name and token usage."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._open: Dict[UUID, Span] = {}
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or (serialized or {}).get("name")
+        self._open[run_id] = start_span("llm", stage=self.stage, model=model)
+
+    async def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any):
+        s = self._open.pop(run_id, None)
+        if s is None:
+            return
+        usage = _usage(response)
+        s.set(**usage)
+        end_span(s)
+        for kind in ("input", "output"):
+            n = usage.get(f"llm.{kind}_tokens")
+            if n:
+                metrics.incr("llm_tokens_total", n, stage=self.stage, model=s.attributes.get("model"), kind=kind)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        s = self._open.pop(run_id, None)
+        if s is not None:
+            end_span(s, error)
+
+
+def llm_config(stage: str) -> Dict[str, Any]:
+    """RunnableConfig that records LLM spans for `stage` (router, agent, summary)."""
+    return {"callbacks": [LLMSpanHandler(stage)]}
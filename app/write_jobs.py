@@ -0,0 +1,606 @@
+"""
+Durable queue for approved writes.
+
+Approving a pending action enqueues a job and returns at once; background
+workers (WRITE_JOB_WORKERS, default 2) run the write-enabled agent turn and
+publish its progress, which clients follow at /api/jobs/{job_id}/events or
+poll at /api/jobs/{job_id}. Jobs live in SQLite (WRITE_JOB_DB_PATH, default
+write_jobs.db, WAL) so they survive restarts and are shared by uvicorn
+workers: a worker holds a job under a lease (WRITE_JOB_LEASE seconds, renewed
+while it runs), and a job whose lease lapses (crash, restart) is picked up
+again.
+
+- The job id is derived from the pending action_id, so approving the same
+  action twice yields one job.
+- The job runs the approved user_request against the conversation as it was
+  when Approve was clicked (stored in the job row), never the session's
+  later state.
+- Square mutations made inside a job carry idempotency keys derived from the
+  job id and a canonical hash of the call (service, method, request), so a
+  job re-run after a crash or a transient failure, or a call the model
+  re-issues after a timeout, doesn't apply the same write twice. Identical
+  calls that went through are numbered, so a job that really sends the same
+  request twice gets two keys, the same two on every re-run. Methods are
+  keyed when the schema catalog says they take a key, or, without the
+  catalog, when their name marks them as mutating (create/update/upsert/...).
+- Only transient failures (Square/MCP transport, 429/5xx, model provider
+  connection/rate-limit errors) re-run a job, up to WRITE_JOB_MAX_ATTEMPTS,
+  after a backoff that every process respects; anything else fails it at
+  once, and so does a turn that ends with the agent giving up.
+- Concurrent catalog upsertObject calls from one job (parallel tool calls)
+  are sent as a single catalog.batchUpsert (WRITE_BATCH_WINDOW_MS, default 20).
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import uuid
+import socket
+import asyncio
+import logging
+import sqlite3
+import threading
+import contextvars
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from . import metrics, tracing
+from .memory_store import append_message
+from .mcp_json import parse_mcp_text
+from .resilience import is_transient
+from .schema_catalog import get_schema_catalog
+
+logger = logging.getLogger(__name__)
+
+DONE_STATES = ("succeeded", "failed")
+
+FAILED_REPLY = "❌ The change could not be applied: {error}"
+
+# uuid5 namespace for idempotency keys (any fixed UUID works)
+_KEY_NAMESPACE = uuid.UUID("6f1c2b9e-4a57-4e0b-9a51-1c2f5d3e8b70")
+
+# Square methods that take an idempotency key, for when the schema catalog
+# hasn't been harvested (batchRetrieve/batchDelete don't take one)
+_MUTATING_METHOD = re.compile(r"^(create|update|upsert|pay|refund|clone|publish|batch(create|update|upsert|change))", re.I)
+
+# model provider errors (openai/httpx) worth another attempt, matched by class name
+# so no provider package is imported here
+_TRANSIENT_ERRORS = {
+    "APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError",
+    "ConnectError", "ConnectTimeout", "ReadTimeout", "RemoteProtocolError",
+}
+
+Sender = Callable[[str, str, Dict[str, Any]], Awaitable[Any]]
+Runner = Callable[[Dict[str, Any]], AsyncIterator[Dict[str, Any]]]
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def write_jobs_enabled() -> bool:
+    return os.environ.get("WRITE_JOBS", "true").lower() == "true"
+
+
+def job_id_for(action_id: str) -> str:
+    return f"wj_{action_id}"
+
+
+# ---- idempotency keys and batched mutations (per running job)
+
+def request_digest(service: str, method: str, request: Dict[str, Any]) -> str:
+    """Canonical hash of a call, ignoring any idempotency key already in it."""
+    body = {k: v for k, v in request.items() if k != "idempotency_key"}
+    blob = json.dumps([service, method, body], sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def idempotency_key(job_id: str, digest: str, ordinal: int = 0) -> str:
+    """Key of the `ordinal`-th identical call (by digest) in a job: the same on every attempt."""
+    return str(uuid.uuid5(_KEY_NAMESPACE, f"{job_id}:{digest}:{ordinal}"))
+
+
+def is_retryable(e: BaseException) -> bool:
+    """Whether a failed job is worth re-running (infrastructure, not the request)."""
+    if is_transient(e) or isinstance(e, sqlite3.OperationalError):
+        return True
+    return any(c.__name__ in _TRANSIENT_ERRORS for c in type(e).__mro__)
+
+
+def _takes_idempotency_key(service: str, method: str, request: Dict[str, Any]) -> bool:
+    if "idempotency_key" in request:
+        return True
+    # the harvested request type says whether the method accepts one
+    info = get_schema_catalog().type_info(service, method)
+    if info:
+        return "idempotency_key" in info
+    return bool(_MUTATING_METHOD.match(method))
+
+
+def _catalog_batch_request(requests: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    objects = [r.get("object") for r in requests]
+    ids = [o.get("id") for o in objects if isinstance(o, dict)]
+    if len(ids) != len(objects) or len(set(ids)) != len(ids):
+        # temporary ids must be unique within one batch
+        return None
+    return {"batches": [{"objects": objects}]}
+
+
+def _catalog_batch_split(raw: Any, requests: List[Dict[str, Any]]) -> List[Any]:
+    data, _ = parse_mcp_text(raw, source="write_jobs")
+    if not isinstance(data, dict) or not isinstance(data.get("objects"), list):
+        # errors (or an unexpected shape) go to every caller as-is
+        return [raw] * len(requests)
+    mappings = [m for m in data.get("id_mappings") or [] if isinstance(m, dict)]
+    resolved = {m.get("client_object_id"): m.get("object_id") for m in mappings}
+    by_id = {o.get("id"): o for o in data["objects"] if isinstance(o, dict)}
+    out = []
+    for i, r in enumerate(requests):
+        client_id = r["object"].get("id")
+        obj = by_id.get(resolved.get(client_id, client_id))
+        if obj is None and i < len(data["objects"]):
+            obj = data["objects"][i]
+        out.append(json.dumps({
+            "catalog_object": obj,
+            "id_mappings": [m for m in mappings if m.get("client_object_id") == client_id],
+        }, ensure_ascii=False))
+    return out
+
+
+# (service, method) -> (batch method, build request or None, split response per caller)
+BATCHABLE: Dict[Tuple[str, str], Tuple[str, Callable, Callable]] = {
+    ("catalog", "upsertObject"): ("batchUpsert", _catalog_batch_request, _catalog_batch_split),
+}
+
+
+class _JobContext:
+    """Idempotency keys and mutation batching for the job running in this context."""
+
+    def __init__(self, job_id: str, window: float):
+        self.job_id = job_id
+        self.window = window
+        self._open: Dict[Tuple[str, str], List[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+        self._flushes: Set[asyncio.Task] = set()
+        # identical calls (by digest) that went through so far. A call that
+        # raised doesn't count, so re-issuing it reuses its key.
+        self._sent: Dict[str, int] = {}
+
+    def key_for(self, service: str, method: str, request: Dict[str, Any]) -> Tuple[str, str]:
+        """(idempotency key, digest); report the digest to sent() once the call went through."""
+        digest = request_digest(service, method, request)
+        return idempotency_key(self.job_id, digest, self._sent.get(digest, 0)), digest
+
+    def sent(self, digest: str):
+        self._sent[digest] = self._sent.get(digest, 0) + 1
+
+    def keyed(self, service: str, method: str, request: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+        if not _takes_idempotency_key(service, method, request):
+            return request, None
+        key, digest = self.key_for(service, method, request)
+        return {**request, "idempotency_key": key}, digest
+
+    async def add(self, service: str, method: str, request: Dict[str, Any], send: Sender) -> Any:
+        key = (service, method)
+        fut = asyncio.get_running_loop().create_future()
+        group = self._open.get(key)
+        if group is None:
+            group = self._open[key] = []
+            task = asyncio.create_task(self._flush_later(key, send))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+        group.append((request, fut))
+        return await fut
+
+    async def _flush_later(self, key: Tuple[str, str], send: Sender):
+        await asyncio.sleep(self.window)
+        group = self._open.pop(key)
+        service, method = key
+        batch_method, build, split = BATCHABLE[key]
+        requests = [r for r, _ in group]
+        batch = build(requests) if len(group) > 1 else None
+
+        if batch is None:
+            results = await asyncio.gather(*(send(service, method, r) for r in requests), return_exceptions=True)
+        else:
+            batch["idempotency_key"], digest = self.key_for(service, batch_method, batch)
+            metrics.incr("write_batches_total", service=service, method=batch_method)
+            metrics.observe("write_batch_size", len(group), service=service)
+            try:
+                results = split(await send(service, batch_method, batch), requests)
+                self.sent(digest)
+            except Exception as e:
+                results = [e] * len(group)
+
+        for (_, fut), res in zip(group, results):
+            if fut.done():
+                continue
+            if isinstance(res, BaseException):
+                fut.set_exception(res)
+            else:
+                fut.set_result(res)
+
+
+_JOB: contextvars.ContextVar[Optional[_JobContext]] = contextvars.ContextVar("write_job", default=None)
+
+
+async def submit_write(service: str, method: str, request: Dict[str, Any], send: Sender) -> Any:
+    """
+    Sends a Square mutation. Inside a write job it gets a deterministic
+    idempotency key and may be coalesced into a batch call; elsewhere it is
+    sent unchanged.
+    """
+    job = _JOB.get()
+    if job is None:
+        return await send(service, method, request)
+    request, digest = job.keyed(service, method, request)
+    if (service, method) in BATCHABLE and job.window > 0:
+        result = await job.add(service, method, request, send)
+    else:
+        result = await send(service, method, request)
+    if digest is not None:
+        job.sent(digest)
+    return result
+
+
+# ---- persistence
+
+class JobStore:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id TEXT PRIMARY KEY,
+        session_id TEXT NOT NULL,
+        action_id TEXT NOT NULL,
+        user_request TEXT NOT NULL,
+        context TEXT,
+        status TEXT NOT NULL,
+        reply TEXT,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        owner TEXT,
+        lease_until REAL NOT NULL DEFAULT 0,
+        not_before REAL NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+    CREATE INDEX IF NOT EXISTS jobs_session ON jobs (session_id, created_at);
+    """
+
+    COLUMNS = ("job_id", "session_id", "action_id", "user_request", "context", "status", "reply", "error",
+               "attempts", "owner", "lease_until", "not_before", "created_at", "updated_at")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        db = self._conn()
+        db.executescript(self.SCHEMA)
+        have = {r[1] for r in db.execute("PRAGMA table_info(jobs)")}
+        # job files from before these columns
+        for column, ddl in (("context", "TEXT"), ("not_before", "REAL NOT NULL DEFAULT 0")):
+            if column not in have:
+                db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {ddl}")
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread; WAL lets several workers share the file
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _row(self, row) -> Optional[Dict[str, Any]]:
+        if not row:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job["context"] = json.loads(job["context"]) if job["context"] else []
+        return job
+
+    def create(
+        self,
+        job_id: str,
+        session_id: str,
+        action_id: str,
+        user_request: str,
+        context: Optional[List[Dict[str, Any]]] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """(job, created); an existing job with this id is returned unchanged."""
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT OR IGNORE INTO jobs (job_id, session_id, action_id, user_request, context, status, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+            (job_id, session_id, action_id, user_request, json.dumps(context or [], ensure_ascii=False), now, now),
+        )
+        return self.get(job_id), cur.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._row(self._conn().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone())
+
+    def claim(self, job_id: str, owner: str, lease: float) -> Optional[Dict[str, Any]]:
+        """
+        Takes a queued job whose backoff is over (or a lease-expired one) for
+        `owner`; None if someone else has it or it must wait.
+        """
+        now = time.time()
+        row = self._conn().execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, owner = ?, lease_until = ?, updated_at = ?"
+            " WHERE job_id = ? AND ((status = 'queued' AND not_before <= ?) OR (status = 'running' AND lease_until < ?))"
+            f" RETURNING {', '.join(self.COLUMNS)}",
+            (owner, now + lease, now, job_id, now, now),
+        ).fetchone()
+        return self._row(row)
+
+    def renew(self, job_id: str, owner: str, lease: float):
+        self._conn().execute(
+            "UPDATE jobs SET lease_until = ? WHERE job_id = ? AND owner = ? AND status = 'running'",
+            (time.time() + lease, job_id, owner),
+        )
+
+    def finish(self, job_id: str, owner: str, status: str, reply: Optional[str] = None, error: Optional[str] = None) -> bool:
+        cur = self._conn().execute(
+            "UPDATE jobs SET status = ?, reply = ?, error = ?, lease_until = 0, updated_at = ?"
+            " WHERE job_id = ? AND owner = ? AND status = 'running'",
+            (status, reply, error, time.time(), job_id, owner),
+        )
+        return cur.rowcount == 1
+
+    def release(self, job_id: str, owner: str, error: Optional[str] = None, delay: float = 0.0):
+        """Back to queued (transient failure), claimable again after `delay` seconds; keeps the attempt count."""
+        now = time.time()
+        self._conn().execute(
+            "UPDATE jobs SET status = 'queued', error = ?, lease_until = 0, not_before = ?, updated_at = ?"
+            " WHERE job_id = ? AND owner = ? AND status = 'running'",
+            (error, now + delay, now, job_id, owner),
+        )
+
+    def claimable(self, limit: int = 100) -> List[str]:
+        now = time.time()
+        rows = self._conn().execute(
+            "SELECT job_id FROM jobs WHERE (status = 'queued' AND not_before <= ?) OR (status = 'running' AND lease_until < ?)"
+            " ORDER BY created_at LIMIT ?",
+            (now, now, limit),
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def sweep(self, older_than: float):
+        self._conn().execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?",
+            (time.time() - older_than,),
+        )
+
+    def counts(self) -> Dict[str, int]:
+        return {s: n for s, n in self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")}
+
+
+# ---- workers
+
+class WriteJobQueue:
+    def __init__(
+        self,
+        store: JobStore,
+        workers: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        lease: Optional[float] = None,
+        batch_window: Optional[float] = None,
+        retention: Optional[float] = None,
+    ):
+        self.store = store
+        self.workers = max(1, workers or _env_int("WRITE_JOB_WORKERS", 2))
+        self.max_attempts = max(1, max_attempts or _env_int("WRITE_JOB_MAX_ATTEMPTS", 3))
+        self.lease = max(5.0, lease or float(_env_int("WRITE_JOB_LEASE", 60)))
+        self.batch_window = batch_window if batch_window is not None else _env_int("WRITE_BATCH_WINDOW_MS", 20) / 1000.0
+        self.retention = retention or float(_env_int("WRITE_JOB_RETENTION", 7 * 86400))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._runner: Optional[Runner] = None
+        self.running = 0
+        # live progress events per job, for /events subscribers (recent jobs only)
+        self._events: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._waiters: Dict[str, asyncio.Event] = {}
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self, runner: Runner):
+        """
+        `runner(job)` yields the agent turn's events, ending with {"type": "final", "reply"}
+        (plus "error" if the turn didn't do the job, which fails it).
+        It gets the stored job: run job["user_request"] after job["context"].
+        """
+        if self._tasks:
+            return
+        self._runner = runner
+        self._tasks = [asyncio.create_task(self._worker(i), name=f"write-job-{i}") for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._scan(), name="write-job-scan"))
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for t in tasks:
+            t.cancel()
+        # interrupted jobs keep status=running; their lease lapses and they resume
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def submit(self, session_id: str, pending: Dict[str, Any]) -> Dict[str, Any]:
+        """Enqueues the approved action; pending["context"] is the conversation it was approved in."""
+        job, created = self.store.create(
+            job_id_for(pending["action_id"]),
+            session_id,
+            pending["action_id"],
+            pending["user_request"],
+            pending.get("context"),
+        )
+        metrics.incr("write_jobs_submitted_total", result="created" if created else "duplicate")
+        if created:
+            self._queue.put_nowait(job["job_id"])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    # ---- progress
+
+    def _publish(self, job_id: str, event: Optional[Dict[str, Any]] = None):
+        if event is not None:
+            self._events.setdefault(job_id, []).append(event)
+            self._events.move_to_end(job_id)
+            while len(self._events) > 256:
+                self._events.popitem(last=False)
+        waiter = self._waiters.pop(job_id, None)
+        if waiter is not None:
+            waiter.set()
+
+    async def follow(self, job_id: str, keepalive: float = 15.0) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Progress events of a job (replayed from the start while it's recent),
+        then {"type": "final", "reply", "job_id", "status"} once it's done.
+        """
+        seen = 0
+        while True:
+            events = self._events.get(job_id, [])
+            while seen < len(events):
+                yield events[seen]
+                seen += 1
+            job = self.store.get(job_id)
+            if job is None:
+                return
+            if job["status"] in DONE_STATES:
+                yield {"type": "final", "reply": job_reply(job), "job_id": job_id, "status": job["status"]}
+                return
+            waiter = self._waiters.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(waiter.wait(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                # another process may be running it: re-read the row
+                yield {"type": "status", "text": "Applying changes…" if job["status"] == "running" else "Waiting to apply changes…"}
+
+    # ---- execution
+
+    async def _scan(self):
+        """Picks up jobs queued by other processes (once their backoff is over) and jobs whose lease lapsed."""
+        while True:
+            try:
+                for job_id in self.store.claimable():
+                    self._queue.put_nowait(job_id)
+                self.store.sweep(self.retention)
+            except sqlite3.Error as e:
+                logger.warning("Write job scan failed: %s", e)
+            metrics.set_gauge("write_jobs_queued", self._queue.qsize())
+            await asyncio.sleep(self.lease / 2)
+
+    async def _worker(self, index: int):
+        while True:
+            job_id = await self._queue.get()
+            metrics.set_gauge("write_jobs_queued", self._queue.qsize())
+            job = self.store.claim(job_id, self.owner, self.lease)
+            if job is None:
+                # done, or another worker/process holds it
+                continue
+            self.running += 1
+            metrics.set_gauge("write_jobs_running", self.running)
+            try:
+                # own task: the job's trace and contextvars stay out of the worker loop
+                await asyncio.create_task(self._run(job))
+            finally:
+                self.running -= 1
+                metrics.set_gauge("write_jobs_running", self.running)
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            self.store.renew(job_id, self.owner, self.lease)
+
+    async def _run(self, job: Dict[str, Any]):
+        job_id = job["job_id"]
+        metrics.observe("write_job_wait_seconds", time.time() - job["created_at"])
+        if job["attempts"] > 1:
+            metrics.incr("write_jobs_resumed_total")
+        self._publish(job_id, {"type": "status", "text": "Applying changes…"})
+
+        trace = tracing.start_trace("write_job", job_id=job_id, attempt=job["attempts"])
+        token = _JOB.set(_JobContext(job_id, self.batch_window))
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        t0 = time.perf_counter()
+        status = "failed"
+        try:
+            reply, error = None, None
+            async for ev in self._runner(job):
+                if ev.get("type") == "final":
+                    reply, error = ev.get("reply") or "", ev.get("error")
+                else:
+                    self._publish(job_id, ev)
+            if error:
+                logger.warning("Write job %s failed: %s", job_id, error)
+                if self.store.finish(job_id, self.owner, status, error=error):
+                    append_message(job["session_id"], "assistant", FAILED_REPLY.format(error=error))
+            else:
+                status = "succeeded"
+                if self.store.finish(job_id, self.owner, status, reply=reply):
+                    append_message(job["session_id"], "assistant", reply)
+        except asyncio.CancelledError:
+            status = "interrupted"
+            raise
+        except Exception as e:
+            tracing.end_span(trace.root, e)
+            error = f"{type(e).__name__}: {e}"[:500]
+            if job["attempts"] < self.max_attempts and is_retryable(e):
+                status = "retry"
+                delay = min(30.0, 2.0 ** job["attempts"])
+                logger.warning("Write job %s attempt %d failed, retrying: %s", job_id, job["attempts"], error)
+                # not claimable (here or by another process's scan) until the backoff is over
+                self.store.release(job_id, self.owner, error, delay)
+                # same idempotency keys on the next attempt, so completed writes aren't repeated
+                self._publish(job_id, {"type": "retry", "reason": "error"})
+                asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job_id)
+            else:
+                logger.warning("Write job %s failed: %s", job_id, error)
+                if self.store.finish(job_id, self.owner, status, error=error):
+                    append_message(job["session_id"], "assistant", FAILED_REPLY.format(error=error))
+        finally:
+            heartbeat.cancel()
+            _JOB.reset(token)
+            trace.root.set(status=status)
+            tracing.finish_trace(trace)
+            metrics.incr("write_jobs_total", status=status)
+            metrics.observe("write_job_seconds", time.perf_counter() - t0, status=status)
+            self._publish(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            counts = self.store.counts()
+        except sqlite3.Error:
+            counts = {}
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued_local": self._queue.qsize(),
+            "jobs": counts,
+            "path": self.store.path,
+        }
+
+
+def job_reply(job: Dict[str, Any]) -> str:
+    if job["status"] == "succeeded":
+        return job["reply"] or ""
+    if job["status"] == "failed":
+        return FAILED_REPLY.format(error=job["error"] or "unknown error")
+    return "⏳ Applying changes…"
+
+
+_QUEUE: Optional[WriteJobQueue] = None
+
+
+def get_write_jobs() -> WriteJobQueue:
+    global _QUEUE
+    if _QUEUE is None:
+        _QUEUE = WriteJobQueue(JobStore(os.environ.get("WRITE_JOB_DB_PATH", "write_jobs.db")))
+    return _QUEUE
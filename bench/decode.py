@@ -0,0 +1,117 @@
+"""
+Micro-benchmark for MCP result decoding (app.mcp_json).
+
+    python -m bench.decode                     # 2000 catalog items, 2000 orders
+    python -m bench.decode --items 10000 --orders 5000 --repeat 50
+
+Payloads are the fake MCP server's fixtures (bench.fake_square_mcp) as one
+catalog.list and one orders.search page, wrapped the way MCP adapters hand
+them over ([{"type": "text", "text": ...}]). Each row is the median of
+--repeat runs:
+
+- stdlib json.loads   the old per-call decode
+- backend loads       mcp_json.loads on the str (orjson when installed)
+- backend loads bytes the same from UTF-8 bytes (memoryview), e.g. files
+- parse_mcp_text      the shared decoder on a fresh result (memo miss)
+- parse_mcp_text hit  the same result again (a cached read decoded twice)
+- projection          Projector.apply on a fresh result: decode + project + dump
+"""
+
+import json
+import time
+import argparse
+import statistics
+from typing import Any, Callable, Dict, List
+
+
+def _median_ms(fn: Callable[[], Any], repeat: int) -> float:
+    fn()  # warm-up
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000.0
+
+
+def payloads(items: int, orders: int) -> Dict[str, str]:
+    from bench.fake_square_mcp import FakeSquare, Fixtures
+
+    square = FakeSquare(Fixtures(locations=3, items=items, team=20, orders=orders))
+    return {
+        "catalog.list": json.dumps(square.handle("catalog", "list", {"limit": items})),
+        "orders.search": json.dumps(square.handle("orders", "search", {"location_ids": ["LOC000", "LOC001", "LOC002"], "limit": orders})),
+    }
+
+
+def measure(items: int, orders: int, repeat: int) -> List[Dict[str, Any]]:
+    from app import mcp_json
+    from app.projection import Projector
+
+    projector = Projector()
+    rows = []
+    for name, text in payloads(items, orders).items():
+        service, method = name.split(".")
+        raw = text.encode("utf-8")
+        view = memoryview(raw)
+
+        def fresh_blocks():
+            # a new str each run, as a new Square response would be
+            return [{"type": "text", "text": "".join([text[:1], text[1:]])}]
+
+        def miss():
+            # equal text hits the memo too, so it has to go
+            mcp_json._MEMO.clear()
+            mcp_json.parse_mcp_text(fresh_blocks(), source="bench")
+
+        def project():
+            mcp_json._MEMO.clear()
+            projector.apply(service, method, fresh_blocks())
+
+        blocks = fresh_blocks()
+        mcp_json.parse_mcp_text(blocks, source="bench")
+
+        cases = [
+            ("stdlib json.loads", lambda: json.loads(text)),
+            ("backend loads", lambda: mcp_json.loads(text)),
+            ("backend loads bytes", lambda: mcp_json.loads(view)),
+            ("parse_mcp_text", miss),
+            ("parse_mcp_text hit", lambda: mcp_json.parse_mcp_text(blocks, source="bench")),
+            ("projection", project),
+        ]
+        base = None
+        for case, fn in cases:
+            ms = _median_ms(fn, repeat)
+            base = base or ms
+            rows.append({
+                "payload": name,
+                "bytes": len(raw),
+                "case": case,
+                "ms": round(ms, 3),
+                "vs_stdlib": f"{base / ms:.1f}x" if ms else "n/a",
+            })
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--items", type=int, default=2000, help="catalog items in the catalog.list payload")
+    ap.add_argument("--orders", type=int, default=2000, help="orders in the orders.search payload")
+    ap.add_argument("--repeat", type=int, default=20, help="runs per case (median is reported)")
+    ap.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = ap.parse_args()
+
+    from app.mcp_json import BACKEND
+
+    rows = measure(args.items, args.orders, max(1, args.repeat))
+    if args.json:
+        print(json.dumps({"backend": BACKEND, "rows": rows}, indent=2))
+        return
+    print(f"backend: {BACKEND}")
+    print(f"{'payload':14} {'bytes':>10} {'case':22} {'ms':>9} {'speedup':>8}")
+    for r in rows:
+        print(f"{r['payload']:14} {r['bytes']:10d} {r['case']:22} {r['ms']:9.3f} {r['vs_stdlib']:>8}")
+
+
+if __name__ == "__main__":
+    main()
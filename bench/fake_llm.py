@@ -0,0 +1,137 @@
+"""
+Deterministic chat model for offline runs (CHAT_MODEL=fake:default).
+"fake:direct" answers without calling tools (measures app overhead only);
+"fake:sloppy" leaves the chart out of its answer so guard repair kicks in.
+
+It recognizes the three prompts the app sends:
+- intent router  -> JSON route from a keyword table
+- context summary -> a short bullet summary
+- guard repair    -> the missing <CHART_CONFIG> block
+- agent turn     -> scripted make_api_request calls, then a final answer
+                    (charts go through build_chart when it is bound, else
+                    a hand-written <CHART_CONFIG> block)
+
+BENCH_LLM_LATENCY_MS (default 300) adds a fixed per-call delay.
+"""
+
+import os
+import json
+import time
+import zlib
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+WRITE_WORDS = ("add ", "create", "update", "delete", "remove", "rename", "change", "set ", "raise", "hire")
+CLEAR_WORDS = ("clear", "reset")
+CHART_WORDS = ("chart", "graph", "plot", "visualize", "pie", "bar")
+CHART = {"type": "bar", "data": {"labels": ["A", "B", "C"], "datasets": [{"label": "Revenue", "data": [3, 5, 2]}]}}
+CHART_SPEC = {"type": "bar", "query": {"dataset": "order_line_items", "metric": "revenue", "group_by": ["item_name"]}}
+
+
+def _text(m: BaseMessage) -> str:
+    return m.content if isinstance(m.content, str) else json.dumps(m.content)
+
+
+def _plan(user_text: str, writes: bool) -> List[Dict[str, Any]]:
+    """make_api_request calls for a turn, in order."""
+    t = user_text.lower()
+    if writes:
+        return [{"service": "catalog", "method": "upsertObject", "request": {
+            "idempotency_key": f"bench-{zlib.crc32(t.encode())}",
+            "object": {"type": "ITEM", "id": "#new", "item_data": {"name": "Bench Item", "variations": [
+                {"type": "ITEM_VARIATION", "id": "#var", "item_variation_data": {
+                    "name": "Regular", "pricing_type": "FIXED_PRICING",
+                    "price_money": {"amount": 450, "currency": "USD"}}}]}},
+        }}]
+    if any(w in t for w in ("wage", "team", "cook", "staff", "who")):
+        return [{"service": "team", "method": "searchMembers", "request": {"limit": 50}}]
+    if any(w in t for w in ("order", "revenue", "sales")):
+        return [
+            {"service": "locations", "method": "list", "request": {}},
+            {"service": "orders", "method": "search", "request": {"location_ids": ["LOC000"], "limit": 50}},
+        ]
+    if "location" in t:
+        return [{"service": "locations", "method": "list", "request": {}}]
+    return [{"service": "catalog", "method": "list", "request": {"types": "ITEM"}}]
+
+
+class ScriptedChatModel(BaseChatModel):
+    script: str = "default"
+    latency_ms: float = 300.0
+    tool_names: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        names = [getattr(t, "name", None) or (t.get("name") if isinstance(t, dict) else None) for t in tools]
+        return self.model_copy(update={"tool_names": [n for n in names if n]})
+
+    def _tool_name(self) -> str:
+        return next((n for n in self.tool_names if n.endswith("make_api_request")), "make_api_request")
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        system = "\n".join(_text(m) for m in messages if isinstance(m, SystemMessage))
+        if "intent router" in system:
+            return AIMessage(content=json.dumps(self._route(messages)))
+        if "running summary" in system:
+            return AIMessage(content="- user asked about menu, team and orders\n- assistant answered from Square data")
+        if "fixing the final answer" in system:
+            return AIMessage(content=f"<CHART_CONFIG>\n{json.dumps(CHART)}\n</CHART_CONFIG>")
+
+        last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+        user_text = _text(messages[last_human]) if last_human >= 0 else ""
+        done = [m for m in messages[last_human + 1 :] if isinstance(m, ToolMessage)]
+        wants_chart = any(w in user_text.lower() for w in CHART_WORDS)
+        chart_tool = next((n for n in self.tool_names if n.endswith("build_chart")), None)
+        plan = [] if self.script == "direct" else _plan(user_text, writes="WRITES ENABLED" in system)
+        calls = [(self._tool_name(), args) for args in plan]
+        if wants_chart and chart_tool and self.script == "default":
+            calls.append((chart_tool, CHART_SPEC))
+        if len(done) < len(calls):
+            step = len(done)
+            return AIMessage(content="", tool_calls=[{
+                "name": calls[step][0], "args": calls[step][1], "id": f"call_{last_human}_{step}",
+            }])
+
+        size = sum(len(_text(m)) for m in done)
+        reply = f"Here is what I found ({len(done)} tool calls, {size} bytes of results)."
+        built = [m for m in done if m.name and m.name.endswith("build_chart") and m.status != "error"]
+        if built:
+            reply += f'\n<CHART id="{json.loads(_text(built[-1]))["chart_id"]}"/>'
+        elif self.script != "sloppy" and wants_chart:
+            reply += f"\n<CHART_CONFIG>\n{json.dumps(CHART)}\n</CHART_CONFIG>"
+        return AIMessage(content=reply)
+
+    @staticmethod
+    def _route(messages: List[BaseMessage]) -> Dict[str, Any]:
+        prompt = _text(messages[-1])
+        user = prompt.split("User message:", 1)[-1].split("Recent context:", 1)[0].strip().lower()
+        if any(w in user for w in CLEAR_WORDS):
+            intent = "clear"
+        elif any(w in user for w in WRITE_WORDS):
+            intent = "write"
+        else:
+            intent = "read"
+        return {"intent": intent, "needs_confirm": intent == "write", "reason": "scripted", "normalized_request": user}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency_ms / 1000.0)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000.0)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+
+def build_fake_model(name: str) -> ScriptedChatModel:
+    """name is the part after "fake:" in CHAT_MODEL / ROUTER_MODEL."""
+    return ScriptedChatModel(
+        script=name or "default",
+        latency_ms=float(os.environ.get("BENCH_LLM_LATENCY_MS", 300)),
+    )
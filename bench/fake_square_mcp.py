@@ -0,0 +1,309 @@
+"""
+Stand-in for `square-mcp-server`: an MCP stdio server exposing
+make_api_request / get_service_info / get_type_info over generated fixtures.
+
+    SQUARE_MCP_COMMAND="python -m bench.fake_square_mcp --items 500 --orders 5000 --latency-ms 40"
+
+Data is deterministic for a given --seed. Writes mutate the in-memory
+fixtures, so approve flows and snapshot syncs see their effects.
+--error-rate and --slow-rate/--slow-ms inject 503s and tail latency into
+make_api_request (for the retry, hedging and circuit-breaker paths).
+"""
+
+import os
+import json
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from mcp.server.fastmcp import FastMCP
+
+METHODS = {
+    "locations": ["list", "retrieve"],
+    "catalog": ["list", "search", "retrieve", "upsertObject", "batchUpsert", "deleteObject"],
+    "team": ["searchMembers", "retrieveMember", "getWageSetting", "updateWageSetting"],
+    "orders": ["search", "retrieve"],
+}
+
+ITEM_NAMES = ["Latte", "Espresso", "Mocha", "Tea", "Bagel", "Muffin", "Burger", "Fries", "Salad", "Soup", "Wrap", "Cookie"]
+JOB_TITLES = ["Cook", "Barista", "Cashier", "Manager", "Server"]
+FIRST_NAMES = ["Ann", "Ben", "Cara", "Dev", "Eli", "Fay", "Gus", "Hana", "Ivan", "Jo"]
+LAST_NAMES = ["Lee", "Patel", "Garcia", "Smith", "Kim", "Nguyen", "Brown"]
+
+
+def _iso(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def _money(amount: int) -> Dict[str, Any]:
+    return {"amount": amount, "currency": "USD"}
+
+
+class Fixtures:
+    def __init__(self, locations: int, items: int, team: int, orders: int, seed: int = 7):
+        rnd = random.Random(seed)
+        now = datetime.now(timezone.utc)
+        self.locations = [
+            {"id": f"LOC{i:03d}", "name": f"Store {i}", "status": "ACTIVE", "currency": "USD",
+             "timezone": "America/New_York", "address": {"address_line_1": f"{100 + i} Main St", "locality": "Springfield"}}
+            for i in range(locations)
+        ]
+        self.catalog: Dict[str, dict] = {}
+        for i in range(items):
+            item_id = f"ITEM{i:05d}"
+            self.catalog[item_id] = {
+                "type": "ITEM", "id": item_id, "version": 1, "is_deleted": False,
+                "updated_at": _iso(now - timedelta(days=rnd.randint(1, 90))),
+                "present_at_all_locations": True,
+                "item_data": {
+                    "name": f"{rnd.choice(ITEM_NAMES)} {i}",
+                    "description": None,
+                    "is_taxable": True,
+                    "product_type": "REGULAR",
+                    "variations": [
+                        {"type": "ITEM_VARIATION", "id": f"VAR{i:05d}_{j}", "version": 1, "is_deleted": False,
+                         "item_variation_data": {"item_id": item_id, "name": ("Regular", "Large", "Small")[j],
+                                                 "pricing_type": "FIXED_PRICING",
+                                                 "price_money": _money(rnd.randint(150, 1500)),
+                                                 "track_inventory": False, "sellable": True}}
+                        for j in range(rnd.randint(1, 3))
+                    ],
+                },
+            }
+        self.team: Dict[str, dict] = {}
+        for i in range(team):
+            tm_id = f"TM{i:04d}"
+            self.team[tm_id] = {
+                "id": tm_id, "status": "ACTIVE", "is_owner": i == 0,
+                "given_name": rnd.choice(FIRST_NAMES), "family_name": rnd.choice(LAST_NAMES),
+                "email_address": f"member{i}@example.com",
+                "assigned_locations": {"assignment_type": "ALL_CURRENT_AND_FUTURE_LOCATIONS"},
+                "wage_setting": {"team_member_id": tm_id, "job_assignments": [
+                    {"job_title": rnd.choice(JOB_TITLES), "pay_type": "HOURLY",
+                     "hourly_rate": _money(rnd.randint(1500, 3500))}
+                ]},
+            }
+        item_ids = list(self.catalog)
+        self.orders: List[dict] = []
+        for i in range(orders):
+            created = now - timedelta(minutes=rnd.randint(1, 60 * 24 * 60))
+            lines = []
+            for _ in range(rnd.randint(1, 4)):
+                item = self.catalog[rnd.choice(item_ids)] if item_ids else None
+                var = item["item_data"]["variations"][0] if item else None
+                price = var["item_variation_data"]["price_money"]["amount"] if var else 500
+                qty = rnd.randint(1, 3)
+                lines.append({"uid": f"L{len(lines)}", "name": item["item_data"]["name"] if item else "Custom",
+                              "catalog_object_id": var["id"] if var else None, "quantity": str(qty),
+                              "base_price_money": _money(price), "gross_sales_money": _money(price * qty),
+                              "total_money": _money(price * qty)})
+            total = sum(li["total_money"]["amount"] for li in lines)
+            self.orders.append({
+                "id": f"ORD{i:07d}", "location_id": self.locations[i % max(1, locations)]["id"] if locations else None,
+                "state": "COMPLETED", "created_at": _iso(created), "updated_at": _iso(created),
+                "line_items": lines, "total_money": _money(total), "total_tax_money": _money(0),
+            })
+        self.orders.sort(key=lambda o: o["created_at"], reverse=True)
+        self._seq = 0
+
+    def next_id(self, prefix: str) -> str:
+        self._seq += 1
+        return f"{prefix}NEW{self._seq:05d}"
+
+
+def _page(items: List[Any], request: Dict[str, Any], key: str, default_limit: int = 100) -> Dict[str, Any]:
+    offset = int(request.get("cursor") or 0)
+    limit = int(request.get("limit") or default_limit)
+    chunk = items[offset : offset + limit]
+    out: Dict[str, Any] = {key: chunk}
+    if offset + limit < len(items):
+        out["cursor"] = str(offset + limit)
+    return out
+
+
+class FakeSquare:
+    def __init__(self, data: Fixtures):
+        self.data = data
+        self.calls = 0
+
+    def handle(self, service: str, method: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls += 1
+        if service not in METHODS:
+            raise ValueError(f"Unknown service '{service}'. Available services: {', '.join(METHODS)}")
+        if method not in METHODS[service]:
+            raise ValueError(f"Invalid method '{method}' for {service}. Available methods: {', '.join(METHODS[service])}")
+        return getattr(self, f"{service}_{method}")(request)
+
+    # ---- locations
+    def locations_list(self, request):
+        return {"locations": self.data.locations}
+
+    def locations_retrieve(self, request):
+        loc = next((l for l in self.data.locations if l["id"] == request.get("location_id")), None)
+        if loc is None:
+            raise ValueError("NOT_FOUND: location")
+        return {"location": loc}
+
+    # ---- catalog
+    def _catalog_objects(self, include_deleted: bool = False, begin_time: Optional[str] = None):
+        objs = [o for o in self.data.catalog.values() if include_deleted or not o["is_deleted"]]
+        if begin_time:
+            objs = [o for o in objs if o["updated_at"] >= begin_time]
+        return objs
+
+    def catalog_list(self, request):
+        return _page(self._catalog_objects(), request, "objects")
+
+    def catalog_search(self, request):
+        objs = self._catalog_objects(bool(request.get("include_deleted_objects")), request.get("begin_time"))
+        return _page(objs, request, "objects")
+
+    def catalog_retrieve(self, request):
+        obj = self.data.catalog.get(request.get("object_id"))
+        if obj is None:
+            raise ValueError("NOT_FOUND: catalog object")
+        return {"object": obj}
+
+    def _upsert(self, obj: Dict[str, Any]) -> Dict[str, Any]:
+        obj = json.loads(json.dumps(obj))
+        if not obj.get("id") or obj["id"].startswith("#"):
+            obj["id"] = self.data.next_id("ITEM")
+        prev = self.data.catalog.get(obj["id"], {})
+        obj["version"] = prev.get("version", 0) + 1
+        obj["updated_at"] = _iso(datetime.now(timezone.utc))
+        obj.setdefault("type", "ITEM")
+        obj["is_deleted"] = False
+        self.data.catalog[obj["id"]] = obj
+        return obj
+
+    def catalog_upsertObject(self, request):
+        return {"catalog_object": self._upsert(request.get("object") or {})}
+
+    def catalog_batchUpsert(self, request):
+        objects = [self._upsert(o) for b in request.get("batches") or [] for o in b.get("objects") or []]
+        return {"objects": objects}
+
+    def catalog_deleteObject(self, request):
+        obj = self.data.catalog.get(request.get("object_id"))
+        if obj is None:
+            raise ValueError("NOT_FOUND: catalog object")
+        obj["is_deleted"] = True
+        obj["updated_at"] = _iso(datetime.now(timezone.utc))
+        return {"deleted_object_ids": [obj["id"]]}
+
+    # ---- team
+    def team_searchMembers(self, request):
+        return _page(list(self.data.team.values()), request, "team_members", default_limit=100)
+
+    def team_retrieveMember(self, request):
+        tm = self.data.team.get(request.get("team_member_id"))
+        if tm is None:
+            raise ValueError("NOT_FOUND: team member")
+        return {"team_member": tm}
+
+    def team_getWageSetting(self, request):
+        tm = self.data.team.get(request.get("team_member_id"))
+        if tm is None:
+            raise ValueError("NOT_FOUND: team member")
+        return {"wage_setting": tm["wage_setting"]}
+
+    def team_updateWageSetting(self, request):
+        tm = self.data.team.get(request.get("team_member_id"))
+        if tm is None:
+            raise ValueError("NOT_FOUND: team member")
+        tm["wage_setting"] = {**tm["wage_setting"], **(request.get("wage_setting") or {})}
+        return {"wage_setting": tm["wage_setting"]}
+
+    # ---- orders
+    def orders_search(self, request):
+        ids = request.get("location_ids")
+        if not ids:
+            raise ValueError("INVALID_REQUEST_ERROR: location_ids is required")
+        ids = set(ids)
+        orders = [o for o in self.data.orders if o["location_id"] in ids]
+        dt_filter = (((request.get("query") or {}).get("filter") or {}).get("date_time_filter") or {})
+        for field in ("created_at", "updated_at"):
+            start = (dt_filter.get(field) or {}).get("start_at")
+            if start:
+                orders = [o for o in orders if o[field] >= start]
+        return _page(orders, request, "orders", default_limit=500)
+
+    def orders_retrieve(self, request):
+        order = next((o for o in self.data.orders if o["id"] == request.get("order_id")), None)
+        if order is None:
+            raise ValueError("NOT_FOUND: order")
+        return {"order": order}
+
+
+def build_server(
+    square: FakeSquare,
+    latency_ms: float,
+    jitter_ms: float,
+    error_rate: float = 0.0,
+    slow_rate: float = 0.0,
+    slow_ms: float = 0.0,
+) -> FastMCP:
+    mcp = FastMCP("square", log_level="WARNING")
+    rnd = random.Random(11)
+    # not seeded: pooled server processes must not fail/stall in lockstep
+    faults = random.Random()
+
+    async def delay():
+        if latency_ms or jitter_ms:
+            await asyncio.sleep(max(0.0, latency_ms + rnd.uniform(-jitter_ms, jitter_ms)) / 1000.0)
+
+    @mcp.tool()
+    async def make_api_request(service: str, method: str, request: Optional[dict] = None) -> str:
+        """Make a Square API request (service, method, request body)."""
+        await delay()
+        if slow_rate and faults.random() < slow_rate:
+            await asyncio.sleep(slow_ms / 1000.0)
+        if error_rate and faults.random() < error_rate:
+            raise RuntimeError("503 SERVICE_UNAVAILABLE: Square is temporarily unavailable")
+        return json.dumps(square.handle(service, method, request or {}))
+
+    @mcp.tool()
+    async def get_service_info(service: str) -> str:
+        """List the methods available for a Square service."""
+        await delay()
+        if service not in METHODS:
+            raise ValueError(f"Unknown service '{service}'. Available services: {', '.join(METHODS)}")
+        return json.dumps({"service": service, "methods": METHODS[service]})
+
+    @mcp.tool()
+    async def get_type_info(service: str, method: str) -> str:
+        """Describe the request fields for a Square service method."""
+        await delay()
+        if method not in METHODS.get(service, []):
+            raise ValueError(f"Invalid method '{method}' for {service}. Available methods: {', '.join(METHODS.get(service, []))}")
+        return json.dumps({"service": service, "method": method, "request": {"cursor": "string", "limit": "integer"}})
+
+    return mcp
+
+
+def main():
+    env = os.environ.get
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--locations", type=int, default=int(env("BENCH_LOCATIONS", 3)))
+    ap.add_argument("--items", type=int, default=int(env("BENCH_ITEMS", 200)))
+    ap.add_argument("--team", type=int, default=int(env("BENCH_TEAM", 25)))
+    ap.add_argument("--orders", type=int, default=int(env("BENCH_ORDERS", 2000)))
+    ap.add_argument("--latency-ms", type=float, default=float(env("BENCH_MCP_LATENCY_MS", 40)))
+    ap.add_argument("--jitter-ms", type=float, default=float(env("BENCH_MCP_JITTER_MS", 10)))
+    ap.add_argument("--error-rate", type=float, default=float(env("BENCH_MCP_ERROR_RATE", 0)))
+    ap.add_argument("--slow-rate", type=float, default=float(env("BENCH_MCP_SLOW_RATE", 0)))
+    ap.add_argument("--slow-ms", type=float, default=float(env("BENCH_MCP_SLOW_MS", 2000)))
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    data = Fixtures(args.locations, args.items, args.team, args.orders, seed=args.seed)
+    build_server(
+        FakeSquare(data), args.latency_ms, args.jitter_ms,
+        error_rate=args.error_rate, slow_rate=args.slow_rate, slow_ms=args.slow_ms,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+Load driver for the FastAPI app.
+
+    python -m bench.load --spawn --sessions 16 --turns 5 --out bench/results/baseline.json
+    python -m bench.load --spawn --compare bench/results/baseline.json
+
+--spawn starts `uvicorn app.api:app` with the fake MCP server
+(bench.fake_square_mcp) and the scripted model (CHAT_MODEL=fake:default),
+so no Square token, OpenAI key or npx is needed. Without --spawn it targets
+--url (whatever that server is configured with).
+
+Each virtual session runs --turns chat turns drawn from a fixed script
+(reads, a chart, a write that is then approved) and every --summary-every
+turns also fetches /api/summary. The report has per-endpoint p50/p95/p99,
+throughput, server RSS and subprocess count (sampled from /proc).
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+TURNS = [
+    "How many items are on the menu?",
+    "Who is the cook and what is their hourly wage?",
+    "Show revenue from recent orders as a bar chart",
+    "List my locations",
+    "Add a Bench Latte for $4.50 to the menu",
+    "What are the most expensive items?",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _quantile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[idx]
+
+
+# ---- process sampling (/proc, Linux only; zeros elsewhere)
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return 0.0
+
+
+def _descendants(pid: int) -> List[int]:
+    children: Dict[int, List[int]] = {}
+    try:
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    except OSError:
+        return []
+    out, stack = [], [pid]
+    while stack:
+        for c in children.get(stack.pop(), []):
+            out.append(c)
+            stack.append(c)
+    return out
+
+
+class Sampler:
+    def __init__(self, pid: Optional[int], interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.rss: List[float] = []
+        self.procs: List[int] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def sample(self):
+        if not self.pid:
+            return
+        kids = _descendants(self.pid)
+        self.rss.append(_rss_mb(self.pid) + sum(_rss_mb(k) for k in kids))
+        self.procs.append(len(kids))
+
+    async def _loop(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.sample()
+
+    def report(self) -> Dict[str, Any]:
+        if not self.rss:
+            return {}
+        return {
+            "rss_mb_start": round(self.rss[0], 1),
+            "rss_mb_peak": round(max(self.rss), 1),
+            "rss_mb_end": round(self.rss[-1], 1),
+            "subprocesses_peak": max(self.procs),
+            "subprocesses_end": self.procs[-1],
+        }
+
+
+# ---- server
+
+def spawn_server(port: int, args) -> subprocess.Popen:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    fake_mcp = (
+        f"{sys.executable} -m bench.fake_square_mcp --items {args.items} --orders {args.orders} "
+        f"--latency-ms {args.mcp_latency_ms}"
+    )
+    env = {
+        **os.environ,
+        "PYTHONPATH": root,
+        "SQUARE_MCP_COMMAND": fake_mcp,
+        "CHAT_MODEL": f"fake:{args.script}",
+        "ROUTER_MODEL": f"fake:{args.script}",
+        "BENCH_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "DISALLOW_WRITES": "false",
+        "ROUTER_LOG_PATH": "",
+        "WRITE_JOB_DB_PATH": os.path.join(tempfile.gettempdir(), f"bench_write_jobs_{port}.db"),
+    }
+    cmd = [sys.executable, "-m", "uvicorn", "app.api:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=root, env=env)
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            r = await client.get("/api/stats")
+            if r.status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError("server did not become ready")
+
+
+# ---- load
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, endpoint: str, seconds: float, ok: bool):
+        self.samples.setdefault(endpoint, []).append(seconds)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, wall: float) -> Dict[str, Any]:
+        out = {}
+        for ep, vals in sorted(self.samples.items()):
+            s = sorted(vals)
+            out[ep] = {
+                "count": len(s),
+                "errors": self.errors.get(ep, 0),
+                "p50_ms": round(_quantile(s, 0.50) * 1000, 1),
+                "p95_ms": round(_quantile(s, 0.95) * 1000, 1),
+                "p99_ms": round(_quantile(s, 0.99) * 1000, 1),
+                "throughput_rps": round(len(s) / wall, 2) if wall else 0.0,
+            }
+        return out
+
+
+async def _timed(rec: Recorder, endpoint: str, call) -> Optional[httpx.Response]:
+    t0 = time.perf_counter()
+    try:
+        r = await call
+        rec.add(endpoint, time.perf_counter() - t0, r.status_code < 400)
+        return r
+    except httpx.HTTPError:
+        rec.add(endpoint, time.perf_counter() - t0, False)
+        return None
+
+
+async def _wait_job(client: httpx.AsyncClient, job_id: str, t0: float):
+    while True:
+        try:
+            r = await client.get(f"/api/jobs/{job_id}")
+        except httpx.HTTPError:
+            return time.perf_counter() - t0, False
+        status = r.json().get("status") if r.status_code == 200 else "failed"
+        if status in ("succeeded", "failed"):
+            return time.perf_counter() - t0, status == "succeeded"
+        await asyncio.sleep(0.05)
+
+
+async def run_session(client: httpx.AsyncClient, rec: Recorder, n: int, args, rnd: random.Random):
+    session_id = f"bench-{n}-{rnd.randrange(10**6)}"
+    for turn in range(args.turns):
+        text = TURNS[(n + turn) % len(TURNS)]
+        r = await _timed(rec, "chat", client.post("/api/chat", json={"session_id": session_id, "message": text}))
+        if r is not None and r.status_code == 200 and r.json().get("needs_confirm"):
+            t0 = time.perf_counter()
+            r = await _timed(rec, "approve", client.post("/api/chat/approve", json={"session_id": session_id}))
+            job_id = r.json().get("job_id") if r is not None and r.status_code == 200 else None
+            if job_id:
+                # approve only enqueues; "approve_job" is approval until the write is applied
+                rec.add("approve_job", *(await _wait_job(client, job_id, t0)))
+        if args.summary_every and (turn + 1) % args.summary_every == 0:
+            await _timed(rec, "summary", client.get("/api/summary"))
+
+
+async def run(args) -> Dict[str, Any]:
+    proc = None
+    url = args.url
+    if args.spawn:
+        port = _free_port()
+        url = f"http://127.0.0.1:{port}"
+        proc = spawn_server(port, args)
+
+    limits = httpx.Limits(max_connections=args.sessions + 4)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        try:
+            await wait_ready(client)
+            sampler = Sampler(proc.pid if proc else args.pid)
+            sampler.start()
+
+            rec = Recorder()
+            rnd = random.Random(args.seed)
+            t0 = time.perf_counter()
+            await asyncio.gather(*(run_session(client, rec, i, args, rnd) for i in range(args.sessions)))
+            wall = time.perf_counter() - t0
+            await sampler.stop()
+
+            stats = {}
+            try:
+                stats = (await client.get("/api/stats")).json()
+            except (httpx.HTTPError, ValueError):
+                pass
+        finally:
+            if proc is not None:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+    total = sum(len(v) for v in rec.samples.values())
+    return {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "host": {"python": platform.python_version(), "platform": platform.platform()},
+        "wall_seconds": round(wall, 3),
+        "requests": total,
+        "throughput_rps": round(total / wall, 2) if wall else 0.0,
+        "endpoints": rec.report(wall),
+        "process": sampler.report(),
+        "server_metrics": stats.get("metrics", {}),
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Human-readable deltas; lines starting with REGRESSION fail the run."""
+    lines = []
+    for ep, cur in result["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(ep)
+        if not base:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            b, c = base[key], cur[key]
+            delta = (c - b) / b if b else 0.0
+            tag = "REGRESSION" if delta > tolerance else "ok"
+            lines.append(f"{tag:10} {ep:8} {key:7} {b:9.1f} -> {c:9.1f} ms ({delta:+.0%})")
+    b, c = baseline.get("throughput_rps", 0), result["throughput_rps"]
+    if b:
+        delta = (c - b) / b
+        tag = "REGRESSION" if delta < -tolerance else "ok"
+        lines.append(f"{tag:10} overall  rps     {b:9.2f} -> {c:9.2f}    ({delta:+.0%})")
+    return lines
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--spawn", action="store_true", help="start uvicorn with the fake MCP server and scripted model")
+    ap.add_argument("--pid", type=int, default=None, help="server pid to sample when not using --spawn")
+    ap.add_argument("--sessions", type=int, default=16)
+    ap.add_argument("--turns", type=int, default=5)
+    ap.add_argument("--summary-every", type=int, default=3)
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--script", default="default", help="fake model script (default | direct | sloppy)")
+    ap.add_argument("--items", type=int, default=200)
+    ap.add_argument("--orders", type=int, default=2000)
+    ap.add_argument("--mcp-latency-ms", type=float, default=40.0)
+    ap.add_argument("--llm-latency-ms", type=float, default=300.0)
+    ap.add_argument("--out", help="write the JSON result here")
+    ap.add_argument("--compare", help="baseline JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before REGRESSION")
+    args = ap.parse_args()
+
+    result = asyncio.run(run(args))
+    print(json.dumps({k: result[k] for k in ("wall_seconds", "requests", "throughput_rps", "endpoints", "process")}, indent=2))
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines = compare(result, baseline, args.tolerance)
+        print("\n".join(lines))
+        if any(line.startswith("REGRESSION") for line in lines):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Per-turn prompt size by tool profile.
+
+    python -m bench.prompt_size            # against the fake MCP server
+    python -m bench.prompt_size --live     # against SQUARE_MCP_COMMAND / npx square-mcp-server
+
+Counts the tokens every agent LLM call carries before any history: the
+system prompt plus the JSON schema of each bound tool (as sent to OpenAI).
+"all tools" is the baseline every read turn used to get: every MCP tool
+with its full description and the full method index.
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+from typing import Any, Dict, List
+
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+def _tool_tokens(tools, count_tokens) -> int:
+    return sum(count_tokens(json.dumps(convert_to_openai_tool(t), separators=(",", ":"))) for t in tools)
+
+
+async def measure() -> List[Dict[str, Any]]:
+    from app import agent_runtime as ar
+    from app.context_window import count_tokens
+    from app.mcp_pool import get_pool
+    from app.schema_catalog import get_schema_catalog
+    from app.square_api import get_agent_tools
+
+    pool = get_pool()
+    await pool.start()
+    catalog = get_schema_catalog()
+    await catalog.start()
+    if catalog._task is not None:
+        await catalog._task
+
+    try:
+        rows = []
+        everything, _ = await get_agent_tools("write")
+        baseline_system = ar.BASE_SYSTEM + ar._schema_section(read_only=False) + ar.READ_ONLY_POLICY
+        rows.append({
+            "profile": "all tools (baseline)",
+            "tools": [t.name for t in everything],
+            "system_tokens": count_tokens(baseline_system),
+            "tool_tokens": _tool_tokens(everything, count_tokens),
+        })
+        for profile, allow_writes in (("read", False), ("chart", False), ("write", True)):
+            tools, _ = await get_agent_tools(profile)
+            system = (
+                ar.BASE_SYSTEM
+                + ar._schema_section(read_only=not allow_writes)
+                + (ar.WRITE_ALLOWED_POLICY if allow_writes else ar.READ_ONLY_POLICY)
+            )
+            rows.append({
+                "profile": profile,
+                "tools": [t.name for t in tools],
+                "system_tokens": count_tokens(system),
+                "tool_tokens": _tool_tokens(tools, count_tokens),
+            })
+    finally:
+        await catalog.stop()
+        await pool.close()
+
+    base = rows[0]["system_tokens"] + rows[0]["tool_tokens"]
+    for r in rows:
+        r["total_tokens"] = r["system_tokens"] + r["tool_tokens"]
+        r["vs_baseline"] = f"{(r['total_tokens'] - base) / base:+.0%}" if base else "n/a"
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--live", action="store_true", help="use the configured MCP server instead of the fake one")
+    ap.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = ap.parse_args()
+
+    if not args.live:
+        os.environ["SQUARE_MCP_COMMAND"] = f"{sys.executable} -m bench.fake_square_mcp --latency-ms 0 --jitter-ms 0"
+        os.environ.setdefault("SCHEMA_CACHE_PATH", "")
+
+    rows = asyncio.run(measure())
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'profile':22} {'system':>7} {'tools':>7} {'total':>7} {'delta':>7}  bound tools")
+    for r in rows:
+        print(
+            f"{r['profile']:22} {r['system_tokens']:7d} {r['tool_tokens']:7d} {r['total_tokens']:7d} "
+            f"{r['vs_baseline']:>7}  {', '.join(r['tools'])}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Shared fixtures.
+
+resp_server is a minimal in-process RESP2 server: just the commands
+RedisSessionStore sends (lists, strings with EX, EXPIRE, GETDEL, MULTI/EXEC),
+on a thread, with a clock the test can move forward.
+"""
+
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+import pytest
+
+
+class FakeRedis:
+    def __init__(self, getdel: bool = True):
+        self.getdel = getdel
+        self.offset = 0.0
+        self.data: Dict[str, object] = {}
+        self.expires: Dict[str, float] = {}
+        self.commands: List[List[str]] = []
+        self._lock = threading.Lock()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen()
+        self.port = self._sock.getsockname()[1]
+        self.url = f"redis://127.0.0.1:{self.port}/0"
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    # ---- clock / keyspace ----
+
+    def now(self) -> float:
+        return time.monotonic() + self.offset
+
+    def advance(self, seconds: float):
+        self.offset += seconds
+
+    def _live(self, key: str) -> Optional[object]:
+        exp = self.expires.get(key)
+        if exp is not None and exp <= self.now():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def ttl(self, key: str) -> Optional[float]:
+        exp = self.expires.get(key)
+        return None if exp is None or self._live(key) is None else exp - self.now()
+
+    # ---- protocol ----
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket):
+        f = conn.makefile("rb")
+        queued: Optional[List[List[str]]] = None
+        try:
+            while True:
+                line = f.readline()
+                if not line:
+                    return
+                args = []
+                for _ in range(int(line[1:-2])):
+                    n = int(f.readline()[1:-2])
+                    args.append(f.read(n + 2)[:-2].decode("utf-8"))
+                name = args[0].upper()
+                if name == "MULTI":
+                    queued, reply = [], "+OK"
+                elif name == "EXEC":
+                    with self._lock:
+                        replies = [self._run(c) for c in queued or []]
+                    queued, reply = None, b"*%d\r\n" % len(replies) + b"".join(replies)
+                elif queued is not None:
+                    queued.append(args)
+                    reply = "+QUEUED"
+                else:
+                    with self._lock:
+                        reply = self._run(args)
+                conn.sendall(reply if isinstance(reply, bytes) else reply.encode() + b"\r\n")
+        except (OSError, ValueError):
+            return
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _bulk(value: Optional[str]) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        b = value.encode("utf-8")
+        return b"$%d\r\n%s\r\n" % (len(b), b)
+
+    def _run(self, args: List[str]) -> bytes:
+        self.commands.append(args)
+        name, rest = args[0].upper(), args[1:]
+        if name in ("AUTH", "SELECT"):
+            return b"+OK\r\n"
+        if name == "RPUSH":
+            lst = self._live(rest[0])
+            if lst is None:
+                lst = self.data[rest[0]] = []
+            lst.extend(rest[1:])
+            return b":%d\r\n" % len(lst)
+        if name in ("LRANGE", "LTRIM"):
+            lst = self._live(rest[0]) or []
+            start, stop = int(rest[1]), int(rest[2])
+            start = max(0, len(lst) + start if start < 0 else start)
+            stop = len(lst) + stop if stop < 0 else stop
+            part = lst[start : stop + 1]
+            if name == "LTRIM":
+                if rest[0] in self.data:
+                    self.data[rest[0]] = part
+                return b"+OK\r\n"
+            return b"*%d\r\n" % len(part) + b"".join(self._bulk(x) for x in part)
+        if name == "EXPIRE":
+            if self._live(rest[0]) is None:
+                return b":0\r\n"
+            self.expires[rest[0]] = self.now() + int(rest[1])
+            return b":1\r\n"
+        if name == "SET":
+            self.data[rest[0]] = rest[1]
+            self.expires.pop(rest[0], None)
+            if len(rest) > 3 and rest[2].upper() == "EX":
+                self.expires[rest[0]] = self.now() + int(rest[3])
+            return b"+OK\r\n"
+        if name == "GET":
+            return self._bulk(self._live(rest[0]))
+        if name == "GETDEL" and self.getdel:
+            value = self._live(rest[0])
+            self.data.pop(rest[0], None)
+            self.expires.pop(rest[0], None)
+            return self._bulk(value)
+        if name == "DEL":
+            n = sum(1 for k in rest if self._live(k) is not None)
+            for k in rest:
+                self.data.pop(k, None)
+                self.expires.pop(k, None)
+            return b":%d\r\n" % n
+        return b"-ERR unknown command '%s'\r\n" % args[0].encode()
+
+    def close(self):
+        self._sock.close()
+
+
+@pytest.fixture
+def resp_server():
+    server = FakeRedis()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def resp_server_no_getdel():
+    # a pre-6.2 server: pop_pending has to fall back to MULTI/GET/DEL/EXEC
+    server = FakeRedis(getdel=False)
+    yield server
+    server.close()
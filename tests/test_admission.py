@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from app.admission import AdmissionController, AdmissionRejected
+
+
+def _controller(**kw):
+    return AdmissionController(**{"max_turns": 1, "max_queue": 1, "session_queue": 1, "queue_timeout": 5.0, **kw})
+
+
+async def _hold(adm, session_id, release: asyncio.Event):
+    async with adm.turn(session_id):
+        await release.wait()
+
+
+async def _settle():
+    # let the started turns reach their queues
+    await asyncio.sleep(0.01)
+
+
+def test_turns_of_one_session_run_in_order():
+    async def go():
+        adm = _controller(max_turns=4, session_queue=4)
+        order = []
+
+        async def turn(i):
+            async with adm.turn("s1"):
+                order.append(i)
+                await asyncio.sleep(0.001)
+
+        await asyncio.gather(*(turn(i) for i in range(4)))
+        return order, adm.stats()
+
+    order, stats = asyncio.run(go())
+    assert order == [0, 1, 2, 3]
+    assert stats["active"] == 0 and stats["queued"] == 0 and stats["sessions_waiting"] == 0
+
+
+def test_second_queued_message_of_a_session_gets_429():
+    async def go():
+        adm = _controller(max_turns=4)
+        release = asyncio.Event()
+        first = asyncio.create_task(_hold(adm, "s1", release))
+        await _settle()
+        second = asyncio.create_task(_hold(adm, "s1", release))
+        await _settle()
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with adm.turn("s1"):
+                pass
+        release.set()
+        await asyncio.gather(first, second)
+        return rejected.value
+
+    rejected = asyncio.run(go())
+    assert rejected.status_code == 429 and rejected.retry_after >= 1
+
+
+def test_full_global_queue_gets_503():
+    async def go():
+        adm = _controller()
+        release = asyncio.Event()
+        running = asyncio.create_task(_hold(adm, "a", release))
+        await _settle()
+        waiting = asyncio.create_task(_hold(adm, "b", release))
+        await _settle()
+        assert adm.stats()["active"] == 1 and adm.stats()["queued"] == 1
+        with pytest.raises(AdmissionRejected) as rejected:
+            adm.check("c")
+        release.set()
+        await asyncio.gather(running, waiting)
+        adm.check("c")  # room again
+        return rejected.value
+
+    assert asyncio.run(go()).status_code == 503
+
+
+def test_queue_timeout_gets_503():
+    async def go():
+        adm = _controller(queue_timeout=0.05)
+        release = asyncio.Event()
+        running = asyncio.create_task(_hold(adm, "a", release))
+        await _settle()
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with adm.turn("b"):
+                pass
+        release.set()
+        await running
+        return rejected.value, adm.stats()
+
+    rejected, stats = asyncio.run(go())
+    assert rejected.status_code == 503 and stats["queued"] == 0
+
+
+def test_unchecked_session_work_is_never_refused():
+    async def go():
+        adm = _controller(max_queue=0, session_queue=0)
+        release = asyncio.Event()
+        running = asyncio.create_task(_hold(adm, "s1", release))
+        await _settle()
+        with pytest.raises(AdmissionRejected):
+            adm.check("s1")
+
+        async def job():
+            async with adm.session("s1", check=False):
+                return "ran"
+
+        queued = asyncio.create_task(job())
+        await _settle()
+        release.set()
+        await running
+        return await queued
+
+    assert asyncio.run(go()) == "ran"
+
+
+def test_cancelled_turns_free_their_slots():
+    async def go():
+        adm = _controller()
+        never = asyncio.Event()
+        running = asyncio.create_task(_hold(adm, "a", never))
+        waiting = asyncio.create_task(_hold(adm, "b", never))
+        await asyncio.sleep(0)
+        # cancelled while the slot is handed from one to the other
+        running.cancel()
+        waiting.cancel()
+        done, pending = await asyncio.wait({running, waiting}, timeout=1)
+        assert not pending
+        async with adm.turn("c"):
+            return adm.stats()
+
+    stats = asyncio.run(go())
+    assert stats["active"] == 1 and stats["queued"] == 0
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from app import analytics_store, snapshot
+from app.analytics_store import AnalyticsStore
+from app.snapshot import SquareSnapshot
+from app.square_cache import SquareReadCache
+
+
+def _item(item_id, name, cents, currency="USD"):
+    return {
+        "id": item_id,
+        "type": "ITEM",
+        "item_data": {
+            "name": name,
+            "variations": [{
+                "id": f"{item_id}-v",
+                "item_variation_data": {"name": "Regular", "price_money": {"amount": cents, "currency": currency}},
+            }],
+        },
+    }
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    cache = SquareReadCache(max_entries=64)
+    monkeypatch.setattr(snapshot, "get_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture
+def square():
+    """What Square would return for catalog.list."""
+    return {"latte": _item("latte", "Latte", 450)}
+
+
+@pytest.fixture
+def snap(monkeypatch, reads, square):
+    monkeypatch.delenv("SNAPSHOT_PATH", raising=False)
+    snap = SquareSnapshot()
+    snap.schedule["catalog"] = 3600.0
+    snap.calls = 0
+
+    async def sync_catalog(full):
+        snap.calls += 1
+        return snap._replace("catalog", dict(square))
+
+    snap._sync_catalog = sync_catalog
+    monkeypatch.setattr(analytics_store, "get_snapshot", lambda: snap)
+    return snap
+
+
+def _price(store):
+    async def ask():
+        await store.ensure_loaded("catalog_items")
+        return store.query("catalog_items", "price", group_by=["item_name"])["rows"]
+
+    return ask
+
+
+def test_on_demand_sync_only_when_stale_or_dirty(snap, reads, square):
+    store = AnalyticsStore(":memory:")
+
+    async def go():
+        ask = _price(store)
+        assert await ask() == [["Latte", 4.5]]
+        square["latte"] = _item("latte", "Latte", 500)
+        # within its schedule and no write since: served from what was loaded
+        assert await ask() == [["Latte", 4.5]]
+        assert snap.calls == 1
+        # an approved write to the catalog invalidates its reads and marks it dirty
+        reads.invalidate_service("catalog")
+        assert snap.dirty == {"catalog"}
+        assert await ask() == [["Latte", 5.0]]
+        assert snap.calls == 2 and not snap.dirty
+
+    asyncio.run(go())
+
+
+def test_failed_sync_stays_dirty(snap, reads):
+    store = AnalyticsStore(":memory:")
+
+    async def failing(full):
+        raise TimeoutError("square timed out")
+
+    async def go():
+        await _price(store)()
+        reads.invalidate_service("catalog")
+        snap._sync_catalog = failing
+        with pytest.raises(TimeoutError):
+            await store.ensure_loaded("catalog_items")
+        assert snap.dirty == {"catalog"}
+
+    asyncio.run(go())
+
+
+def test_money_is_never_summed_across_currencies(snap, square):
+    square["tea"] = _item("tea", "Tea", 300, "JPY")
+    store = AnalyticsStore(":memory:")
+
+    async def go():
+        await store.ensure_loaded("catalog_items")
+        return store.query("catalog_items", "max_price")
+
+    result = asyncio.run(go())
+    assert sorted(result["rows"]) == [[4.5], [300]]
+    assert result["currency"] == ["JPY", "USD"] and "note" in result
@@ -0,0 +1,99 @@
+import time
+import types
+
+import pytest
+
+from app import answer_cache
+from app.answer_cache import AnswerCache
+from app.square_cache import SquareReadCache
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """A private Square read cache, so generations start from scratch."""
+    cache = SquareReadCache(max_entries=64)
+    monkeypatch.setattr(answer_cache, "get_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture
+def answers(reads):
+    return AnswerCache(max_entries=8, ttl=300.0, threshold=0.9)
+
+
+def _route(text, **extra):
+    return {"intent": "read", "needs_confirm": False, "normalized_request": text, "context_free": True, **extra}
+
+
+# ---- keys
+
+
+def test_only_context_free_reads_are_keyed():
+    text = "How many items are on the menu?"
+    assert AnswerCache.cache_key(_route(text)) == "how many items are on menu"
+    assert AnswerCache.cache_key(_route(text, context_free=False)) is None
+    # no flag at all (e.g. a route built elsewhere) is not shareable either
+    assert AnswerCache.cache_key({"intent": "read", "normalized_request": text}) is None
+    assert AnswerCache.cache_key(_route(text, intent="write")) is None
+
+
+@pytest.mark.parametrize("text", [
+    "What is his hourly wage?",
+    "Show their wages",
+    "List theirs and hers",
+    "What does its price look like?",
+    "How many are there?",
+    "Show that as a pie chart",
+    "Same for the previous month",
+])
+def test_requests_pointing_at_earlier_turns_are_not_keyed(text):
+    assert AnswerCache.cache_key(_route(text)) is None
+
+
+# ---- lookups
+
+
+def test_hit_exact_and_similar(answers):
+    answers.put(_route("Show me the top 5 items by revenue"), "reply", {"orders"}, 2.0)
+    assert answers.get(_route("show the top 5 items by revenue please")) == "reply"
+    assert answers.get(_route("Show me top 5 items by revenue.")) == "reply"
+    assert answers.hits == 2 and answers.saved_seconds == pytest.approx(4.0)
+
+
+def test_miss_on_other_numbers_and_other_questions(answers):
+    answers.put(_route("Show me the top 5 items by revenue"), "reply", {"orders"}, 2.0)
+    assert answers.get(_route("Show me the top 10 items by revenue")) is None
+    assert answers.get(_route("List the team members")) is None
+    assert answers.misses == 2
+
+
+def test_follow_up_is_neither_stored_nor_served(answers):
+    text = "List the catalog items"
+    answers.put(_route(text, context_free=False), "session A's answer", {"catalog"}, 1.0)
+    assert answers.stats()["entries"] == 0
+    answers.put(_route(text), "reply", {"catalog"}, 1.0)
+    assert answers.get(_route(text, context_free=False)) is None
+
+
+def test_write_to_a_read_service_invalidates(answers, reads):
+    answers.put(_route("List the catalog items"), "items", {"catalog"}, 1.0)
+    answers.put(_route("List the team members"), "team", {"team"}, 1.0)
+    reads.invalidate_service("catalog")
+    assert answers.get(_route("List the catalog items")) is None
+    assert answers.get(_route("List the team members")) == "team"
+
+
+def test_entries_expire_with_the_shortest_ttl(answers, reads, monkeypatch):
+    reads.ttls["team"] = 5.0
+    answers.put(_route("List the team members"), "team", {"team", "catalog"}, 1.0)
+    later = time.monotonic() + 6.0
+    monkeypatch.setattr(answer_cache, "time", types.SimpleNamespace(monotonic=lambda: later))
+    assert answers.get(_route("List the team members")) is None
+
+
+def test_lru_bound(answers):
+    for i in range(10):
+        answers.put(_route(f"List orders for location number {i}"), str(i), {"orders"}, 1.0)
+    assert answers.stats()["entries"] == 8
+    assert answers.get(_route("List orders for location number 0")) is None
+    assert answers.get(_route("List orders for location number 9")) == "9"
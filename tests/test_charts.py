@@ -0,0 +1,140 @@
+import asyncio
+import json
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import ToolException
+
+from app import charts
+from app.charts import aggregate, attach_charts, chart_block_problem, downsample, lttb, validate_config
+
+
+def _build(**spec):
+    return asyncio.run(charts._build_chart(**spec))
+
+
+# ---- aggregation
+
+
+def test_aggregate_groups_labels_and_series():
+    rows = [["Latte", "Main", 4.5], ["Latte", "Main", "$1,000.50"], ["Tea", "Main", 3], ["Latte", "Pier", None]]
+    labels, data = aggregate(["item", "location", "revenue"], rows, series="location")
+    assert labels == ["Latte", "Tea"]
+    assert data == {"Main": [1005.0, 3.0], "Pier": [None, None]}
+
+
+@pytest.mark.parametrize("agg, expected", [("sum", 6.0), ("avg", 3.0), ("min", 2.0), ("max", 4.0), ("count", 2.0)])
+def test_aggregate_combines_rows_with_the_same_label(agg, expected):
+    _, data = aggregate(["x", "y"], [["a", 2], ["a", 4]], agg=agg)
+    assert list(data.values()) == [[expected]]
+
+
+def test_aggregate_rejects_unknown_columns():
+    with pytest.raises(ToolException, match="Unknown column"):
+        aggregate(["x", "y"], [["a", 1]], y="revenue")
+
+
+# ---- downsampling
+
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    values = [0.0] * 100
+    values[37], values[71] = 50.0, -40.0
+    keep = lttb(values, 10)
+    assert len(keep) == 10 and keep[0] == 0 and keep[-1] == 99
+    assert keep == sorted(keep)
+    assert 37 in keep and 71 in keep
+
+
+def test_lttb_leaves_short_series_alone():
+    assert lttb([1.0, 2.0, 3.0], 10) == [0, 1, 2]
+
+
+def test_long_time_series_are_downsampled_across_series(monkeypatch):
+    monkeypatch.setenv("CHART_MAX_POINTS", "20")
+    labels = [f"2024-01-{d:02d}" for d in range(1, 31)] * 2
+    data = {"a": [float(i) for i in range(60)], "b": [1.0] * 60}
+    kept, out = downsample("line", labels, data, ordered=True)
+    assert len(kept) == 20 and len(out["a"]) == len(out["b"]) == 20
+
+
+def test_many_categories_keep_the_largest_plus_other(monkeypatch):
+    monkeypatch.setenv("CHART_MAX_CATEGORIES", "3")
+    labels, data = downsample("bar", ["a", "b", "c", "d", "e"], {"v": [5.0, 1.0, 9.0, 2.0, None]}, ordered=False)
+    assert labels == ["a", "c", "Other (3)"]
+    assert data == {"v": [5.0, 9.0, 3.0]}
+
+
+# ---- validation
+
+
+def test_validate_config():
+    ok = {"type": "bar", "data": {"labels": ["a", "b"], "datasets": [{"label": "x", "data": [1, None]}]}}
+    assert validate_config(ok) is None
+    assert "type" in validate_config({**ok, "type": "pyramid"})
+    assert "non-empty" in validate_config({"type": "bar", "data": {"datasets": []}})
+    mismatch = {"type": "bar", "data": {"labels": ["a"], "datasets": [{"label": "x", "data": [1, 2]}]}}
+    assert "2 values for 1 labels" in validate_config(mismatch)
+    words = {"type": "bar", "data": {"labels": ["a"], "datasets": [{"label": "x", "data": ["lots"]}]}}
+    assert "non-numeric" in validate_config(words)
+
+
+def test_chart_block_problem():
+    assert chart_block_problem("no chart here") == "missing"
+    assert chart_block_problem("<CHART_CONFIG>{not json</CHART_CONFIG>").startswith("invalid JSON")
+    good = {"type": "pie", "data": {"labels": ["a"], "datasets": [{"data": [1]}]}}
+    assert chart_block_problem(f"<CHART_CONFIG>{json.dumps(good)}</CHART_CONFIG>") is None
+
+
+# ---- the tool
+
+
+def test_table_chart_returns_an_id_and_keeps_data_out_of_the_summary():
+    summary, artifact = _build(type="bar", table={"columns": ["item", "revenue_dollars"], "rows": [["Latte", 40], ["Tea", 12]]})
+    info = json.loads(summary)
+    assert info["chart_id"] == artifact["chart_id"] and "data" not in info
+    assert info["preview"]["Revenue ($)"]["top"][0] == ["Latte", 40]
+    assert artifact["config"]["data"]["labels"] == ["Latte", "Tea"]
+
+
+def test_query_chart_uses_group_by_for_axes(monkeypatch):
+    seen = {}
+
+    async def query_analytics(**query):
+        seen.update(query)
+        return {"columns": ["created_month", "location_id", "revenue_dollars"],
+                "rows": [["2024-01", "L1", 10.0], ["2024-01", "L2", 5.0], ["2024-02", "L1", 12.0]]}
+
+    monkeypatch.setattr(charts, "query_analytics", query_analytics)
+    _, artifact = _build(type="line", query={"dataset": "orders", "metric": "revenue", "group_by": ["created_month", "location_id"]})
+    assert seen["limit"] == 1000
+    datasets = artifact["config"]["data"]["datasets"]
+    assert [d["label"] for d in datasets] == ["L1", "L2"]
+    assert datasets[1]["data"] == [5.0, None]
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({"type": "bar"}, "needs either query"),
+    ({"type": "bar", "table": {"columns": ["x", "y"], "rows": []}}, "No data"),
+    ({"type": "pie", "table": {"columns": ["x", "s", "y"], "rows": [["a", "1", 1], ["a", "2", 2]]}, "series": "s"}, "one series"),
+])
+def test_bad_specs_are_tool_errors(spec, message):
+    with pytest.raises(ToolException, match=message):
+        _build(**spec)
+
+
+def test_attach_charts_expands_references_from_this_turn_only():
+    _, old = _build(type="bar", table={"columns": ["x", "y"], "rows": [["old", 1]]})
+    _, new = _build(type="bar", table={"columns": ["x", "y"], "rows": [["new", 2]]})
+    state = [
+        HumanMessage("chart it"),
+        ToolMessage("", tool_call_id="1", name="build_chart", artifact=old),
+        AIMessage("done"),
+        HumanMessage("and now this"),
+        ToolMessage("", tool_call_id="2", name="build_chart", artifact=new),
+    ]
+    text = attach_charts(f'Here: <CHART id="{new["chart_id"]}"/> and <CHART id="{old["chart_id"]}"/>', state, want_chart=True)
+    assert text.count("<CHART_CONFIG>") == 1 and '"new"' in text and '"old"' not in text
+    # built and wanted but not referenced: attached anyway
+    assert "<CHART_CONFIG>" in attach_charts("Here is your chart.", state, want_chart=True)
+    assert attach_charts("Here is your chart.", state, want_chart=False) == "Here is your chart."
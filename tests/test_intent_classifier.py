@@ -0,0 +1,81 @@
+import pytest
+
+from app import intent_classifier
+from app.intent_classifier import LocalClassifier, RouteCache, classify_local, has_prior_turns, normalize_text
+
+SAMPLES = [
+    ("clear", "clear"), ("reset the chat", "clear"), ("start over", "clear"), ("new conversation please", "clear"),
+    ("raise the latte price to 5 dollars", "write"), ("add a new item called mocha", "write"),
+    ("delete the tea item", "write"), ("update john's hourly wage to 20", "write"), ("create a category for pastries", "write"),
+    ("how many items are on the menu", "read"), ("show me revenue by month", "read"), ("list the team members", "read"),
+    ("what is the price of a latte", "read"), ("chart sales by location", "read"),
+    ("hello", "unknown"), ("thanks", "unknown"), ("what's the weather", "unknown"),
+]
+
+
+@pytest.fixture(scope="module")
+def clf():
+    return LocalClassifier().fit(SAMPLES, epochs=40)
+
+
+def test_normalize_text():
+    assert normalize_text("  What's the PRICE of a latte?!  ") == "what s the price of a latte"
+    assert normalize_text("raise to $4.50.") == "raise to $4.50"
+
+
+def test_classifier_learns_the_training_set(clf):
+    for text, intent in SAMPLES:
+        assert clf.predict(text)[0] == intent
+
+
+def test_classifier_generalizes_to_close_wording(clf):
+    assert clf.predict("raise the mocha price to 6 dollars")[0] == "write"
+    assert clf.predict("show me revenue by location")[0] == "read"
+    proba = clf.predict_proba("list the items")
+    assert sum(proba.values()) == pytest.approx(1.0)
+
+
+def test_save_and_load_round_trip(clf, tmp_path):
+    path = tmp_path / "router.json"
+    clf.save(path)
+    loaded = LocalClassifier.load(path)
+    for text in ("delete the tea item", "list the team members"):
+        assert loaded.predict(text)[0] == clf.predict(text)[0]
+        assert loaded.predict(text)[1] == pytest.approx(clf.predict(text)[1], abs=1e-3)
+
+
+def test_route_cache_normalizes_and_is_bounded():
+    cache = RouteCache(max_entries=2)
+    cache.put("List the team!", {"intent": "read"})
+    assert cache.get("list the team") == {"intent": "read"}
+    cache.put("a", {"intent": "read"})
+    cache.get("list the team")  # most recent again
+    cache.put("b", {"intent": "read"})
+    assert cache.get("a") is None and cache.get("List the team") is not None
+    cache.put("?!", {"intent": "read"})  # nothing left after normalizing
+    assert len(cache) == 2
+
+
+@pytest.mark.parametrize("history, prior", [
+    (None, False),
+    ([{"role": "user", "content": "hi"}], False),  # just the message being routed
+    ([{"role": "user", "content": "earlier"}], True),  # a history that excludes it
+    ([{"role": "assistant", "content": "x"}, {"role": "user", "content": "hi"}], True),
+])
+def test_has_prior_turns(history, prior):
+    assert has_prior_turns("hi", history) is prior
+
+
+def test_classify_local_respects_the_threshold(clf, monkeypatch):
+    monkeypatch.setenv("ROUTER_LOCAL_TIER", "true")
+    monkeypatch.setattr(intent_classifier, "_CLASSIFIER", clf)
+    monkeypatch.setattr(intent_classifier, "_CLASSIFIER_LOADED", True)
+    monkeypatch.setattr(intent_classifier, "_CACHE", RouteCache())
+    monkeypatch.setenv("ROUTER_LOCAL_THRESHOLD", "0.0")
+    route = classify_local("delete the tea item")
+    assert route["intent"] == "write" and route["needs_confirm"] and route["tier"] == "local"
+    monkeypatch.setenv("ROUTER_LOCAL_THRESHOLD", "1.01")
+    assert classify_local("delete the tea item") is None
+    monkeypatch.setenv("ROUTER_LOCAL_TIER", "false")
+    monkeypatch.setenv("ROUTER_LOCAL_THRESHOLD", "0.0")
+    assert classify_local("delete the tea item") is None
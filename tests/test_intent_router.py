@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from app import intent_classifier
+from app.answer_cache import AnswerCache
+from app.intent_classifier import classify_local, get_route_cache, remember
+from app.intent_router import route_intent
+
+FOLLOW_UPS = ["What's his hourly wage?", "show their wages", "and the price of it?"]
+
+HISTORY = [
+    {"role": "user", "content": "Who is the cook at the Main St location?"},
+    {"role": "assistant", "content": "John Smith is the cook."},
+]
+
+
+class _Confident:
+    """Stands in for the trained classifier: always sure it's a read."""
+
+    def predict(self, text):
+        return "read", 0.99
+
+
+@pytest.fixture(autouse=True)
+def router(monkeypatch):
+    monkeypatch.setenv("ROUTER_MODEL", "fake:default")
+    monkeypatch.setenv("BENCH_LLM_LATENCY_MS", "0")
+    monkeypatch.setenv("ROUTER_LOCAL_TIER", "true")
+    monkeypatch.delenv("ROUTER_LOG_PATH", raising=False)
+    monkeypatch.setattr(intent_classifier, "_CLASSIFIER", None)
+    monkeypatch.setattr(intent_classifier, "_CLASSIFIER_LOADED", True)
+    get_route_cache()._data.clear()
+    yield
+    get_route_cache()._data.clear()
+
+
+def _with_history(text):
+    return HISTORY + [{"role": "user", "content": text}]
+
+
+@pytest.mark.parametrize("text", FOLLOW_UPS)
+def test_llm_follow_up_is_never_cached(text):
+    route = asyncio.run(route_intent(text, history=_with_history(text)))
+    assert route["tier"] == "llm"
+    assert AnswerCache.cache_key(route) is None
+    assert get_route_cache().get(text) is None
+
+
+@pytest.mark.parametrize("text", FOLLOW_UPS)
+def test_local_follow_up_is_never_cached(monkeypatch, text):
+    monkeypatch.setattr(intent_classifier, "_CLASSIFIER", _Confident())
+    route = asyncio.run(route_intent(text, history=_with_history(text)))
+    assert route["tier"] == "local"
+    assert route["context_free"] is False
+    assert AnswerCache.cache_key(route) is None
+
+
+@pytest.mark.parametrize("text", FOLLOW_UPS)
+def test_route_cache_hit_in_follow_up_is_never_cached(text):
+    # another session asked the same words as its first message
+    remember(text, {"intent": "read", "needs_confirm": False, "reason": "", "normalized_request": text, "context_free": True})
+    route = asyncio.run(route_intent(text, history=_with_history(text)))
+    assert route["tier"] == "cache"
+    assert AnswerCache.cache_key(route) is None
+
+
+def test_routes_made_with_history_are_not_remembered():
+    text = "show their wages"
+    asyncio.run(route_intent(text, history=_with_history(text)))
+    assert len(get_route_cache()) == 0
+
+
+def test_first_message_local_route_stays_shareable(monkeypatch):
+    monkeypatch.setattr(intent_classifier, "_CLASSIFIER", _Confident())
+    text = "how many items are on the menu"
+    route = classify_local(text, [{"role": "user", "content": text}])
+    assert route["context_free"] is True
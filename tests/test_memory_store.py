@@ -0,0 +1,178 @@
+import time
+import types
+
+import pytest
+
+from app import memory_store
+from app.memory_store import MemorySessionStore, RedisSessionStore, SQLiteSessionStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces memory_store's time module with one the test moves by hand."""
+    now = [time.time()]
+    fake = types.SimpleNamespace(time=lambda: now[0])
+    monkeypatch.setattr(memory_store, "time", fake)
+
+    def advance(seconds: float):
+        now[0] += seconds
+
+    return advance
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    return SQLiteSessionStore(str(tmp_path / "sessions.db"), max_messages=4, ttl=60, pending_ttl=10)
+
+
+@pytest.fixture
+def redis_store(resp_server):
+    return RedisSessionStore(resp_server.url, max_messages=4, ttl=60, pending_ttl=10, prefix="t:")
+
+
+def _fill(store, session_id: str, n: int):
+    for i in range(n):
+        store.append(session_id, "user" if i % 2 == 0 else "assistant", f"m{i}")
+
+
+def _contents(messages):
+    return [m["content"] for m in messages]
+
+
+# ---- sqlite ----
+
+
+def test_sqlite_keeps_newest_max_messages(sqlite_store):
+    _fill(sqlite_store, "s1", 7)
+    assert _contents(sqlite_store.history("s1")) == ["m3", "m4", "m5", "m6"]
+    assert _contents(sqlite_store.history("s1", last=2)) == ["m5", "m6"]
+    assert sqlite_store.history("s1")[0] == {"role": "assistant", "content": "m3"}
+    rows = sqlite_store._conn().execute("SELECT COUNT(*) FROM messages WHERE session_id = 's1'").fetchone()[0]
+    assert rows == 4
+
+
+def test_sqlite_sessions_are_separate(sqlite_store):
+    _fill(sqlite_store, "a", 2)
+    _fill(sqlite_store, "b", 3)
+    sqlite_store.clear("a")
+    assert sqlite_store.history("a") == []
+    assert _contents(sqlite_store.history("b")) == ["m0", "m1", "m2"]
+
+
+def test_sqlite_idle_session_expires(sqlite_store, clock):
+    _fill(sqlite_store, "s1", 3)
+    clock(59)
+    assert len(sqlite_store.history("s1")) == 3
+    sqlite_store.append("s1", "user", "again")  # touching it restarts the TTL
+    clock(59)
+    assert len(sqlite_store.history("s1")) == 4
+    clock(2)
+    assert sqlite_store.history("s1") == []
+    # an expired session starts over instead of resurrecting its old messages
+    sqlite_store.append("s1", "user", "new")
+    assert _contents(sqlite_store.history("s1")) == ["new"]
+
+
+def test_sqlite_pending_pop_is_once(sqlite_store):
+    sqlite_store.set_pending("s1", {"action_id": "a1", "user_request": "raise prices"})
+    assert sqlite_store.get_pending("s1")["action_id"] == "a1"
+    assert sqlite_store.pop_pending("s1") == {"action_id": "a1", "user_request": "raise prices"}
+    assert sqlite_store.pop_pending("s1") is None
+    assert sqlite_store.get_pending("s1") is None
+
+
+def test_sqlite_pending_expires(sqlite_store, clock):
+    sqlite_store.set_pending("s1", {"action_id": "a1"})
+    clock(11)
+    assert sqlite_store.get_pending("s1") is None
+    assert sqlite_store.pop_pending("s1") is None
+
+
+def test_sqlite_is_shared_across_instances(tmp_path):
+    path = str(tmp_path / "shared.db")
+    one = SQLiteSessionStore(path, max_messages=4, ttl=60, pending_ttl=10)
+    two = SQLiteSessionStore(path, max_messages=4, ttl=60, pending_ttl=10)
+    one.append("s1", "user", "hi")
+    one.set_pending("s1", {"action_id": "a1"})
+    assert _contents(two.history("s1")) == ["hi"]
+    assert two.pop_pending("s1") == {"action_id": "a1"}
+    assert one.pop_pending("s1") is None
+
+
+# ---- redis (RESP) ----
+
+
+def test_redis_keeps_newest_max_messages(redis_store, resp_server):
+    _fill(redis_store, "s1", 7)
+    assert _contents(redis_store.history("s1")) == ["m3", "m4", "m5", "m6"]
+    assert _contents(redis_store.history("s1", last=2)) == ["m5", "m6"]
+    assert redis_store.history("s1", last=0) == []
+    assert len(resp_server.data["t:h:s1"]) == 4
+
+
+def test_redis_append_is_one_pipelined_write(redis_store, resp_server):
+    redis_store.append("s1", "user", "hi")
+    assert [c[0] for c in resp_server.commands] == ["RPUSH", "LTRIM", "EXPIRE"]
+    assert resp_server.ttl("t:h:s1") == pytest.approx(60, abs=1)
+
+
+def test_redis_idle_session_expires(redis_store, resp_server):
+    _fill(redis_store, "s1", 3)
+    resp_server.advance(59)
+    redis_store.append("s1", "user", "again")  # touching it restarts the TTL
+    resp_server.advance(59)
+    assert len(redis_store.history("s1")) == 4
+    resp_server.advance(2)
+    assert redis_store.history("s1") == []
+
+
+def test_redis_clear_drops_history_and_pending(redis_store):
+    _fill(redis_store, "s1", 2)
+    redis_store.set_pending("s1", {"action_id": "a1"})
+    redis_store.clear("s1")
+    assert redis_store.history("s1") == []
+    assert redis_store.get_pending("s1") is None
+
+
+def test_redis_pending_pop_is_once(redis_store):
+    redis_store.set_pending("s1", {"action_id": "a1", "user_request": "raise prices"})
+    assert redis_store.get_pending("s1")["action_id"] == "a1"
+    assert redis_store.pop_pending("s1") == {"action_id": "a1", "user_request": "raise prices"}
+    assert redis_store.pop_pending("s1") is None
+
+
+def test_redis_pending_expires(redis_store, resp_server):
+    redis_store.set_pending("s1", {"action_id": "a1"})
+    assert resp_server.ttl("t:p:s1") == pytest.approx(10, abs=1)
+    resp_server.advance(11)
+    assert redis_store.get_pending("s1") is None
+    assert redis_store.pop_pending("s1") is None
+
+
+def test_redis_pending_pop_without_getdel(resp_server_no_getdel):
+    store = RedisSessionStore(resp_server_no_getdel.url, max_messages=4, ttl=60, pending_ttl=10, prefix="t:")
+    store.set_pending("s1", {"action_id": "a1"})
+    assert store.pop_pending("s1") == {"action_id": "a1"}
+    assert store.pop_pending("s1") is None
+    assert ["DEL", "t:p:s1"] in resp_server_no_getdel.commands
+
+
+def test_redis_reconnects_after_server_drop(redis_store, resp_server):
+    redis_store.append("s1", "user", "hi")
+    redis_store.client._sock.close()  # a dropped connection is retried once on a new one
+    assert _contents(redis_store.history("s1")) == ["hi"]
+
+
+# ---- memory ----
+
+
+def test_memory_evicts_least_recent_session():
+    store = MemorySessionStore(max_messages=4, ttl=60, pending_ttl=10, max_sessions=2)
+    _fill(store, "a", 1)
+    _fill(store, "b", 1)
+    store.set_pending("a", {"action_id": "a1"})
+    store.history("a")  # reads don't count as use; only appends do
+    _fill(store, "c", 1)
+    assert store.history("a") == []
+    assert store.get_pending("a") is None
+    assert store.stats()["sessions"] == 2
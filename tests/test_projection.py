@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from app.projection import Projector, format_money, money_to_decimal
+
+
+@pytest.fixture
+def projector():
+    return Projector(max_items=2, max_nested=2)
+
+
+def _item(i):
+    return {
+        "id": f"I{i}",
+        "type": "ITEM",
+        "version": 3,
+        "is_deleted": False,
+        "present_at_all_locations": True,
+        "image_ids": ["img"],
+        "item_data": {
+            "name": f"Item {i}",
+            "description": "",
+            "ecom_visibility": "UNINDEXED",
+            "variations": [
+                {"id": f"V{i}-{n}", "item_variation_data": {"name": "Regular", "price_money": {"amount": 450, "currency": "USD"}}}
+                for n in range(3)
+            ],
+        },
+    }
+
+
+@pytest.mark.parametrize("amount, currency, expected", [
+    (450, "USD", 4.5), (400, "JPY", 400), (1234, "KWD", 1.234), (None, "USD", 0.0),
+])
+def test_money_in_major_units(amount, currency, expected):
+    assert money_to_decimal(amount, currency) == expected
+
+
+def test_money_keeps_the_currency_precision():
+    assert format_money({"amount": 3600, "currency": "USD"}) == "36.00 USD"
+    assert format_money({"amount": 500, "currency": "JPY"}) == "500 JPY"
+
+
+def test_drops_unlisted_fields_defaults_and_empty_values(projector):
+    out = projector.project("catalog", "retrieveObject", {"object": _item(1)})["object"]
+    assert out["id"] == "I1" and out["version"] == 3  # common fields are always kept
+    assert "image_ids" not in out and "ecom_visibility" not in out["item_data"]
+    assert "is_deleted" not in out and "present_at_all_locations" not in out
+    assert "description" not in out["item_data"]
+    variations = out["item_data"]["variations"]
+    assert variations[0]["item_variation_data"]["price_money"] == "4.50 USD"
+    assert variations[-1] == "... 1 more"
+
+
+def test_unknown_services_keep_every_field(projector):
+    data = {"widget": {"colour": "red", "size": None}}
+    assert projector.project("widgets", "get", data) == {"widget": {"colour": "red"}}
+
+
+def test_long_results_page_from_memory(projector):
+    data = {"objects": [_item(i) for i in range(5)], "cursor": "square-next"}
+    first = projector.project("catalog", "list", data)
+    assert [o["id"] for o in first["objects"]] == ["I0", "I1"]
+    assert first["cursor"].startswith("proj:") and first["truncated"]["total_in_page"] == 5
+
+    second = projector.next_page("catalog", "list", first["cursor"])
+    assert [o["id"] for o in second["objects"]] == ["I2", "I3"]
+    last = projector.next_page("catalog", "list", second["cursor"])
+    assert [o["id"] for o in last["objects"]] == ["I4"]
+    # the last local page hands back Square's own cursor
+    assert last["cursor"] == "square-next"
+
+
+def test_cursor_only_serves_its_own_call(projector):
+    first = projector.project("catalog", "list", {"objects": [_item(i) for i in range(5)]})
+    assert projector.next_page("catalog", "search", first["cursor"]) is None
+    assert projector.next_page("catalog", "list", "proj:unknown:2") is None
+    assert projector.next_page("catalog", "list", "proj:bad") is None
+
+
+def test_apply_passes_non_json_through(projector):
+    assert projector.apply("catalog", "list", "Error: not found") == "Error: not found"
+    out = json.loads(projector.apply("catalog", "list", json.dumps({"objects": [_item(1)]})))
+    assert out["objects"][0]["item_data"]["name"] == "Item 1"
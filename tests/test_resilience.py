@@ -0,0 +1,114 @@
+import asyncio
+import time
+import types
+
+import pytest
+from langchain_core.tools import ToolException
+
+from app import resilience
+from app.resilience import CircuitOpen, Resilience, is_transient
+
+
+@pytest.fixture
+def res(monkeypatch):
+    monkeypatch.setenv("MCP_HEDGE", "false")
+    monkeypatch.setenv("MCP_RETRIES", "2")
+    monkeypatch.setenv("MCP_RETRY_BASE_MS", "1")
+    monkeypatch.setenv("MCP_RETRY_MAX_MS", "1")
+    monkeypatch.setenv("MCP_BREAKER_FAILURES", "3")
+    monkeypatch.setenv("MCP_BREAKER_COOLDOWN", "30")
+    monkeypatch.setenv("MCP_TIMEOUT", "0.05")
+    return Resilience()
+
+
+class _Square:
+    """Fails with each of `errors` in turn, then succeeds."""
+
+    def __init__(self, *errors, delay=0.0):
+        self.errors = list(errors)
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def _call(res, fetch, method="list", request=None, service="catalog"):
+    return asyncio.run(res.call(service, method, request or {}, fetch))
+
+
+@pytest.mark.parametrize("error, transient", [
+    (asyncio.TimeoutError(), True),
+    (ConnectionResetError(), True),
+    (ToolException("Square API error: status 503 Service Unavailable"), True),
+    (ToolException("RATE_LIMITED: too many requests"), True),
+    (ToolException("quantity must be at most 500"), False),
+    (ToolException("NOT_FOUND: item does not exist"), False),
+    (ValueError("status 503"), False),
+])
+def test_transient_errors(error, transient):
+    assert is_transient(error) is transient
+
+
+def test_reads_retry_transient_errors(res):
+    square = _Square(ConnectionResetError(), ToolException("status 502"))
+    assert _call(res, square) == "ok"
+    assert square.calls == 3
+
+
+def test_non_transient_errors_are_not_retried(res):
+    square = _Square(ToolException("INVALID_REQUEST_ERROR: bad field"))
+    with pytest.raises(ToolException):
+        _call(res, square)
+    assert square.calls == 1
+    assert res.breaker("catalog").failures == 0  # the service answered
+
+
+def test_writes_retry_only_with_an_idempotency_key(res):
+    square = _Square(ConnectionResetError())
+    with pytest.raises(ConnectionResetError):
+        _call(res, square, method="upsertObject", request={"object": {}})
+    assert square.calls == 1
+    square = _Square(ConnectionResetError())
+    assert _call(res, square, method="upsertObject", request={"idempotency_key": "k", "object": {}}) == "ok"
+    assert square.calls == 2
+
+
+def test_timeouts_become_tool_errors(res):
+    with pytest.raises(ToolException, match="timed out after 0.05s"):
+        _call(res, _Square(delay=1.0))
+
+
+def test_breaker_opens_fails_fast_and_probes_after_cooldown(res, monkeypatch):
+    with pytest.raises(ConnectionResetError):
+        _call(res, _Square(*[ConnectionResetError()] * 5))
+    breaker = res.breaker("catalog")
+    assert breaker.state == "open"
+
+    square = _Square()
+    with pytest.raises(CircuitOpen):
+        _call(res, square)
+    assert square.calls == 0
+    assert _call(res, _Square(), service="team") == "ok"  # per service
+
+    later = time.monotonic() + 31
+    monkeypatch.setattr(resilience, "time", types.SimpleNamespace(monotonic=lambda: later, perf_counter=time.perf_counter))
+    assert _call(res, square) == "ok"
+    assert breaker.state == "closed" and square.calls == 1
+
+
+def test_failed_probe_reopens_the_breaker(res, monkeypatch):
+    breaker = res.breaker("catalog")
+    for _ in range(3):
+        breaker.record(False, probe=False)
+    later = time.monotonic() + 31
+    monkeypatch.setattr(resilience, "time", types.SimpleNamespace(monotonic=lambda: later, perf_counter=time.perf_counter))
+    assert breaker.before_call() is True  # the one probe
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()  # everyone else still fails fast
+    breaker.record(False, probe=True)
+    assert breaker.state == "open"
@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from app import snapshot
+from app.snapshot import SquareSnapshot
+from app.square_cache import SquareReadCache
+
+TODAY = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _order(order_id, cents, created_at=TODAY):
+    return {"id": order_id, "location_id": "L1", "created_at": created_at, "total_money": {"amount": cents, "currency": "USD"}}
+
+
+class _Orders:
+    """orders.search as iter_pages sees it: `pages` per call, optionally failing or cut off."""
+
+    def __init__(self, pages, fail_at=None, last=True):
+        self.pages = pages
+        self.fail_at = fail_at
+        self.last = last
+
+    async def __call__(self, service, method, request, items_key, sem, *, max_pages, fresh=False):
+        for i, page in enumerate(self.pages):
+            if i == self.fail_at:
+                raise TimeoutError("square timed out")
+            yield page, self.last and i == len(self.pages) - 1
+
+
+@pytest.fixture
+def snap(monkeypatch):
+    monkeypatch.delenv("SNAPSHOT_PATH", raising=False)
+    monkeypatch.setattr(snapshot, "get_cache", lambda: SquareReadCache(max_entries=8))
+    snap = SquareSnapshot()
+    snap.data["locations"] = {"L1": {"id": "L1"}}
+    snap.data["orders"] = {"o1": _order("o1", 100), "o2": _order("o2", 200)}
+    snap.watermarks["orders"] = TODAY
+    return snap
+
+
+def _resync(snap, monkeypatch, orders):
+    monkeypatch.setattr(snapshot, "iter_pages", orders)
+    return asyncio.run(snap.resync(["orders"]))["orders"]
+
+
+def test_full_resync_diffs_against_the_old_orders(snap, monkeypatch):
+    changes = _resync(snap, monkeypatch, _Orders([[_order("o1", 100)], [_order("o2", 250), _order("o3", 300)]]))
+    assert changes == {"added": 1, "updated": 1, "deleted": 0}
+    assert set(snap.data["orders"]) == {"o1", "o2", "o3"}
+    assert snap.versions["orders"] == 1
+
+
+def test_full_resync_drops_orders_square_no_longer_returns(snap, monkeypatch):
+    old = "2000-01-01T00:00:00Z"
+    changes = _resync(snap, monkeypatch, _Orders([[_order("o2", 200), _order("o9", 1, created_at=old)]]))
+    assert changes == {"added": 0, "updated": 0, "deleted": 1}
+    assert set(snap.data["orders"]) == {"o2"}  # o9 is outside SNAPSHOT_ORDERS_DAYS
+
+
+def test_failed_full_resync_keeps_the_old_orders(snap, monkeypatch):
+    before = dict(snap.data["orders"])
+    with pytest.raises(TimeoutError):
+        _resync(snap, monkeypatch, _Orders([[_order("o3", 300)], []], fail_at=1))
+    assert snap.data["orders"] == before
+    assert snap.versions["orders"] == 0
+
+
+def test_cut_off_full_resync_keeps_the_old_orders(snap, monkeypatch):
+    before = dict(snap.data["orders"])
+    changes = _resync(snap, monkeypatch, _Orders([[_order("o3", 300)]], last=False))
+    assert changes == {"added": 0, "updated": 0, "deleted": 0}
+    assert snap.data["orders"] == before
+    assert "orders" not in snap.watermarks
+
+
+def test_incremental_sync_upserts(snap, monkeypatch):
+    monkeypatch.setattr(snapshot, "iter_pages", _Orders([[_order("o2", 250), _order("o3", 300)]]))
+    changes = asyncio.run(snap.sync("orders"))
+    assert changes == {"added": 1, "updated": 1, "deleted": 0}
+    assert set(snap.data["orders"]) == {"o1", "o2", "o3"}
@@ -0,0 +1,57 @@
+import asyncio
+import uuid
+
+import pytest
+
+from app import api
+from app.model_cascade import ModelCascade
+
+
+@pytest.fixture
+def turns(monkeypatch):
+    """Speculation on, a two-tier cascade, and agent turns recorded instead of run."""
+    monkeypatch.setenv("SPECULATIVE_READ", "true")
+    monkeypatch.setenv("ANSWER_CACHE", "false")
+    monkeypatch.setattr(api, "get_cascade", lambda: ModelCascade(["mini", "strong"]))
+    runs = []
+
+    async def history(session_id):
+        # slower than the router: the speculation is still waiting for it when discarded
+        await asyncio.sleep(0.02)
+        return api.get_history(session_id)
+
+    async def read_turn(history, route=None):
+        runs.append(route)
+        await asyncio.sleep(0.01)
+        return f"answer ({api.get_cascade().start_tier(route, False)})", set(), 0.01
+
+    monkeypatch.setattr(api, "_agent_history", history)
+    monkeypatch.setattr(api, "_read_turn", read_turn)
+    return runs
+
+
+def _chat(monkeypatch, route):
+    async def router(user_text, history=None):
+        await asyncio.sleep(0.005)
+        return route
+
+    monkeypatch.setattr(api, "route_intent", router)
+    return asyncio.run(api._chat_turn(f"s-{uuid.uuid4().hex}", "Compare revenue by month and location"))
+
+
+def test_speculative_turn_is_used_when_the_route_fits(turns, monkeypatch):
+    route = {"intent": "read", "needs_confirm": False, "normalized_request": "x", "complexity": "simple"}
+    assert _chat(monkeypatch, route).reply == "answer (0)"
+    assert turns == [None]
+
+
+def test_complex_route_discards_the_speculative_turn(turns, monkeypatch):
+    route = {"intent": "read", "needs_confirm": False, "normalized_request": "x", "complexity": "complex"}
+    assert _chat(monkeypatch, route).reply == "answer (1)"
+    # the discarded speculation never got the history; only the routed turn ran
+    assert turns == [route]
+
+
+def test_write_route_cancels_the_speculative_turn(turns, monkeypatch):
+    route = {"intent": "write", "needs_confirm": True, "normalized_request": "raise prices"}
+    assert _chat(monkeypatch, route).needs_confirm
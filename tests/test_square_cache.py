@@ -0,0 +1,114 @@
+import asyncio
+import time
+import types
+
+import pytest
+
+from app import square_cache
+from app.square_cache import SquareReadCache, canonical_request, is_read_method
+
+
+@pytest.fixture
+def cache():
+    return SquareReadCache(max_entries=3, ttls={"catalog": 60.0})
+
+
+class _Fetch:
+    def __init__(self, value="v", delay=0.0, error=None):
+        self.calls = 0
+        self.value, self.delay, self.error = value, delay, error
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return f"{self.value}{self.calls}"
+
+
+def _get(cache, fetch, request=None, method="list"):
+    return cache.get_or_fetch("catalog", method, request or {"types": "ITEM"}, fetch)
+
+
+def test_read_methods_and_canonical_requests():
+    assert is_read_method("list") and is_read_method("searchMembers") and is_read_method("batchRetrieve")
+    assert not is_read_method("upsertObject") and not is_read_method("create")
+    assert canonical_request({"b": 1, "a": [2]}) == canonical_request({"a": [2], "b": 1})
+
+
+def test_hit_after_miss_and_key_includes_the_request(cache):
+    fetch = _Fetch()
+
+    async def go():
+        assert await _get(cache, fetch) == "v1"
+        assert await _get(cache, fetch) == "v1"
+        assert await _get(cache, fetch, {"types": "CATEGORY"}) == "v2"
+
+    asyncio.run(go())
+    assert fetch.calls == 2
+
+
+def test_concurrent_misses_share_one_fetch(cache):
+    fetch = _Fetch(delay=0.01)
+
+    async def go():
+        return await asyncio.gather(*(_get(cache, fetch) for _ in range(5)))
+
+    assert asyncio.run(go()) == ["v1"] * 5
+    assert fetch.calls == 1
+
+
+def test_errors_are_not_cached(cache):
+    failing = _Fetch(error=TimeoutError("timed out"))
+
+    async def go():
+        with pytest.raises(TimeoutError):
+            await _get(cache, failing)
+        return await _get(cache, _Fetch())
+
+    assert asyncio.run(go()) == "v1"
+
+
+def test_write_during_fetch_discards_the_result(cache):
+    fetch = _Fetch(delay=0.01)
+
+    async def go():
+        pending = asyncio.ensure_future(_get(cache, fetch))
+        await asyncio.sleep(0)
+        cache.invalidate_service("catalog")
+        assert await pending == "v1"  # the caller still gets its answer
+        assert await _get(cache, fetch) == "v2"  # but it wasn't stored
+
+    asyncio.run(go())
+
+
+def test_invalidation_notifies_listeners_once_each(cache):
+    seen = []
+    cache.add_invalidation_listener(seen.append)
+    cache.add_invalidation_listener(seen.append)
+    cache.invalidate_service("team")
+    assert seen == ["team"]
+
+
+def test_expired_entries_are_served_stale_only_within_max_age(cache, monkeypatch):
+    asyncio.run(_get(cache, _Fetch()))
+    later = time.monotonic() + 90
+    monkeypatch.setattr(square_cache, "time", types.SimpleNamespace(monotonic=lambda: later))
+    request = {"types": "ITEM"}
+    assert cache._lookup(("catalog", "list", canonical_request(request))) == (False, None)
+    assert cache.get_stale("catalog", "list", request, max_age=60) == (True, "v1")
+    assert cache.get_stale("catalog", "list", request, max_age=10) == (False, None)
+    cache.invalidate_service("catalog")
+    assert cache.get_stale("catalog", "list", request, max_age=60) == (False, None)
+
+
+def test_lru_bound(cache):
+    async def go():
+        for i in range(4):
+            await _get(cache, _Fetch(value=str(i)), {"page": i})
+        await _get(cache, _Fetch(value="again"), {"page": 0})
+
+    asyncio.run(go())
+    assert cache.stats()["entries"] == 3
+    assert cache.get_stale("catalog", "list", {"page": 0}, max_age=0) == (True, "again1")
+    assert cache.get_stale("catalog", "list", {"page": 1}, max_age=0) == (False, None)
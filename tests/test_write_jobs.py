@@ -0,0 +1,190 @@
+import asyncio
+import sqlite3
+import types
+
+import pytest
+
+from app import write_jobs
+from app.write_jobs import JobStore, WriteJobQueue, _JobContext, submit_write
+
+
+@pytest.fixture(autouse=True)
+def no_catalog(monkeypatch):
+    """No harvested schema catalog: keys come from the method-name fallback."""
+    catalog = types.SimpleNamespace(type_info=lambda service, method: None)
+    monkeypatch.setattr(write_jobs, "get_schema_catalog", lambda: catalog)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+class _Square:
+    """Records what was sent; fails the calls listed in `fail` once each."""
+
+    def __init__(self, fail=()):
+        self.sent = []
+        self.fail = list(fail)
+
+    async def __call__(self, service, method, request):
+        self.sent.append((service, method, request))
+        if method in self.fail:
+            self.fail.remove(method)
+            raise TimeoutError("timed out")
+        return "{}"
+
+
+def _run_job(job_id, calls, square):
+    """One attempt of a job: `calls` sent in order, errors swallowed like the agent's tool loop."""
+
+    async def attempt():
+        token = write_jobs._JOB.set(_JobContext(job_id, window=0))
+        try:
+            for service, method, request in calls:
+                try:
+                    await submit_write(service, method, request, square)
+                except TimeoutError:
+                    pass
+        finally:
+            write_jobs._JOB.reset(token)
+
+    asyncio.run(attempt())
+    return [r.get("idempotency_key") for _, _, r in square.sent]
+
+
+PRICE = ("catalog", "upsertObject", {"object": {"id": "#item", "type": "ITEM", "item_data": {"name": "Latte"}}})
+ORDER = ("orders", "create", {"order": {"location_id": "L1", "line_items": [{"name": "Latte", "quantity": "1"}]}})
+
+
+# ---- idempotency keys
+
+
+def test_keys_are_stable_across_reruns():
+    first = _run_job("wj_a1", [PRICE, ORDER], _Square())
+    again = _run_job("wj_a1", [PRICE, ORDER], _Square())
+    assert first == again and None not in first and len(set(first)) == 2
+    # order within the job doesn't matter, only the calls themselves
+    assert _run_job("wj_a1", [ORDER, PRICE], _Square()) == first[::-1]
+    assert set(_run_job("wj_a2", [PRICE, ORDER], _Square())).isdisjoint(first)
+
+
+def test_key_follows_the_request_body_not_a_key_already_in_it():
+    service, method, request = ORDER
+    keyed = {**request, "idempotency_key": "from-the-model"}
+    other = {"order": {**request["order"], "location_id": "L2"}}
+    keys = _run_job("wj_a1", [ORDER, (service, method, keyed), (service, method, other)], _Square())
+    assert keys[1] != "from-the-model"
+    assert keys[0] != keys[1]  # the second identical call went through: it's a new write
+    assert keys[2] not in keys[:2]
+
+
+def test_reissue_after_timeout_reuses_the_key():
+    square = _Square(fail=["create"])
+    keys = _run_job("wj_a1", [ORDER, ORDER], square)
+    assert keys[0] == keys[1]
+    # a re-run after the job failed sends it with the same key again
+    assert _run_job("wj_a1", [ORDER], _Square()) == keys[:1]
+
+
+def test_identical_calls_are_numbered_the_same_on_every_rerun():
+    first = _run_job("wj_a1", [ORDER, ORDER, ORDER], _Square())
+    assert len(set(first)) == 3
+    assert _run_job("wj_a1", [ORDER, ORDER, ORDER], _Square()) == first
+
+
+@pytest.mark.parametrize("method, keyed", [
+    ("create", True), ("updateOrder", True), ("upsertObject", True), ("batchUpsert", True),
+    ("batchChange", True), ("payOrder", True), ("refundPayment", True),
+    ("get", False), ("search", False), ("batchRetrieve", False), ("batchDelete", False), ("deleteObject", False),
+])
+def test_mutating_methods_are_keyed_without_the_catalog(method, keyed):
+    keys = _run_job("wj_a1", [("orders", method, {"order_id": "o1"})], _Square())
+    assert (keys[0] is not None) == keyed
+
+
+def test_catalog_type_info_wins_over_the_method_name(monkeypatch):
+    catalog = types.SimpleNamespace(type_info=lambda service, method: "{ order_id: string }")
+    monkeypatch.setattr(write_jobs, "get_schema_catalog", lambda: catalog)
+    assert _run_job("wj_a1", [ORDER], _Square()) == [None]
+
+
+def test_outside_a_job_requests_are_sent_unchanged():
+    square = _Square()
+    asyncio.run(submit_write(*ORDER, square))
+    assert square.sent == [ORDER]
+
+
+# ---- store and queue
+
+
+def test_released_job_waits_out_its_backoff(store, monkeypatch):
+    store.create("wj_a1", "s1", "a1", "raise prices")
+    assert store.claim("wj_a1", "w1", lease=60)["attempts"] == 1
+    store.release("wj_a1", "w1", "TimeoutError", delay=30)
+    assert store.claimable() == []
+    assert store.claim("wj_a1", "w2", lease=60) is None
+    now = write_jobs.time.time() + 31
+    monkeypatch.setattr(write_jobs, "time", types.SimpleNamespace(time=lambda: now))
+    assert store.claimable() == ["wj_a1"]
+    assert store.claim("wj_a1", "w2", lease=60)["attempts"] == 2
+
+
+def test_old_job_files_are_migrated(tmp_path):
+    path = str(tmp_path / "old.db")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE jobs (job_id TEXT PRIMARY KEY, session_id TEXT NOT NULL, action_id TEXT NOT NULL,"
+        " user_request TEXT NOT NULL, status TEXT NOT NULL, reply TEXT, error TEXT,"
+        " attempts INTEGER NOT NULL DEFAULT 0, owner TEXT, lease_until REAL NOT NULL DEFAULT 0,"
+        " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+    )
+    db.execute("INSERT INTO jobs VALUES ('wj_old', 's1', 'old', 'x', 'queued', NULL, NULL, 0, NULL, 0, 0, 0)")
+    db.commit()
+    db.close()
+    store = JobStore(path)
+    assert store.claimable() == ["wj_old"]
+    assert store.get("wj_old")["context"] == []
+
+
+def _run_queue(store, runner, monkeypatch):
+    replies = []
+    monkeypatch.setattr(write_jobs, "append_message", lambda session_id, role, text: replies.append(text))
+
+    async def go():
+        queue = WriteJobQueue(store, workers=1, max_attempts=3, lease=60, batch_window=0)
+        await queue.start(runner)
+        job = queue.submit("s1", {"action_id": "a1", "user_request": "raise prices"})
+        events = [ev async for ev in queue.follow(job["job_id"])]
+        await queue.stop()
+        return queue.get(job["job_id"]), events
+
+    job, events = asyncio.run(go())
+    return job, events, replies
+
+
+def test_turn_that_gives_up_fails_the_job(store, monkeypatch):
+    async def runner(job):
+        yield {"type": "final", "reply": "I couldn't do it.", "error": "the agent gave up after retries"}
+
+    job, events, replies = _run_queue(store, runner, monkeypatch)
+    assert job["status"] == "failed" and job["attempts"] == 1
+    assert events[-1]["status"] == "failed"
+    assert replies == [write_jobs.FAILED_REPLY.format(error="the agent gave up after retries")]
+
+
+def test_only_transient_errors_are_retried(store, monkeypatch):
+    monkeypatch.setattr(write_jobs, "is_transient", lambda e: isinstance(e, TimeoutError))
+    calls = []
+
+    async def runner(job):
+        calls.append(job["attempts"])
+        if len(calls) == 1:
+            raise TimeoutError("square timed out")
+        raise ValueError("bad request")
+        yield  # pragma: no cover
+
+    job, _, replies = _run_queue(store, runner, monkeypatch)
+    assert calls == [1, 2]
+    assert job["status"] == "failed" and job["error"].startswith("ValueError")
+    assert len(replies) == 1
@@ -78,7 +78,10 @@ async function load() {
     `).join("");
     fillOrEmpty(ordersBody, orderRows, 4);
 
-    setStatus("Loaded successfully. Prices/wages normalized from cents → dollars.", "ok");
+    // Served from the background snapshot: show how old the data is
+    const ages = Object.values(data.freshness || {}).map(f => f.age_seconds).filter(a => a != null);
+    const fresh = ages.length ? ` Data synced ${Math.round(Math.max(...ages))}s ago.` : "";
+    setStatus(`Loaded successfully. Prices/wages normalized from cents → dollars.${fresh}`, "ok");
   } catch (e) {
     setStatus(`Failed to load: ${e.message}`, "err");
   }
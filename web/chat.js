@@ -134,7 +134,7 @@ function renderChartIntoBubble(bubbleDiv, chartConfig) {
     }
 }
 
-// Friendly progress logs while waiting (no backend changes needed)
+// Friendly progress logs for quick non-streaming calls (e.g. reject)
 function startFriendlyLogs(bubbleDiv, kind = "general") {
     const sequences = {
         general: [
@@ -170,11 +170,107 @@ function startFriendlyLogs(bubbleDiv, kind = "general") {
     return () => clearInterval(id);
 }
 
-function isChartPrompt(text) {
-    const t = (text || "").toLowerCase();
-    return ["chart", "graph", "plot", "visual", "visualize", "pie", "bar", "line"].some((k) =>
-        t.includes(k)
-    );
+// Parse a text/event-stream body, calling onEvent(type, payload) per event
+async function readEventStream(res, onEvent) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buf = "";
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buf += decoder.decode(value, { stream: true });
+
+        let idx;
+        while ((idx = buf.indexOf("\n\n")) !== -1) {
+            const raw = buf.slice(0, idx);
+            buf = buf.slice(idx + 2);
+
+            let type = "message";
+            let data = "";
+            raw.split("\n").forEach((line) => {
+                if (line.startsWith("event:")) type = line.slice(6).trim();
+                else if (line.startsWith("data:")) data += line.slice(5).trim();
+            });
+            if (data) onEvent(type, JSON.parse(data));
+        }
+    }
+}
+
+function toolLabel(ev) {
+    return ev.service ? `${ev.service}.${ev.method}` : (ev.tool || "tool");
+}
+
+// Render real agent progress (tool calls + token deltas) as it streams.
+// Resolves with the "final" event payload.
+async function streamInto(bubbleDiv, url, body) {
+    const res = await fetch(url, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(body),
+    });
+    if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+    let text = "";
+    let status = "Thinking…";
+    let final = null;
+
+    const paint = () => {
+        // Don't show a half-streamed chart (config or <CHART id/> reference); it is rendered from the final reply
+        const cut = text.indexOf("<CHART");
+        const visible = cut === -1 ? text : text.slice(0, cut);
+        const statusHtml = status ? `<div class="text-xs text-slate-500">${esc(status)}</div>` : "";
+        bubbleDiv.innerHTML = statusHtml + esc(visible).replaceAll("\n", "<br/>");
+        chatEl.scrollTop = chatEl.scrollHeight;
+    };
+
+    await readEventStream(res, (type, ev) => {
+        if (type === "final") {
+            final = ev;
+            return;
+        }
+        if (type === "status") status = ev.text;
+        else if (type === "tool_start") {
+            text = "";
+            status = `Calling ${toolLabel(ev)}…`;
+        } else if (type === "tool_end") status = `Got ${toolLabel(ev)}`;
+        else if (type === "token") {
+            text += ev.text;
+            status = "";
+        } else if (type === "repair") {
+            status = "Fixing the answer…";
+        } else if (type === "retry") {
+            text = "";
+            status = "Double-checking the answer…";
+        } else if (type === "job") {
+            // approved writes run server-side; remembered so a dropped stream can poll
+            bubbleDiv.dataset.jobId = ev.job_id;
+        }
+        paint();
+    });
+
+    if (!final) throw new Error("Response stream ended early");
+    return final;
+}
+
+// Poll an approved-write job until it finishes; resolves with its status
+async function waitForJob(jobId) {
+    while (true) {
+        const res = await fetch(`/api/jobs/${encodeURIComponent(jobId)}`);
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        const job = await res.json();
+        if (job.status === "succeeded" || job.status === "failed") return job;
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+}
+
+function renderReply(bubbleDiv, reply) {
+    const { cleanText, config } = extractChartConfig(reply || "");
+    bubbleDiv.innerHTML = esc(cleanText).replaceAll("\n", "<br/>");
+
+    if (config && typeof config === "object") {
+        renderChartIntoBubble(bubbleDiv, config);
+    }
 }
 
 async function sendMessage(text) {
@@ -183,28 +279,16 @@ async function sendMessage(text) {
     sendBtn.disabled = true;
 
     const typingBubble = addBubble("assistant", "…");
-    const stopLogs = startFriendlyLogs(typingBubble, isChartPrompt(text) ? "chart" : "general");
 
     try {
-        const res = await fetch("/api/chat", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ session_id: sessionId, message: text }),
+        const data = await streamInto(typingBubble, "/api/chat/stream", {
+            session_id: sessionId,
+            message: text,
         });
 
-        const data = await res.json();
-        stopLogs();
-
-        const { cleanText, config } = extractChartConfig(data.reply || "");
-        typingBubble.innerHTML = esc(cleanText).replaceAll("\n", "<br/>");
-
-        if (config && typeof config === "object") {
-            renderChartIntoBubble(typingBubble, config);
-        }
-
+        renderReply(typingBubble, data.reply);
         showActions(!!data.needs_confirm);
     } catch (e) {
-        stopLogs();
         typingBubble.innerHTML = `Error: ${esc(e.message)}`;
         showActions(false);
     } finally {
@@ -231,27 +315,23 @@ approveBtn.addEventListener("click", async () => {
     addBubble("user", "✅ Approved");
 
     const typingBubble = addBubble("assistant", "Working…");
-    const stopLogs = startFriendlyLogs(typingBubble, "write");
 
     try {
-        const res = await fetch("/api/chat/approve", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ session_id: sessionId }),
-        });
-
-        const data = await res.json();
-        stopLogs();
-
-        const { cleanText, config } = extractChartConfig(data.reply || "");
-        typingBubble.innerHTML = esc(cleanText).replaceAll("\n", "<br/>");
-
-        if (config && typeof config === "object") {
-            renderChartIntoBubble(typingBubble, config);
-        }
+        const data = await streamInto(typingBubble, "/api/chat/approve/stream", { session_id: sessionId });
+        renderReply(typingBubble, data.reply);
     } catch (e) {
-        stopLogs();
-        typingBubble.innerHTML = `Error: ${esc(e.message)}`;
+        const jobId = typingBubble.dataset.jobId;
+        if (!jobId) {
+            typingBubble.innerHTML = `Error: ${esc(e.message)}`;
+            return;
+        }
+        try {
+            typingBubble.innerHTML = esc("Still applying changes…");
+            const job = await waitForJob(jobId);
+            renderReply(typingBubble, job.reply);
+        } catch (e2) {
+            typingBubble.innerHTML = `Error: ${esc(e2.message)}`;
+        }
     }
 });
 